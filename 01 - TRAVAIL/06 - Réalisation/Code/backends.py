@@ -0,0 +1,434 @@
+# backends.py
+# Ce fichier définit les sources d'images et les détecteurs d'objets utilisés par Camera.
+# Sources     : caméra CSI (jetson_utils), vidéo / webcam V4L2 / pipeline GStreamer (OpenCV),
+#               dossier d'images, liste d'images en mémoire.
+# Détecteurs  : detectNet (GPU, TensorRT) ou SSD-MobileNet au format ONNX sur CPU (ONNX Runtime ou OpenCV DNN).
+# Les bibliothèques Jetson, OpenCV et ONNX Runtime sont importées à la demande : seul le backend utilisé
+# doit être installé. La chaîne caméra peut ainsi tourner et être mesurée sur un PC Linux, et la canne
+# reste utilisable sur CPU si la pile GPU ne se charge pas.
+
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# Détection immuable, mêmes attributs que celles de jetson_inference
+Detection = namedtuple("Detection", ["ClassID", "Confidence", "Left", "Top", "Right", "Bottom", "Center"])
+
+# Caméra CSI lue par OpenCV (sans jetson_utils) : capteur Argus -> BGR, une seule image en attente
+CSI_GSTREAMER = ("nvarguscamerasrc sensor-id={sensor} ! video/x-raw(memory:NVMM), width={width}, height={height}, "
+                 "framerate={rate}/1 ! nvvidconv ! video/x-raw, format=BGRx ! videoconvert ! "
+                 "video/x-raw, format=BGR ! appsink drop=true max-buffers=1")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def image_size(img):
+    """
+    :param img: Image jetson_utils (cudaImage) ou tableau NumPy (hauteur, largeur, canaux).
+    :return: (largeur, hauteur) en pixels.
+    """
+    if isinstance(img, np.ndarray):
+        return img.shape[1], img.shape[0]
+    return img.width, img.height
+
+class Thumbnailer:
+    """Vignette en niveaux de gris d'une image (comparaison d'images à très faible coût)."""
+
+    def __init__(self, width=64, height=36):
+        """
+        :param width: Largeur de la vignette (px).
+        :param height: Hauteur de la vignette (px).
+        """
+        self.width = width
+        self.height = height
+        self._buffer = None # Vignette en mémoire CUDA (images jetson_utils)
+
+    def __call__(self, img):
+        """:return: Tableau NumPy (height, width) de niveaux de gris (float32)."""
+        if isinstance(img, np.ndarray):
+            # Sous-échantillonnage par pas fixe : pas de copie de l'image complète
+            step_y = max(img.shape[0] // self.height, 1)
+            step_x = max(img.shape[1] // self.width, 1)
+            small = img[::step_y, ::step_x][:self.height, :self.width]
+        else:
+            import jetson_utils
+            if self._buffer is None or self._buffer.format != img.format:
+                self._buffer = jetson_utils.cudaAllocMapped(width=self.width, height=self.height, format=img.format)
+            jetson_utils.cudaResize(img, self._buffer)
+            jetson_utils.cudaDeviceSynchronize()
+            small = jetson_utils.cudaToNumpy(self._buffer)
+        if small.ndim == 3:
+            return small[..., :3].mean(axis=2, dtype=np.float32)
+        return small.astype(np.float32)
+
+# ---------------------------------------------------------------------------
+# Sources d'images
+# ---------------------------------------------------------------------------
+
+class FrameSource:
+    """
+    Interface commune des sources d'images.
+    capture(timeout=None) attend une image ; capture(timeout=0) ne rend qu'une image déjà en attente (sinon None).
+    live : True pour une caméra (résolution et cadence réglables à l'ouverture), False pour une séquence enregistrée.
+    """
+    width = 0
+    height = 0
+    live = False
+
+    def capture(self, timeout=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class JetsonSource(FrameSource):
+    """Caméra (CSI, V4L2, RTSP...) lue par jetson_utils.videoSource : images en mémoire CUDA (rgb8)."""
+    live = True
+
+    def __init__(self, uri="csi://0", width=1280, height=720, rate=30):
+        """
+        :param uri: Adresse de la source (ex : "csi://0").
+        :param width: Largeur demandée (px).
+        :param height: Hauteur demandée (px).
+        :param rate: Images par seconde demandées.
+        """
+        from jetson_utils import videoSource
+        # Argv --headless permet de lancer le script sans interface graphique
+        # Ajout de --input-flip=rotate-180 pour corriger la caméra à l'envers
+        self._source = videoSource(uri, argv=["--headless", f"--input-width={width}", f"--input-height={height}",
+                                              f"--input-rate={rate}"])
+        self.width = width
+        self.height = height
+
+    def capture(self, timeout=None):
+        if timeout is None:
+            return self._source.Capture()
+        return self._source.Capture(timeout=int(timeout * 1000)) # Délai en ms pour jetson_utils
+
+    def close(self):
+        self._source.Close()
+
+class OpenCVSource(FrameSource):
+    """Fichier vidéo, webcam V4L2 (/dev/videoN ou numéro) ou pipeline GStreamer lus par OpenCV (BGR)."""
+
+    def __init__(self, uri, width=None, height=None, loop=False, realtime=False):
+        """
+        :param uri: Chemin d'une vidéo, "/dev/videoN", numéro de webcam, ou pipeline GStreamer (contient "!").
+        :param width: Largeur demandée à une webcam (px).
+        :param height: Hauteur demandée à une webcam (px).
+        :param loop: Vidéo : reprend au début à la fin du fichier.
+        :param realtime: Vidéo : rend les images au rythme du fichier (comme une caméra) au lieu d'aussi vite que possible.
+        """
+        import cv2
+        self._cv2 = cv2
+        self.is_file = False
+        if isinstance(uri, int) or str(uri).isdigit() or str(uri).startswith("/dev/video"):
+            index = int(uri) if str(uri).isdigit() else str(uri)
+            self._cap = cv2.VideoCapture(index, cv2.CAP_V4L2)
+            self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Pas d'images périmées en attente
+            if width and height:
+                self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        elif "!" in str(uri):
+            self._cap = cv2.VideoCapture(uri, cv2.CAP_GSTREAMER)
+        else:
+            self._cap = cv2.VideoCapture(uri)
+            self.is_file = True
+        if not self._cap.isOpened():
+            raise IOError(f"Impossible d'ouvrir la source vidéo {uri}")
+        self.live = not self.is_file
+        self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.loop = loop
+        fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._period = 1.0 / fps if realtime and self.is_file else 0.0
+        self._next_time = 0.0
+
+    def capture(self, timeout=None):
+        if timeout == 0:
+            return None # OpenCV ne garde pas d'images en attente (tampon d'une image ou lecture de fichier)
+        if self._period:
+            delay = self._next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_time = max(self._next_time, time.monotonic()) + self._period
+        ok, frame = self._cap.read()
+        if not ok and self.is_file and self.loop:
+            self._cap.set(self._cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._cap.read()
+        return frame if ok else None
+
+    def close(self):
+        self._cap.release()
+
+class ImageDirSource(FrameSource):
+    """Images d'un dossier, dans l'ordre alphabétique (BGR)."""
+
+    def __init__(self, path, loop=False):
+        """
+        :param path: Dossier contenant des images (.jpg, .png, .bmp).
+        :param loop: Reprend à la première image après la dernière.
+        """
+        import cv2
+        self._cv2 = cv2
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise IOError(f"Aucune image dans {path}")
+        self.loop = loop
+        self._index = 0
+        first = cv2.imread(self.files[0])
+        self.height, self.width = first.shape[:2]
+
+    def capture(self, timeout=None):
+        if timeout == 0:
+            return None
+        if self._index >= len(self.files):
+            if not self.loop:
+                return None
+            self._index = 0
+        frame = self._cv2.imread(self.files[self._index])
+        self._index += 1
+        return frame
+
+class FrameListSource(FrameSource):
+    """Images NumPy déjà en mémoire (tests, mesures sans disque)."""
+
+    def __init__(self, frames, loop=True):
+        """
+        :param frames: Liste d'images (hauteur, largeur, 3).
+        :param loop: Reprend à la première image après la dernière.
+        """
+        self.frames = list(frames)
+        self.loop = loop
+        self._index = 0
+        self.height, self.width = self.frames[0].shape[:2]
+
+    def capture(self, timeout=None):
+        if timeout == 0:
+            return None
+        if self._index >= len(self.frames):
+            if not self.loop:
+                return None
+            self._index = 0
+        frame = self.frames[self._index]
+        self._index += 1
+        return frame
+
+def open_source(uri="csi://0", width=1280, height=720, rate=30):
+    """
+    Ouvre la source d'images correspondant à l'adresse.
+    "csi://N" : jetson_utils, ou OpenCV + GStreamer si jetson_utils ne se charge pas ;
+    dossier : ImageDirSource ; autre (vidéo, /dev/videoN, numéro, pipeline GStreamer) : OpenCVSource.
+    """
+    uri = str(uri)
+    if uri.startswith("csi://"):
+        try:
+            return JetsonSource(uri, width, height, rate)
+        except Exception as e:
+            print(f"jetson_utils indisponible ({e}), caméra CSI lue par OpenCV")
+            return OpenCVSource(CSI_GSTREAMER.format(sensor=uri[len("csi://"):] or 0, width=width,
+                                                     height=height, rate=rate))
+    if os.path.isdir(uri):
+        return ImageDirSource(uri)
+    return OpenCVSource(uri, width, height)
+
+# ---------------------------------------------------------------------------
+# Détecteurs
+# ---------------------------------------------------------------------------
+
+class Detector:
+    """
+    Interface commune des détecteurs.
+    detect(img) rend des détections (ClassID, Confidence, Left, Top, Right, Bottom) en pixels de img.
+    Si timers (metrics.StageTimers) est renseigné, detect() y ajoute la durée de ses étapes internes.
+    """
+    timers = None
+
+    def class_names(self):
+        """:return: Noms anglais des classes, dans l'ordre des ClassID."""
+        raise NotImplementedError
+
+    def detect(self, img):
+        raise NotImplementedError
+
+    def crop(self, img, left, top, right, bottom):
+        """Zone rectangulaire de l'image, dans un format accepté par detect()."""
+        if isinstance(img, np.ndarray):
+            return img[top:bottom, left:right] # Vue, sans copie
+        raise TypeError(f"Recadrage non géré pour {type(img).__name__}")
+
+class DetectNetDetector(Detector):
+    """Détection sur GPU avec jetson_inference.detectNet (TensorRT)."""
+
+    def __init__(self, model="ssd-inception-v2", threshold=0.5):
+        """
+        :param model: Modèle detectNet (ex : "ssd-inception-v2", "ssd-mobilenet-v2").
+        :param threshold: Seuil minimum de confiance pour les détections.
+        """
+        from jetson_inference import detectNet
+        import jetson_utils
+        self._utils = jetson_utils
+        self.net = detectNet(model, threshold=threshold, argv=["--headless"])
+        self._crop = None # Image recadrée réutilisée d'une inférence à l'autre (mémoire CUDA)
+
+    def class_names(self):
+        return [self.net.GetClassDesc(i) for i in range(self.net.GetNumClasses())]
+
+    def detect(self, img):
+        if isinstance(img, np.ndarray):
+            # Image OpenCV (BGR) : copie en mémoire CUDA au format RGB attendu par detectNet
+            img = self._utils.cudaFromNumpy(np.ascontiguousarray(img[..., ::-1]))
+        detections = self.net.Detect(img)
+        if self.timers is not None:
+            # Temps du réseau TensorRT seul, mesuré par jetson_inference (ms)
+            self.timers.record("network_trt", int(self.net.GetNetworkTime() * 1e6))
+        return detections
+
+    def crop(self, img, left, top, right, bottom):
+        if isinstance(img, np.ndarray):
+            return super().crop(img, left, top, right, bottom)
+        width, height = right - left, bottom - top
+        crop = self._crop
+        if crop is None or crop.width != width or crop.height != height or crop.format != img.format:
+            crop = self._crop = self._utils.cudaAllocMapped(width=width, height=height, format=img.format)
+        self._utils.cudaCrop(img, crop, (left, top, right, bottom))
+        return crop
+
+def non_max_suppression(boxes, scores, threshold):
+    """
+    Suppression des boîtes qui recouvrent une boîte de meilleur score.
+    :param boxes: Tableau (n, 4) de boîtes (left, top, right, bottom).
+    :param scores: Tableau (n,) de scores.
+    :param threshold: IoU au-delà duquel la boîte de moindre score est supprimée.
+    :return: Indices des boîtes gardées, par score décroissant.
+    """
+    order = np.argsort(scores)[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        width = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        height = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = width * height
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= threshold]
+    return keep
+
+def decode_ssd(scores, boxes, width, height, threshold=0.5, nms_threshold=0.45):
+    """
+    Décode les sorties d'un SSD exporté par pytorch-ssd (format des modèles ONNX de jetson-inference).
+    :param scores: Tableau (1, N, C) de probabilités par classe, la classe 0 étant le fond.
+    :param boxes: Tableau (1, N, 4) de boîtes (left, top, right, bottom) normalisées entre 0 et 1.
+    :param width: Largeur de l'image analysée (px).
+    :param height: Hauteur de l'image analysée (px).
+    :param threshold: Seuil minimum de confiance.
+    :param nms_threshold: IoU de la suppression des doublons (par classe).
+    :return: Liste de Detection en pixels, par confiance décroissante.
+    """
+    scores, boxes = scores[0], boxes[0]
+    class_ids = scores[:, 1:].argmax(axis=1) + 1
+    confidences = scores[np.arange(len(scores)), class_ids]
+    mask = confidences >= threshold
+    class_ids, confidences = class_ids[mask], confidences[mask]
+    boxes = boxes[mask] * np.array((width, height, width, height), dtype=np.float32)
+
+    detections = []
+    for class_id in np.unique(class_ids):
+        index = np.flatnonzero(class_ids == class_id)
+        for i in index[non_max_suppression(boxes[index], confidences[index], nms_threshold)]:
+            left, top, right, bottom = (float(v) for v in boxes[i])
+            detections.append(Detection(int(class_id), float(confidences[i]), left, top, right, bottom,
+                                        ((left + right) / 2.0, (top + bottom) / 2.0)))
+    detections.sort(key=lambda det: det.Confidence, reverse=True)
+    return detections
+
+class OnnxDetector(Detector):
+    """
+    Détection sur CPU avec un SSD-MobileNet ONNX (export pytorch-ssd, comme les modèles ONNX de jetson-inference :
+    entrée input_0 de 1x3x300x300, sorties scores et boxes). ONNX Runtime est utilisé s'il est installé,
+    sinon le module DNN d'OpenCV.
+    """
+
+    def __init__(self, model_path, labels_path=None, threshold=0.5, input_size=300, nms_threshold=0.45):
+        """
+        :param model_path: Fichier .onnx.
+        :param labels_path: Noms des classes, un par ligne (par défaut labels.txt à côté du modèle).
+        :param threshold: Seuil minimum de confiance pour les détections.
+        :param input_size: Côté de l'image d'entrée du réseau (px).
+        :param nms_threshold: IoU de la suppression des doublons.
+        """
+        import cv2
+        self._cv2 = cv2
+        if labels_path is None:
+            labels_path = os.path.join(os.path.dirname(model_path), "labels.txt")
+        with open(labels_path) as f:
+            self._labels = [line.strip() for line in f if line.strip()]
+        self.threshold = threshold
+        self.input_size = input_size
+        self.nms_threshold = nms_threshold
+        try:
+            import onnxruntime
+            self._session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+            self._input_name = self._session.get_inputs()[0].name
+            self._output_names = [output.name for output in self._session.get_outputs()]
+            self._net = None
+        except ImportError:
+            self._session = None
+            self._net = cv2.dnn.readNetFromONNX(model_path)
+            self._output_names = self._net.getUnconnectedOutLayersNames()
+
+    def class_names(self):
+        return list(self._labels)
+
+    def detect(self, img):
+        rgb = False
+        if not isinstance(img, np.ndarray):
+            # Image jetson_utils (rgb8) : vue NumPy de la mémoire CUDA partagée
+            from jetson_utils import cudaToNumpy, cudaDeviceSynchronize
+            cudaDeviceSynchronize()
+            img, rgb = cudaToNumpy(img), True
+        height, width = img.shape[:2]
+        start = time.monotonic_ns()
+
+        # Prétraitement pytorch-ssd : RGB, 300x300, (x - 127) / 128, NCHW
+        blob = self._cv2.resize(img, (self.input_size, self.input_size))
+        if not rgb:
+            blob = blob[..., ::-1]
+        blob = ((blob.astype(np.float32) - 127.0) / 128.0).transpose(2, 0, 1)[None]
+        preprocess_end = time.monotonic_ns()
+
+        if self._session is not None:
+            outputs = dict(zip(self._output_names, self._session.run(self._output_names, {self._input_name: blob})))
+        else:
+            self._net.setInput(blob)
+            outputs = dict(zip(self._output_names, self._net.forward(self._output_names)))
+        inference_end = time.monotonic_ns()
+
+        detections = decode_ssd(outputs["scores"], outputs["boxes"], width, height, self.threshold,
+                                self.nms_threshold)
+        if self.timers is not None:
+            self.timers.record("preprocess", preprocess_end - start)
+            self.timers.record("inference", inference_end - preprocess_end)
+            self.timers.record("decode", time.monotonic_ns() - inference_end)
+        return detections
+
+def open_detector(model="ssd-inception-v2", threshold=0.5, cpu_fallback=None):
+    """
+    Crée le détecteur correspondant au modèle.
+    :param model: Nom d'un modèle detectNet, ou chemin d'un fichier .onnx (détection sur CPU).
+    :param threshold: Seuil minimum de confiance.
+    :param cpu_fallback: Modèle .onnx utilisé sur CPU si detectNet ne se charge pas (None = pas de repli).
+    """
+    if str(model).endswith(".onnx"):
+        return OnnxDetector(model, threshold=threshold)
+    try:
+        return DetectNetDetector(model, threshold)
+    except Exception as e:
+        if cpu_fallback is None:
+            raise
+        print(f"detectNet indisponible ({e}), détection sur CPU avec {cpu_fallback}")
+        return OnnxDetector(cpu_fallback, threshold=threshold)
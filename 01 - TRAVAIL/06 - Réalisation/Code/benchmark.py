@@ -0,0 +1,766 @@
+# benchmark.py
+# Mesures de performance réalisables sans la Jetson Nano.
+# Le capteur ultrason est simulé par un pseudo-terminal (pty) alimenté par un processus séparé.
+# Usage : python3 benchmark.py <nom>   (ex : python3 benchmark.py parser)
+
+import os
+import sys
+import csv
+import time
+import random
+import tty
+import threading
+import shutil
+import subprocess
+import multiprocessing
+
+import serial
+
+from ultrasonic import UltrasonicSensor, UltrasonicArray, FrameParser, ThresholdBands, FRAME_HEADER
+from serial_trace import TraceReplayer, read_trace
+from estimator import ApproachEstimator
+
+def make_frame(distance_mm):
+    """Construit une trame capteur valide (0xFF, Data_H, Data_L, Checksum)."""
+    hi, lo = (distance_mm >> 8) & 0xFF, distance_mm & 0xFF
+    return bytes((FRAME_HEADER, hi, lo, (FRAME_HEADER + hi + lo) & 0xFF))
+
+def _fake_sensor_writer(master_fd, baudrate, stop_event):
+    """
+    Processus qui écrit des trames dans le maître du pty au débit d'une liaison série.
+    Un pty ne limite pas le débit : on cadence donc les écritures (1 octet = 10 bits).
+    :param baudrate: Débit simulé, ou None pour écrire aussi vite que possible.
+    """
+    frames = b"".join(make_frame(200 + i) for i in range(1000))
+    frame_period = 4 * 10.0 / baudrate if baudrate else 0.0
+    start = time.monotonic()
+    sent = 0
+    while not stop_event.is_set():
+        if frame_period:
+            due = int((time.monotonic() - start) / frame_period) - sent
+            if due <= 0:
+                time.sleep(0.001)
+                continue
+            due = min(due, 1000)
+        else:
+            due = 1000
+        try:
+            os.write(master_fd, frames[:due * 4])
+        except OSError:
+            break
+        sent += due
+
+class FakeSensor:
+    """Capteur ultrason simulé : un pty dont l'esclave s'ouvre comme un vrai port série."""
+
+    def __init__(self, baudrate=9600):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self._stop = multiprocessing.Event()
+        self._proc = multiprocessing.Process(
+            target=_fake_sensor_writer, args=(self.master_fd, baudrate, self._stop), daemon=True
+        )
+        self._proc.start()
+
+    def close(self):
+        self._stop.set()
+        self._proc.join(timeout=2.0)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+def _legacy_read_loop(conn, stop_event, counter):
+    """Reproduction de l'ancienne boucle (lecture octet par octet) pour comparaison."""
+    while not stop_event.is_set():
+        if conn.in_waiting > 0:
+            byte = conn.read(1)
+            if len(byte) == 1 and byte[0] == 0xFF:
+                data = conn.read(3)
+                if len(data) == 3:
+                    hi, lo, chksum = data[0], data[1], data[2]
+                    if (0xFF + hi + lo) & 0xFF == chksum and (hi << 8) + lo > 150:
+                        counter[0] += 1
+        else:
+            time.sleep(0.01)
+
+def _cpu_time():
+    """Temps CPU consommé par ce processus (user + system)."""
+    t = os.times()
+    return t.user + t.system
+
+def _measure(run, duration):
+    """Exécute run() pendant duration secondes, retourne (trames, % CPU du processus lecteur)."""
+    cpu0, wall0 = _cpu_time(), time.monotonic()
+    frames = run(duration)
+    cpu = _cpu_time() - cpu0
+    wall = time.monotonic() - wall0
+    return frames, 100.0 * cpu / wall
+
+def bench_parser(duration=3.0):
+    """
+    Compare l'ancienne boucle octet par octet, le parseur en bloc (une lecture par réveil)
+    et le parseur en bloc avec regroupement de 8 trames par réveil (batch_frames=8), à plusieurs débits.
+    """
+    duration = float(duration)
+    print(f"{'débit':>10} | {'boucle':>8} | {'trames/s':>10} | {'CPU %':>6}")
+    for baudrate in (9600, 115200, 1000000, None):
+        for name in ("octet", "bloc", "lot"):
+            sensor = FakeSensor(baudrate)
+            try:
+                if name == "octet":
+                    def run(d):
+                        conn = serial.Serial(port=sensor.port, baudrate=9600, timeout=1)
+                        stop, counter = threading.Event(), [0]
+                        th = threading.Thread(target=_legacy_read_loop, args=(conn, stop, counter))
+                        th.start()
+                        time.sleep(d)
+                        stop.set()
+                        th.join()
+                        conn.close()
+                        return counter[0]
+                else:
+                    def run(d):
+                        us = UltrasonicSensor(port=sensor.port, baudrate=9600,
+                                              batch_frames=8 if name == "lot" else 1)
+                        time.sleep(d)
+                        frames = us._parser.valid_frames
+                        us.cleanup()
+                        return frames
+                frames, cpu = _measure(run, duration)
+            finally:
+                sensor.close()
+            label = str(baudrate) if baudrate else "max"
+            print(f"{label:>10} | {name:>8} | {frames / duration:>10.0f} | {cpu:>6.1f}")
+
+def synthetic_walk(rate=10.0, seed=0):
+    """
+    Trace simulée d'une marche : approche d'un mur à 1 m/s, arrêt, recul, immobilité.
+    Bruit gaussien de 2 cm et 3 % d'échos parasites.
+    :return: Liste de (timestamp, distance mesurée, distance réelle, vitesse réelle).
+    """
+    rng = random.Random(seed)
+    trace = []
+    t, d = 0.0, 400.0
+    for duration, speed in ((3.5, -100.0), (2.0, 0.0), (2.0, 50.0), (5.0, 0.0)):
+        for _ in range(int(duration * rate)):
+            measured = d + rng.gauss(0.0, 2.0)
+            if rng.random() < 0.03:
+                measured = rng.uniform(20.0, 450.0)
+            trace.append((t, measured, d, speed))
+            t += 1.0 / rate
+            d += speed / rate
+    return trace
+
+def load_trace(path):
+    """
+    Charge une trace enregistrée : flux série brut (.ustr, voir serial_trace.py)
+    ou CSV (timestamp en s, distance en cm).
+    :return: Liste de (timestamp, distance mesurée, None, None).
+    """
+    if path.endswith(".ustr"):
+        parser = FrameParser()
+        samples = []
+        for t, data in read_trace(path)[1]:
+            distance_mm = parser.feed(data)
+            if distance_mm is not None:
+                samples.append((t, distance_mm / 10.0, None, None))
+        return samples
+    with open(path, newline="") as f:
+        return [(float(row[0]), float(row[1]), None, None) for row in csv.reader(f) if row]
+
+def bench_estimator(path=None):
+    """
+    Rejoue une trace hors ligne dans l'estimateur d'approche.
+    Sans fichier, utilise une marche simulée et compare aux valeurs réelles.
+    """
+    trace = load_trace(path) if path else synthetic_walk()
+    estimator = ApproachEstimator()
+
+    speed_errors, ttc_errors, false_alerts = [], [], 0
+    start = time.perf_counter()
+    for t, measured, real_d, real_v in trace:
+        estimator.update(t, measured)
+        if real_d is None:
+            continue
+        speed_errors.append(abs(estimator.closing_speed() + real_v))
+        ttc = estimator.time_to_collision(now=t)
+        if real_v < 0:
+            ttc_errors.append(abs((ttc or float("inf")) - real_d / -real_v) / (real_d / -real_v))
+        elif ttc is not None and ttc < 1.0:
+            false_alerts += 1
+    elapsed = time.perf_counter() - start
+
+    # Mesure du coût seul, sans les calculs d'erreur
+    start = time.perf_counter()
+    for _ in range(100):
+        estimator.reset()
+        for t, measured, _, _ in trace:
+            estimator.update(t, measured)
+    cost = (time.perf_counter() - start) / (100 * len(trace))
+
+    print(f"Mesures          : {len(trace)} ({trace[-1][0] - trace[0][0]:.1f} s)")
+    print(f"Coût par mesure  : {cost * 1e6:.1f} µs")
+    print(f"Durée du rejeu   : {elapsed * 1e3:.1f} ms")
+    if speed_errors:
+        speed_errors.sort()
+        ttc_errors.sort()
+        print(f"Erreur vitesse   : médiane {speed_errors[len(speed_errors) // 2]:.1f} cm/s")
+        print(f"Erreur TTC (approche) : médiane {100 * ttc_errors[len(ttc_errors) // 2]:.0f} %")
+        print(f"Fausses alertes TTC < 1 s (sans approche) : {false_alerts}")
+
+def bench_wakeup(duration=5.0):
+    """
+    Compare la scrutation toutes les 10 ms et l'attente événementielle (select/epoll).
+    Une trame est écrite dans le pty toutes les 50 à 150 ms ; la latence réelle est mesurée
+    entre l'écriture de la trame et sa publication dans l'historique du capteur.
+    """
+    duration = float(duration)
+    rng = random.Random(0)
+    print(f"{'mode':>7} | {'réveils/s':>9} | {'CPU %':>6} | {'lat. p50':>8} | {'lat. p95':>8} | {'lat. max':>8} | interne p95")
+    for mode in ("poll", "select"):
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        us = UltrasonicSensor(port=os.ttyname(slave_fd), mode=mode)
+        written = {}
+        cpu0, wall0 = _cpu_time(), time.monotonic()
+        k = 0
+        while time.monotonic() - wall0 < duration:
+            distance_mm = 200 + k
+            written[distance_mm / 10.0] = time.monotonic()
+            os.write(master_fd, make_frame(distance_mm))
+            k += 1
+            time.sleep(rng.uniform(0.05, 0.15))
+        time.sleep(0.05)
+        cpu = 100.0 * (_cpu_time() - cpu0) / (time.monotonic() - wall0)
+        stats = us.stats()
+        latencies = sorted(s.timestamp - written[s.distance] for s in us.get_history(duration + 1.0))
+        us.cleanup()
+        os.close(master_fd)
+        os.close(slave_fd)
+
+        def ms(p):
+            return f"{1e3 * latencies[min(int(len(latencies) * p), len(latencies) - 1)]:.2f} ms"
+        print(f"{mode:>7} | {stats['wakeups_per_s']:>9} | {cpu:>6.1f} | {ms(0.5):>8} | {ms(0.95):>8} | "
+              f"{ms(1.0):>8} | {stats['latency']['p95_ms']} ms")
+
+def _multi_writer(master_fds, rate, stop_event):
+    """Processus qui écrit une trame dans chaque pty `rate` fois par seconde, phases décalées."""
+    period = 1.0 / rate
+    k = 0
+    next_time = time.monotonic()
+    while not stop_event.is_set():
+        for i, fd in enumerate(master_fds):
+            os.write(fd, make_frame(200 + 100 * i + k % 100))
+            time.sleep(period / len(master_fds))
+        k += 1
+        next_time += period
+        time.sleep(max(0.0, next_time - time.monotonic()))
+
+def bench_array(duration=3.0, rate=50):
+    """
+    Compare N capteurs lus chacun par leur thread et N capteurs servis par un seul thread (UltrasonicArray).
+    Chaque pty reçoit `rate` trames/s.
+    """
+    print(f"{'capteurs':>8} | {'lecture':>10} | {'threads':>7} | {'CPU %':>6} | {'trames/s':>8} | µs CPU/trame")
+    for n in (1, 2, 4, 8):
+        for name in ("séparée", "groupée"):
+            ptys = [os.openpty() for _ in range(n)]
+            for _, slave_fd in ptys:
+                tty.setraw(slave_fd)
+            ports = {f"capteur{i}": os.ttyname(slave_fd) for i, (_, slave_fd) in enumerate(ptys)}
+            stop = multiprocessing.Event()
+            writer = multiprocessing.Process(
+                target=_multi_writer, args=([m for m, _ in ptys], int(rate), stop), daemon=True
+            )
+            writer.start()
+
+            threads0 = threading.active_count()
+            if name == "séparée":
+                sensors = [UltrasonicSensor(port=port) for port in ports.values()]
+            else:
+                array = UltrasonicArray(ports)
+                sensors = list(array.sensors.values())
+            threads = threading.active_count() - threads0
+
+            cpu0, wall0 = _cpu_time(), time.monotonic()
+            time.sleep(float(duration))
+            cpu = 100.0 * (_cpu_time() - cpu0) / (time.monotonic() - wall0)
+            frames = sum(s._parser.valid_frames for s in sensors)
+
+            stop.set()
+            writer.join()
+            if name == "séparée":
+                for sensor in sensors:
+                    sensor.cleanup()
+            else:
+                array.cleanup()
+            for master_fd, slave_fd in ptys:
+                os.close(master_fd)
+                os.close(slave_fd)
+            per_frame = 1e6 * cpu / 100.0 * float(duration) / max(frames, 1)
+            print(f"{n:>8} | {name:>10} | {threads:>7} | {cpu:>6.1f} | {frames / float(duration):>8.0f} | {per_frame:.0f}")
+
+def bench_replay(path, speed="max"):
+    """
+    Rejoue une trace terrain (.ustr) dans UltrasonicSensor via un pty.
+    :param speed: "1" (temps réel), "10" (10x) ou "max" (aussi vite que possible).
+    """
+    replayer = TraceReplayer(path, speed=None if speed == "max" else float(speed))
+    us = UltrasonicSensor(port=replayer.port)
+    cpu0, wall0 = _cpu_time(), time.monotonic()
+    replayer.start()
+    replayer.wait()
+    time.sleep(0.2) # Laisse le thread capteur vider le pty
+    wall = time.monotonic() - wall0
+    cpu = 100.0 * (_cpu_time() - cpu0) / wall
+    stats = us.stats()
+    frames = us._parser.valid_frames
+    us.cleanup()
+    replayer.close()
+    print(f"Trace            : {path} ({len(replayer._chunks)} blocs, vitesse {speed})")
+    print(f"Trames valides   : {frames} en {wall:.2f} s ({frames / wall:.0f} trames/s)")
+    print(f"CPU              : {cpu:.1f} %")
+    print(f"Latence publication : {stats['latency']}")
+
+def bench_bands(samples=100000):
+    """
+    Coût de ThresholdBands.update() par mesure selon le nombre d'abonnés :
+    - zone stable (cas courant) : les abonnés ne sont jamais appelés ;
+    - marche simulée bruitée : ~7 % des mesures changent de zone, chaque changement appelle tous les abonnés.
+    """
+    samples = int(samples)
+    walk = [d for _, d, _, _ in synthetic_walk()]
+    print(f"{'abonnés':>8} | {'stable µs/mesure':>16} | {'marche µs/mesure':>16}")
+    for subscribers in (0, 1, 10, 100, 1000):
+        costs = []
+        for stream in ([150.0], walk):
+            bands = ThresholdBands(max_events=1)
+            for _ in range(subscribers):
+                bands.subscribe(lambda event: None)
+            start = time.perf_counter()
+            for i in range(samples):
+                bands.update(stream[i % len(stream)], i)
+            costs.append((time.perf_counter() - start) / samples * 1e6)
+        print(f"{subscribers:>8} | {costs[0]:>16.2f} | {costs[1]:>16.2f}")
+
+def _gpu_load():
+    """Charge GPU instantanée de la Jetson (0-100 %), None hors Jetson."""
+    try:
+        with open("/sys/devices/gpu.0/load") as f:
+            return int(f.read()) / 10.0
+    except (OSError, ValueError):
+        return None
+
+def bench_mixte_idle(duration=10.0):
+    """
+    (Jetson uniquement) Coût du mode MIXTE, chemins réellement suivis par la boucle principale :
+    - ancien chemin : get_detections() à chaque tour de boucle, sans worker (capture + inférence complète) ;
+    - nouveau chemin, obstacle proche : worker repris à la cadence MIXTE (InferenceScheduler), lecture get_latest() ;
+    - nouveau chemin, sans obstacle : même worker mis en pause, la capture continue (tampon circulaire écrasé).
+    Mesure le CPU du processus et la charge GPU moyenne (/sys/devices/gpu.0/load).
+    """
+    from camera import Camera # Import tardif : jetson_inference n'existe que sur la Jetson
+    from scheduler import InferenceScheduler
+    camera = Camera(model="ssd-inception-v2")
+    scheduler = InferenceScheduler(camera)
+    duration = float(duration)
+
+    def run(tick):
+        gpu, ticks = [], 0
+        cpu0, wall0 = _cpu_time(), time.monotonic()
+        while time.monotonic() - wall0 < duration:
+            tick()
+            load = _gpu_load()
+            if load is not None:
+                gpu.append(load)
+            ticks += 1
+            time.sleep(0.1) # Période de la boucle MIXTE
+        wall = time.monotonic() - wall0
+        cpu = 100.0 * (_cpu_time() - cpu0) / wall
+        gpu_mean = f"{sum(gpu) / len(gpu):.1f}" if gpu else "n/a"
+        return cpu, gpu_mean, ticks / wall
+
+    def worker_tick(distance):
+        scheduler.update("MIXTE", distance)
+        camera.get_latest()
+
+    print(f"{'chemin':>22} | {'CPU %':>6} | {'GPU %':>6} | {'inf./s':>6} | tours/s")
+    try:
+        # Ancien chemin : get_detections() est interdite une fois le worker lancé, on la mesure avant
+        cpu, gpu, ticks = run(camera.get_detections)
+        print(f"{'get_detections':>22} | {cpu:>6.1f} | {gpu:>6} | {ticks:>6.1f} | {ticks:.1f}")
+
+        camera.start_worker(active=False)
+        for name, distance in (("worker, obstacle 1.5 m", 150.0), ("worker en pause", None)):
+            cpu, gpu, ticks = run(lambda: worker_tick(distance))
+            print(f"{name:>22} | {cpu:>6.1f} | {gpu:>6} | {camera.achieved_fps(duration):>6.1f} | {ticks:.1f}")
+    finally:
+        camera.cleanup()
+
+def bench_pipeline(source, model, duration=10.0, roi="none"):
+    """
+    Chaîne caméra complète (worker + détection) sur n'importe quelle machine Linux.
+    :param source: Vidéo, dossier d'images, "/dev/videoN" ou "csi://0".
+    :param model: Fichier .onnx (CPU) ou nom d'un modèle detectNet (Jetson).
+    :param roi: "none" (image complète) ou largeur de la bande centrale (ex : "0.33").
+    """
+    from camera import Camera # Import tardif : nécessite OpenCV ou jetson_utils selon la source
+    camera = Camera(model=model, source=source, roi=None if roi == "none" else float(roi))
+    duration = float(duration)
+    try:
+        camera.start_worker()
+        cpu0, wall0 = _cpu_time(), time.monotonic()
+        counts = []
+        last = None
+        while time.monotonic() - wall0 < duration:
+            result = camera.get_latest(max_age=None)
+            if result is not None and result is not last:
+                counts.append(len(result.detections))
+                last = result
+            time.sleep(0.005)
+        wall = time.monotonic() - wall0
+        cpu = 100.0 * (_cpu_time() - cpu0) / wall
+    finally:
+        camera.cleanup()
+    print(f"Source           : {source} ({camera.source.width}x{camera.source.height}), zone {roi}")
+    print(f"Détecteur        : {type(camera.detector).__name__} ({model})")
+    print(f"Inférences       : {len(counts) / wall:.1f} /s, {sum(counts) / max(len(counts), 1):.1f} objets par image")
+    print(f"CPU              : {cpu:.1f} %")
+
+def bench_motion_gate(path, rate=30.0, infer_fps=10.0, max_staleness=2.0):
+    """
+    Inférences évitées par MotionGate sur une séquence enregistrée (vidéo ou dossier d'images),
+    sans détecteur : chaque image que le worker analyserait à infer_fps passe par la porte.
+    A lancer sur une séquence de marche puis sur une séquence immobile.
+    :param rate: Images par seconde de la séquence.
+    """
+    from camera import MotionGate
+    from backends import open_source
+    source = open_source(path)
+    gate = MotionGate(max_staleness=float(max_staleness))
+    step = max(int(round(float(rate) / float(infer_fps))), 1)
+    index, cost = 0, 0.0
+    try:
+        while True:
+            img = source.capture()
+            if img is None:
+                break
+            if index % step == 0:
+                start = time.perf_counter()
+                gate.should_infer(img, index / float(rate))
+                cost += time.perf_counter() - start
+            index += 1
+    finally:
+        source.close()
+    stats = gate.stats()
+    checked = stats["inferences"] + stats["skipped"]
+    print(f"Séquence         : {path} ({index} images, {index / float(rate):.1f} s)")
+    print(f"Images examinées : {checked} (cadence {infer_fps}/s)")
+    print(f"Inférences       : {stats['inferences']}, évitées : {stats['skipped']} ({stats['saved_percent']} %)")
+    print(f"Coût de la porte : {1e3 * cost / max(checked, 1):.2f} ms par image")
+
+def _power_mw():
+    """Puissance totale de la Jetson Nano (mW) lue sur le capteur INA3221, None hors Jetson."""
+    import glob
+    for path in glob.glob("/sys/bus/i2c/drivers/ina3221x/*/iio:device*/in_power0_input"):
+        try:
+            with open(path) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            pass
+    return None
+
+def bench_profiles(model="ssd-inception-v2", duration=20.0, source="csi://0"):
+    """
+    Latence de bout en bout (capture -> détections publiées) et puissance consommée pour chaque profil de capture.
+    Sur la Jetson, la puissance est lue sur le capteur INA3221 (entrée principale).
+    """
+    from camera import Camera, CAPTURE_PROFILES # Import tardif : nécessite jetson_utils ou OpenCV selon la source
+    camera = Camera(model=model, source=source)
+    duration = float(duration)
+    print(f"{'profil':>8} | {'inf./s':>6} | {'capture p50':>11} | {'total p50':>9} | {'total p95':>9} | {'âge p50':>8} | puissance")
+    try:
+        camera.start_worker()
+        for name in CAPTURE_PROFILES:
+            camera.set_profile(name)
+            time.sleep(3.0) # Réouverture de la source et stabilisation
+            camera.timers.reset()
+            power, ages = [], []
+            wall0 = time.monotonic()
+            while time.monotonic() - wall0 < duration:
+                result = camera.get_latest(max_age=None)
+                if result is not None:
+                    ages.append(time.monotonic() - result.timestamp) # Age du résultat au moment de sa lecture
+                mw = _power_mw()
+                if mw is not None:
+                    power.append(mw)
+                time.sleep(0.1)
+            stages = camera.stage_stats()
+            total, capture = stages.get("total", {}), stages.get("capture", {})
+            ages.sort()
+            age = f"{1e3 * ages[len(ages) // 2]:.0f} ms" if ages else "n/a"
+            watts = f"{sum(power) / len(power) / 1000:.2f} W" if power else "n/a"
+            print(f"{name:>8} | {total.get('count', 0) / duration:>6.1f} | {capture.get('p50_ms', 0):>8.1f} ms | "
+                  f"{total.get('p50_ms', 0):>6.1f} ms | {total.get('p95_ms', 0):>6.1f} ms | {age:>8} | {watts}")
+    finally:
+        camera.cleanup()
+
+class _StampOutput:
+    """Sortie audio factice : note l'instant où le PCM lui est remis, sans rien jouer."""
+
+    def __init__(self):
+        self.stamp = None
+
+    def play(self, pcm, rate):
+        self.stamp = time.monotonic()
+
+    def close(self):
+        pass
+
+class _LegacySoundQueues:
+    """Reproduction de l'ancien Sound (deux Queue, scrutation toutes les 100 ms) pour comparaison."""
+
+    def __init__(self, say, queue_size=10):
+        from queue import Queue
+        self._say = say
+        self._queue_normal = Queue(maxsize=queue_size)
+        self._queue_priority = Queue(maxsize=queue_size)
+        self._stop = False
+        self.wakeups = 0
+        self._worker = threading.Thread(target=self._run_worker, daemon=True)
+        self._worker.start()
+
+    def _run_worker(self):
+        from queue import Empty
+        while not self._stop:
+            self.wakeups += 1
+            text = None
+            if not self._queue_priority.empty():
+                try:
+                    text = self._queue_priority.get_nowait()
+                    self._queue_priority.task_done()
+                except Empty:
+                    pass
+            if text is None:
+                try:
+                    text = self._queue_normal.get(timeout=0.1)
+                    self._queue_normal.task_done()
+                except Empty:
+                    continue
+            self._say(text)
+
+    def speak(self, text, priority=False):
+        from queue import Full, Empty
+        if priority:
+            try:
+                self._queue_priority.put_nowait(text)
+            except Full:
+                pass
+        else:
+            try:
+                while not self._queue_normal.empty():
+                    try:
+                        self._queue_normal.get_nowait()
+                        self._queue_normal.task_done()
+                    except Empty:
+                        break
+                self._queue_normal.put_nowait(text)
+            except Full:
+                pass
+
+    def cleanup(self):
+        self._stop = True
+        self._worker.join(timeout=1.0)
+
+class _NullEngine:
+    """Moteur de synthèse factice : isole le coût de la file de messages."""
+    rate = 16000
+    _pcm = None
+
+    def synthesize(self, text):
+        return self._pcm
+
+    def close(self):
+        pass
+
+def bench_speak(calls=100000, messages=200):
+    """
+    File de messages de Sound : ancien fonctionnement (deux Queue scrutées toutes les 100 ms)
+    vs boîte aux lettres (verrou + condition). Mesure le coût d'un appel à speak(), le délai entre
+    speak() et la prise en charge par le worker, et les réveils du worker à vide.
+    """
+    import numpy as np
+    from sound import Sound, VoiceEffect
+    calls, messages = int(calls), int(messages)
+    _NullEngine._pcm = np.zeros(16, np.int16)
+    rng = random.Random(0)
+    print(f"{'file':>17} | {'speak() normal':>14} | {'prioritaire':>11} | {'délai p50':>9} | {'délai p95':>9} | réveils/s à vide")
+    for name in ("Queue", "boîte aux lettres"):
+        requested = {}
+        delays = []
+        output = _StampOutput()
+
+        def say(text):
+            if text in requested:
+                delays.append(time.monotonic() - requested.pop(text))
+
+        if name == "Queue":
+            sound = _LegacySoundQueues(say)
+        else:
+            sound = Sound(engine=_NullEngine(), output=output, effect=VoiceEffect(tempo=1.0, pitch_cents=0))
+        try:
+            # Réveils à vide
+            wakeups0 = sound.wakeups
+            time.sleep(2.0)
+            idle_wakeups = (sound.wakeups - wakeups0) / 2.0
+
+            # Délai speak() -> prise en charge, messages espacés comme les annonces
+            for i in range(messages):
+                text = f"m{i}"
+                requested[text] = time.monotonic()
+                sound.speak(text, priority=(i % 2 == 0))
+                time.sleep(rng.uniform(0.005, 0.02))
+            time.sleep(0.2)
+            if name != "Queue":
+                summary = sound.queue_delay.summary()
+                p50, p95 = summary["p50_ms"], summary["p95_ms"]
+            else:
+                delays.sort()
+                p50, p95 = 1e3 * delays[len(delays) // 2], 1e3 * delays[int(len(delays) * 0.95)]
+
+            # Coût d'un appel (le worker consomme en parallèle)
+            start = time.perf_counter()
+            for i in range(calls):
+                sound.speak("150")
+            normal_us = 1e6 * (time.perf_counter() - start) / calls
+            start = time.perf_counter()
+            for i in range(calls // 10):
+                sound.speak("Mode MIXTE", priority=True)
+            priority_us = 1e6 * (time.perf_counter() - start) / (calls // 10)
+        finally:
+            sound.cleanup()
+        print(f"{name:>17} | {normal_us:>11.2f} µs | {priority_us:>8.2f} µs | {p50:>6.2f} ms | {p95:>6.2f} ms | {idle_wakeups:.1f}")
+
+def bench_tts(repeat=5, script="./text_to_speech.sh"):
+    """
+    Latence texte -> premier échantillon : script text_to_speech.sh (bash + pico2wave + sox + aplay),
+    moteur résident de sound.py (synthèse et effets dans le processus), puis cache de phrases pré-calculées.
+    Rien n'est joué : pour le script, un faux `aplay` placé en tête du PATH note l'instant où il est lancé ;
+    pour le moteur résident, l'instant où le PCM est remis à la sortie audio.
+    """
+    import tempfile
+    from sound import Sound, PhraseCache
+    from main import vocabulaire
+    phrases = ["150", "personne à gauche 230", "Mode EXPLORATION"]
+    repeat = int(repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        stamp_file = os.path.join(tmp, "stamp")
+        shim = os.path.join(tmp, "aplay")
+        with open(shim, "w") as f:
+            f.write('#!/bin/sh\ndate +%s%N > "$TTS_STAMP"\ncat > /dev/null\n')
+        os.chmod(shim, 0o755)
+        env = dict(os.environ, PATH=tmp + os.pathsep + os.environ.get("PATH", ""), TTS_STAMP=stamp_file)
+
+        def run_script(text):
+            start = time.time_ns()
+            subprocess.run([script, text], env=env, check=False, stdin=subprocess.DEVNULL)
+            with open(stamp_file) as f:
+                return (int(f.read()) - start) / 1e6
+
+        output = _StampOutput()
+        load_start = time.monotonic()
+        sound = Sound(script_path=script, output=output)
+        load_ms = 1e3 * (time.monotonic() - load_start)
+        cache = PhraseCache(os.path.join(tmp, "phrases"))
+
+        def run_engine(text):
+            start = time.monotonic()
+            sound._say(text) # Appel synchrone, sans passer par la file d'attente
+            return 1e3 * (output.stamp - start)
+
+        def p50(values):
+            return f"{values[len(values) // 2]:>7.1f} ms" if values else f"{'n/a':>10}"
+
+        print(f"Moteur résident  : {type(sound.engine).__name__ if sound.engine else 'aucun'}, chargé en {load_ms:.0f} ms")
+        if sound.engine:
+            sound.cache = cache
+            start = time.monotonic()
+            sound.build_cache(vocabulaire(["personne", "chaise"], ["MARCHE", "EXPLORATION", "MIXTE"]))
+            print(f"Cache de phrases : {len(cache)} clips en {time.monotonic() - start:.1f} s")
+        print(f"{'phrase':>24} | {'script p50':>10} | {'résident p50':>12} | {'cache p50':>10}")
+        try:
+            for text in phrases:
+                legacy = sorted(run_script(text) for _ in range(repeat))
+                resident, cached = [], []
+                if sound.engine:
+                    sound.cache = None
+                    resident = sorted(run_engine(text) for _ in range(repeat))
+                    sound.cache = cache
+                    cached = sorted(run_engine(text) for _ in range(repeat))
+                print(f"{text:>24} | {p50(legacy)} | {p50(resident):>12} | {p50(cached)}")
+        finally:
+            sound.cleanup()
+
+def bench_audio(device="null", messages=20, interval=0.5):
+    """
+    Sortie audio ouverte en permanence (sound.PcmStream) : ouverture du périphérique, latence de sortie
+    du premier échantillon de chaque message et sous-débits, avec du silence écrit entre les messages.
+    Comparée à l'ancien fonctionnement (un aplay par message) si aplay est disponible.
+    :param device: Périphérique ALSA ("null", "plughw:2,0"...) ou fichier .wav (machine sans carte son).
+    """
+    import numpy as np
+    from sound import open_output, FileOutput
+    messages, interval = int(messages), float(interval)
+    rate = 16000
+    tone = (8000 * np.sin(2 * np.pi * 440 * np.arange(int(0.3 * rate)) / rate)).astype(np.int16)
+    output = FileOutput(device) if device.endswith(".wav") else open_output(device)
+    print(f"Sortie           : {type(output).__name__} ({device}), ouverte en {1e3 * output.open_time:.1f} ms")
+    cpu0, wall0 = _cpu_time(), time.monotonic()
+    try:
+        for _ in range(messages):
+            output.play(tone, rate)
+            end = time.monotonic() + interval
+            while time.monotonic() < end:
+                if not output.idle():
+                    time.sleep(0.01)
+    finally:
+        output.close()
+    wall = time.monotonic() - wall0
+    latency = output.latency.summary()
+    print(f"Latence sortie   : p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, max {latency['max_ms']} ms")
+    print(f"Sous-débits      : {output.underruns} sur {messages} messages")
+    print(f"CPU              : {100.0 * (_cpu_time() - cpu0) / wall:.1f} %")
+
+    if not device.endswith(".wav") and shutil.which("aplay") is not None:
+        overheads = []
+        for _ in range(min(messages, 5)):
+            start = time.monotonic()
+            subprocess.run(["aplay", "-q", "-D", device, "-t", "raw", "-f", "S16_LE", "-r", str(rate), "-c", "1"],
+                           input=tone.tobytes(), stderr=subprocess.DEVNULL)
+            overheads.append(time.monotonic() - start - len(tone) / rate)
+        overheads.sort()
+        print(f"Un aplay/message : {1e3 * overheads[len(overheads) // 2]:.1f} ms de plus que la durée du son (p50)")
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "estimator": bench_estimator,
+    "wakeup": bench_wakeup,
+    "array": bench_array,
+    "replay": bench_replay,
+    "bands": bench_bands,
+    "mixte_idle": bench_mixte_idle,
+    "pipeline": bench_pipeline,
+    "motion_gate": bench_motion_gate,
+    "profiles": bench_profiles,
+    "tts": bench_tts,
+    "audio": bench_audio,
+    "speak": bench_speak,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage : python3 benchmark.py <{'|'.join(BENCHMARKS)}> [arguments]")
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
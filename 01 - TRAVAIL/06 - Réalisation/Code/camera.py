@@ -1,25 +1,396 @@
 # camera.py
 # Ce fichier gère la détection d'objets à partir de la caméra connectée à la Jetson Nano.
-# Il utilise la bibliothèque Jetson Inference pour effectuer les détections et
-# Jetson Utils pour capturer les images depuis la caméra.
+# Par défaut, il utilise la bibliothèque Jetson Inference pour effectuer les détections et
+# Jetson Utils pour capturer les images depuis la caméra (autres sources et détecteurs : backends.py).
 
-from jetson_inference import detectNet
-from jetson_utils import videoSource
+import json
+import time
+import threading
+from collections import deque, namedtuple
+
+import numpy as np
+
+from metrics import StageTimers
+from backends import Detection, FrameSource, Detector, Thumbnailer, image_size, open_source, open_detector
+
+# Résultat publié par le worker : horodatage monotone de l'image, détections (tuple immuable)
+DetectionResult = namedtuple("DetectionResult", ["timestamp", "detections"])
+
+def to_full_frame(detection, offset_x=0, offset_y=0):
+    """
+    Recopie une détection en la replaçant dans l'image complète.
+    :param detection: Détection de jetson_inference (ou Detection) calculée sur une zone recadrée.
+    :param offset_x: Abscisse du coin haut gauche de la zone dans l'image complète (px).
+    :param offset_y: Ordonnée du coin haut gauche de la zone dans l'image complète (px).
+    :return: Detection.
+    """
+    left, top = detection.Left + offset_x, detection.Top + offset_y
+    right, bottom = detection.Right + offset_x, detection.Bottom + offset_y
+    return Detection(detection.ClassID, detection.Confidence, left, top, right, bottom,
+                     ((left + right) / 2.0, (top + bottom) / 2.0))
+
+# Informations d'une classe du modèle, calculées une fois au chargement :
+# nom français, nom anglais normalisé, priorité de danger (0 = aucun), annonce activée
+ClassInfo = namedtuple("ClassInfo", ["label", "english", "priority", "announce"])
+
+# Priorité de danger par classe COCO (les classes absentes valent 0)
+HAZARD_PRIORITY = {
+    "car": 3, "bus": 3, "truck": 3, "motorcycle": 3, "bicycle": 3, "train": 3,
+    "person": 2, "dog": 2, "stop sign": 2, "traffic light": 2, "fire hydrant": 2,
+    "bench": 1, "chair": 1, "couch": 1, "dining table": 1, "potted plant": 1, "bed": 1,
+    "suitcase": 1, "toilet": 1, "refrigerator": 1,
+}
+
+# Entrées du fichier de labels qui ne sont pas des objets (jamais annoncées)
+IGNORED_CLASSES = {"unlabeled", "background", "n/a"}
+
+def build_class_table(descriptions, translations, priorities=HAZARD_PRIORITY, ignored=IGNORED_CLASSES):
+    """
+    Construit la table ClassID -> ClassInfo.
+    :param descriptions: Noms anglais des classes, dans l'ordre des ClassID.
+    :param translations: Dictionnaire nom anglais (minuscules) -> nom français.
+    :param priorities: Dictionnaire nom anglais -> priorité de danger.
+    :param ignored: Noms anglais à ne jamais annoncer.
+    :return: Liste de ClassInfo indexée par ClassID.
+    """
+    table = []
+    for description in descriptions:
+        english = description.strip().lower()
+        table.append(ClassInfo(translations.get(english, description), english,
+                               priorities.get(english, 0), english not in ignored))
+    return table
+
+# Taille réelle typique par classe COCO : (largeur, hauteur) en mètres, 0 = inconnue
+SIZE_PRIORS = {
+    "person": (0.5, 1.7), "bicycle": (1.7, 1.0), "car": (4.2, 1.5), "motorcycle": (2.0, 1.1),
+    "bus": (11.0, 3.0), "truck": (7.0, 3.0), "train": (0.0, 3.8), "traffic light": (0.3, 0.9),
+    "fire hydrant": (0.3, 0.7), "stop sign": (0.75, 0.75), "bench": (1.5, 0.8), "dog": (0.8, 0.5),
+    "cat": (0.45, 0.3), "suitcase": (0.45, 0.65), "chair": (0.5, 0.9), "couch": (2.0, 0.85),
+    "potted plant": (0.4, 0.6), "bed": (1.6, 0.6), "dining table": (1.4, 0.75), "toilet": (0.4, 0.8),
+    "tv": (1.0, 0.6), "refrigerator": (0.7, 1.8), "backpack": (0.3, 0.45), "umbrella": (1.0, 0.0),
+}
+
+class DistanceEstimator:
+    """
+    Distance des objets détectés à partir de la taille de leur boîte (modèle sténopé) :
+    distance = focale (px) * taille réelle (m) / taille dans l'image (px).
+    Un facteur d'échelle corrige l'ensemble à partir des mesures ultrason du secteur central (calibrate()).
+    """
+
+    def __init__(self, widths, heights, focal_ratio=0.83, alpha=0.2, max_correction=2.0):
+        """
+        :param widths: Largeurs réelles (m) indexées par ClassID, 0 = inconnue.
+        :param heights: Hauteurs réelles (m) indexées par ClassID, 0 = inconnue.
+        :param focal_ratio: Focale divisée par la largeur de l'image (0.83 : champ horizontal de 62°, caméra IMX219).
+        :param alpha: Poids d'une nouvelle mesure ultrason dans la correction d'échelle.
+        :param max_correction: Ecart maximal (facteur) accepté entre caméra et ultrason pour une calibration,
+                               et borne de l'échelle cumulée (entre 1/max_correction et max_correction).
+        """
+        self.widths = np.asarray(widths, dtype=float)
+        self.heights = np.asarray(heights, dtype=float)
+        self.focal_ratio = focal_ratio
+        self.alpha = alpha
+        self.max_correction = max_correction
+        self.scale = 1.0
+        self.calibrations = 0
+
+    @classmethod
+    def from_classes(cls, classes, priors=SIZE_PRIORS, **kwargs):
+        """Construit l'estimateur à partir de la table des classes (voir build_class_table)."""
+        sizes = [priors.get(info.english, (0.0, 0.0)) for info in classes]
+        return cls([w for w, _ in sizes], [h for _, h in sizes], **kwargs)
+
+    def estimate(self, detections, image_width, image_height):
+        """
+        Estime la distance de toutes les détections d'une image en une fois.
+        La hauteur est utilisée, sauf si la boîte touche le haut ou le bas de l'image (objet coupé) :
+        la largeur est alors utilisée si elle est connue.
+        :return: Tableau des distances (cm), NaN pour les classes de taille inconnue.
+        """
+        if not detections:
+            return np.empty(0)
+        boxes = np.array([(d.ClassID, d.Left, d.Top, d.Right, d.Bottom) for d in detections], dtype=float)
+        class_ids = boxes[:, 0].astype(int)
+        known = (class_ids >= 0) & (class_ids < len(self.heights))
+        class_ids = np.where(known, class_ids, 0)
+        real_w = np.where(known, self.widths[class_ids], 0.0)
+        real_h = np.where(known, self.heights[class_ids], 0.0)
+
+        truncated = (boxes[:, 2] <= 1) | (boxes[:, 4] >= image_height - 1)
+        use_width = (truncated | (real_h <= 0)) & (real_w > 0)
+        size_m = np.where(use_width, real_w, real_h)
+        size_px = np.maximum(np.where(use_width, boxes[:, 3] - boxes[:, 1], boxes[:, 4] - boxes[:, 2]), 1.0)
+
+        distances = self.scale * self.focal_ratio * image_width * size_m / size_px * 100.0
+        distances[size_m <= 0] = np.nan
+        return distances
+
+    def calibrate(self, estimate_cm, measured_cm):
+        """
+        Rapproche l'échelle de la mesure ultrason d'un objet vu par la caméra dans le même secteur.
+        :param estimate_cm: Distance estimée par la caméra (cm).
+        :param measured_cm: Distance mesurée par l'ultrason (cm).
+        :return: True si la mesure a été prise en compte (écart plausible).
+        """
+        if not estimate_cm > 0 or not measured_cm > 0:
+            return False
+        ratio = measured_cm / estimate_cm
+        if not 1.0 / self.max_correction <= ratio <= self.max_correction:
+            return False # Probablement un autre obstacle (mur, poteau) que l'objet reconnu
+        # Moyenne glissante en logarithme : correction symétrique (x2 et /2 pèsent autant)
+        self.scale *= ratio ** self.alpha
+        # Borne globale : des appariements faux répétés (mur derrière l'objet) ne font pas dériver l'échelle
+        self.scale = min(max(self.scale, 1.0 / self.max_correction), self.max_correction)
+        self.calibrations += 1
+        return True
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    IoU (intersection / union) de chaque boîte de A avec chaque boîte de B, calculé en une fois.
+    :param boxes_a: Tableau (n, 4) de boîtes (left, top, right, bottom).
+    :param boxes_b: Tableau (m, 4).
+    :return: Tableau (n, m).
+    """
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+class Track:
+    """Objet suivi d'une image à l'autre."""
+
+    def __init__(self, track_id, detection, timestamp):
+        self.id = track_id
+        self.class_id = detection.ClassID
+        self.box = np.array((detection.Left, detection.Top, detection.Right, detection.Bottom), dtype=float)
+        self.velocity = np.zeros(4) # Déplacement de la boîte (px/s)
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1 # Nombre d'images où l'objet a été détecté
+        self.confidence = detection.Confidence
+        self.last_announced = None # Instant de la dernière annonce
+        self.announced_position = None # Position ("à gauche"...) lors de la dernière annonce
+        self.announced_height = None # Hauteur de la boîte lors de la dernière annonce (px)
+
+    def age(self, timestamp):
+        """Durée de suivi (s)."""
+        return timestamp - self.first_seen
+
+    def predict(self, timestamp):
+        """Boîte extrapolée à l'instant donné (vitesse constante)."""
+        return self.box + self.velocity * (timestamp - self.last_seen)
+
+    def detection(self, timestamp=None):
+        """
+        :param timestamp: Instant de la boîte voulue, None = dernière boîte détectée.
+        :return: Detection (utilisable par Camera.get_object_position()).
+        """
+        box = self.box if timestamp is None else self.predict(timestamp)
+        left, top, right, bottom = (float(v) for v in box)
+        return Detection(self.class_id, self.confidence, left, top, right, bottom,
+                         ((left + right) / 2.0, (top + bottom) / 2.0))
+
+    def _update(self, detection, timestamp):
+        box = np.array((detection.Left, detection.Top, detection.Right, detection.Bottom), dtype=float)
+        dt = timestamp - self.last_seen
+        if dt > 0:
+            self.velocity = 0.5 * self.velocity + 0.5 * (box - self.box) / dt # Lissage
+        self.box = box
+        self.last_seen = timestamp
+        self.confidence = detection.Confidence
+        self.hits += 1
+
+class ObjectTracker:
+    """
+    Suivi multi-objets par recouvrement des boîtes (IoU) : un identifiant stable par objet,
+    pour n'annoncer que les objets nouveaux, qui changent de position ou qui se sont nettement rapprochés.
+    Entre deux inférences, les boîtes sont extrapolées (Track.predict()).
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=1.5, min_hits=2, closer_ratio=1.5):
+        """
+        :param iou_threshold: IoU minimal pour associer une détection à un objet suivi.
+        :param max_age: Durée (s) sans détection au-delà de laquelle un objet est oublié.
+        :param min_hits: Nombre de détections avant la première annonce (évite les fausses détections isolées).
+        :param closer_ratio: Croissance de la hauteur de boîte depuis la dernière annonce qui déclenche une nouvelle annonce.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.closer_ratio = closer_ratio
+        self.tracks = []
+        self._next_id = 1
+
+    def reset(self):
+        """Oublie tous les objets (ex : entrée dans le mode EXPLORATION, tout est annoncé à nouveau)."""
+        self.tracks = []
+
+    def update(self, detections, timestamp):
+        """
+        Associe les détections d'une image aux objets suivis.
+        Coût : matrice IoU n x m vectorisée, puis association gloutonne des meilleures paires.
+        :param detections: Détections de l'image.
+        :param timestamp: Horodatage monotone de l'image (s).
+        :return: Liste des objets suivis.
+        """
+        detections = list(detections)
+        tracks = [t for t in self.tracks if timestamp - t.last_seen <= self.max_age]
+        matched_tracks, matched_dets = set(), set()
+
+        if tracks and detections:
+            predicted = np.array([t.predict(timestamp) for t in tracks])
+            boxes = np.array([(d.Left, d.Top, d.Right, d.Bottom) for d in detections], dtype=float)
+            iou = iou_matrix(predicted, boxes)
+            # Pas d'association entre classes différentes
+            same_class = (np.array([t.class_id for t in tracks])[:, None]
+                          == np.array([d.ClassID for d in detections])[None, :])
+            iou[~same_class] = 0.0
+            for flat in np.argsort(iou, axis=None)[::-1]:
+                i, j = divmod(int(flat), len(detections))
+                if iou[i, j] < self.iou_threshold:
+                    break
+                if i in matched_tracks or j in matched_dets:
+                    continue
+                tracks[i]._update(detections[j], timestamp)
+                matched_tracks.add(i)
+                matched_dets.add(j)
+
+        for j, det in enumerate(detections):
+            if j not in matched_dets:
+                tracks.append(Track(self._next_id, det, timestamp))
+                self._next_id += 1
+
+        self.tracks = tracks
+        return tracks
+
+    def to_announce(self, position_of, timestamp):
+        """
+        Sélectionne les objets à annoncer et les marque comme annoncés.
+        :param position_of: Fonction detection -> position ("à gauche", "devant", "à droite").
+        :param timestamp: Instant de l'annonce.
+        :return: Liste de (objet suivi, position).
+        """
+        selected = []
+        for track in self.tracks:
+            if track.hits < self.min_hits:
+                continue
+            position = position_of(track.detection())
+            height = track.box[3] - track.box[1]
+            if (track.last_announced is None or position != track.announced_position
+                    or height >= self.closer_ratio * track.announced_height):
+                track.last_announced = timestamp
+                track.announced_position = position
+                track.announced_height = height
+                selected.append((track, position))
+        return selected
+
+class MotionGate:
+    """
+    Evite l'inférence quand la scène n'a pas changé (utilisateur immobile face à une scène fixe) :
+    la vignette de chaque image est comparée à celle de la dernière image analysée.
+    """
+
+    def __init__(self, pixel_threshold=15.0, changed_fraction=0.01, max_staleness=2.0, thumbnailer=None):
+        """
+        :param pixel_threshold: Ecart de niveau de gris (0-255) à partir duquel un pixel de la vignette a changé.
+        :param changed_fraction: Part de pixels changés qui impose une nouvelle inférence (un objet qui entre
+                                 dans le champ change une petite zone : on ne moyenne pas sur toute l'image).
+        :param max_staleness: Durée maximale (s) pendant laquelle les détections précédentes sont resservies.
+        :param thumbnailer: Calcul des vignettes (Thumbnailer 64x36 par défaut).
+        """
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_staleness = max_staleness
+        self.thumbnailer = thumbnailer or Thumbnailer()
+        self.inferences = 0
+        self.skipped = 0
+        self.reset()
+
+    def reset(self):
+        """Impose une inférence à la prochaine image (reprise, changement de zone d'intérêt)."""
+        self._reference = None
+        self._reference_time = None
+
+    def should_infer(self, img, timestamp):
+        """
+        :param img: Image capturée.
+        :param timestamp: Horodatage monotone de l'image (s).
+        :return: True si l'image doit être analysée (elle devient alors la référence).
+        """
+        thumb = self.thumbnailer(img)
+        reference = self._reference
+        if (reference is None or reference.shape != thumb.shape
+                or timestamp - self._reference_time > self.max_staleness
+                or np.count_nonzero(np.abs(thumb - reference) > self.pixel_threshold)
+                > self.changed_fraction * thumb.size):
+            self._reference = thumb
+            self._reference_time = timestamp
+            self.inferences += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        """Inférences faites et évitées (dictionnaire)."""
+        total = self.inferences + self.skipped
+        return {
+            "inferences": self.inferences,
+            "skipped": self.skipped,
+            "saved_percent": round(100.0 * self.skipped / total, 1) if total else 0.0,
+        }
+
+# Profils de capture : le réseau n'analyse que 300x300 pixels, capturer plus coûte du transfert et du redimensionnement
+CaptureProfile = namedtuple("CaptureProfile", ["width", "height", "rate"])
+CAPTURE_PROFILES = {
+    "720p30": CaptureProfile(1280, 720, 30), # Exploration : objets lointains et petits
+    "360p30": CaptureProfile(640, 360, 30),
+    "360p15": CaptureProfile(640, 360, 15), # Mixte : obstacle proche, déjà localisé par l'ultrason
+}
 
 class Camera:
 
-    def __init__(self, model="ssd-inception-v2", threshold=0.5): #mobilenet
+    def __init__(self, model="ssd-inception-v2", threshold=0.5, roi=None, background=False,
+                 source="csi://0", cpu_fallback=None, motion_gate=None, stats_interval=None,
+                 profile="720p30"): #mobilenet
         """
         Initialise la caméra et le modèle de détection.
-        :param model: Modèle utilisé pour détecter les objets (par défaut : "ssd-mobilenet-v2").
+        :param model: Modèle utilisé pour détecter les objets (par défaut : "ssd-mobilenet-v2") : nom detectNet,
+                      fichier .onnx (détection sur CPU) ou objet Detector (voir backends.py).
         :param threshold: Seuil minimum de confiance pour les détections.
+        :param roi: Largeur de la bande centrale analysée (fraction de l'image, ex : 1/3), None = image complète.
+        :param background: Si True, le chargement (1 à 2 minutes sur la Jetson Nano) se fait dans un thread :
+                           le constructeur rend la main tout de suite, voir is_ready() / wait_ready().
+        :param source: Source des images : "csi://0", vidéo, dossier d'images, "/dev/videoN" ou objet FrameSource.
+        :param cpu_fallback: Modèle .onnx utilisé sur CPU si detectNet ne se charge pas (None = pas de repli).
+        :param motion_gate: MotionGate du worker : les images quasi identiques ne sont pas analysées (None = toujours).
+        :param stats_interval: Si renseigné, le worker affiche la durée de chaque étape toutes les stats_interval
+                               secondes (ligne "STATS_CAMERA {json}"), sur l'intervalle écoulé.
+        :param profile: Profil de capture (voir CAPTURE_PROFILES), modifiable ensuite avec set_profile().
         """
-        # Argv --headless permet de lancer le script sans interface graphique
-        argv = ['--headless']
-        self.net = detectNet(model, threshold=threshold, argv=argv)
-        
-        # Ajout de --input-flip=rotate-180 pour corriger la caméra à l'envers
-        self.camera = videoSource("csi://0", argv=argv + ["--input-width=1280", "--input-height=720", "--input-rate=30"])
+        self.model = model
+        self.threshold = threshold
+        self.source_uri = source
+        self.cpu_fallback = cpu_fallback
+        self.detector = None
+        self.source = None
+        self.profile = profile
+        self.frame_width, self.frame_height = CAPTURE_PROFILES[profile][:2] # Taille des images analysées
+        self._pending_profile = None # Profil à appliquer par le worker (réouverture de la source)
+        self.motion_gate = motion_gate
+        # Durée de chaque étape du traitement d'une image (voir stage_stats())
+        self.timers = StageTimers(("capture", "gate", "crop", "detect", "postprocess", "total"))
+        self.stats_interval = stats_interval
+        self._last_stats_dump = time.monotonic()
+        self.classes = []
+        self.distance_estimator = None # Créé au chargement (tailles des classes du modèle)
+        self.load_time = None # Durée du chargement (s)
+        self.load_error = None # Exception levée pendant un chargement en arrière-plan
+        self._ready = threading.Event()
+        self._closing = False # cleanup() appelé : un chargement en cours ne publie plus rien
 
         # Dictionnaire de traduction Anglais -> Français pour le dataset COCO (91 classes)
         self.translations = {
@@ -39,36 +410,384 @@ class Camera:
             "teddy bear": "ours en peluche", "hair drier": "sèche-cheveux", "toothbrush": "brosse à dents"
         }
 
+        # Worker d'inférence asynchrone (voir start_worker) : double tampon de résultats
+        self._results = [None, None]
+        self._front = 0 # Indice du résultat lisible
+        self._worker = None
+        self._worker_running = False
+        self._worker_active = threading.Event()
+        self._valid_after = 0.0 # Les résultats plus anciens ne sont plus servis (reprise, changement de zone)
+        self._roi = roi
+        self._period = 0.0 # Intervalle minimal entre deux inférences (s), 0 = au plus vite (voir set_rate)
+        self._rate_changed = threading.Event()
+        self._inference_times = deque(maxlen=256) # Instants des dernières inférences (FPS obtenu)
+
+        self._loader = None
+        if background:
+            self._loader = threading.Thread(target=self._load_background, daemon=True)
+            self._loader.start()
+        else:
+            self._load()
+
+    def _load(self):
+        """Charge le modèle de détection et ouvre la caméra (long : optimisation TensorRT, GStreamer)."""
+        start = time.monotonic()
+        if isinstance(self.model, Detector):
+            detector = self.model
+        else:
+            detector = open_detector(self.model, self.threshold, self.cpu_fallback)
+
+        if isinstance(self.source_uri, FrameSource):
+            source = self.source_uri
+        else:
+            source = open_source(self.source_uri, *CAPTURE_PROFILES[self.profile])
+        try:
+            # Table des classes (nom français, priorité, annonce) : une seule lecture par détection ensuite
+            classes = build_class_table(detector.class_names(), self.translations)
+        except Exception:
+            source.close()
+            raise
+        if self._closing:
+            # cleanup() est passé pendant le chargement : personne d'autre ne fermera cette source
+            source.close()
+            return
+
+        self.detector, self.source = detector, source
+        self.frame_width, self.frame_height = source.width, source.height
+        self.detector.timers = self.timers # Etapes internes au détecteur (prétraitement, réseau...)
+        self.classes = classes
+        self.distance_estimator = DistanceEstimator.from_classes(self.classes)
+        self.load_time = time.monotonic() - start
+        self._ready.set()
+
+    def _load_background(self):
+        try:
+            self._load()
+        except Exception as e:
+            self.load_error = e
+            print(f"Erreur chargement caméra : {e}")
+
+    def is_ready(self):
+        """Retourne True quand le modèle et la caméra sont chargés."""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        """
+        Attend la fin du chargement.
+        :return: True si la caméra est prête.
+        """
+        return self._ready.wait(timeout)
+
     def get_detections(self):
         """
         Capture une image depuis la caméra et détecte les objets.
-        :return: Une liste des objets détectés ou une liste vide si aucune image n'est capturée.
+        :return: Les objets détectés (Detection) ou une liste vide si aucune image n'est capturée.
         """
-        img = self.camera.Capture()  # Capture une image.
+        if not self._ready.is_set():
+            return []  # Chargement en arrière-plan pas encore terminé.
+        self._apply_pending_profile()
+        start = time.monotonic_ns()
+        img, _ = self.grab_latest()  # Capture l'image la plus récente.
+        self.timers.record("capture", time.monotonic_ns() - start)
         if img is None:
             return []  # Si aucune image n'est capturée, retourne une liste vide.
         
-        detections = self.net.Detect(img)  # Applique le modèle de détection sur l'image.
+        detections = self._detect(img)  # Applique le modèle de détection sur l'image (ou sa bande centrale).
+        return detections
+
+    def set_roi(self, roi):
+        """
+        Restreint la détection à la bande centrale de l'image (secteur "devant").
+        Moins de pixels à prétraiter, et les objets annoncés occupent une plus grande part de l'entrée du réseau.
+        :param roi: Largeur de la bande (fraction de l'image, ex : 1/3), None = image complète.
+        """
+        if roi != self._roi:
+            self._roi = roi
+            self._valid_after = time.monotonic() # Les résultats de l'ancienne zone ne sont plus servis
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+
+    def _detect(self, img):
+        """
+        Détection sur l'image complète, ou sur la bande centrale si une zone d'intérêt est définie.
+        Les classes dont l'annonce est désactivée (voir ClassInfo) sont écartées.
+        :return: Tuple de Detection en coordonnées de l'image complète.
+        """
+        timers = self.timers
+        roi = self._roi
+        left = 0
+        if roi is not None:
+            start = time.monotonic_ns()
+            width, height = image_size(img)
+            left = int(width * (1.0 - roi) / 2)
+            img = self.detector.crop(img, left, 0, width - left, height)
+            timers.record("crop", time.monotonic_ns() - start)
+
+        start = time.monotonic_ns()
+        raw = self.detector.detect(img)
+        detect_end = time.monotonic_ns()
+        detections = tuple(to_full_frame(det, left, 0) for det in raw if self.get_class_info(det.ClassID).announce)
+        timers.record("detect", detect_end - start)
+        timers.record("postprocess", time.monotonic_ns() - detect_end)
         return detections
 
+    def grab_latest(self):
+        """
+        Capture une image puis vide les images déjà en attente pour ne garder que la plus récente.
+        Aucune inférence n'est faite.
+        :return: (image, horodatage monotone) ou (None, None).
+        """
+        img = self.source.capture()
+        timestamp = time.monotonic()
+        while img is not None:
+            newer = self._capture_nowait()
+            if newer is None:
+                break
+            img, timestamp = newer, time.monotonic()
+        return img, timestamp
+
+    def _capture_nowait(self):
+        """Capture non bloquante : None si aucune nouvelle image n'est prête."""
+        try:
+            return self.source.capture(timeout=0)
+        except Exception:
+            return None
+
+    def start_worker(self, active=True):
+        """
+        Lance la capture + détection en arrière-plan. La boucle principale lit ensuite get_latest()
+        sans jamais attendre le GPU. get_detections() ne doit plus être appelée tant que le worker tourne.
+        Peut être appelée pendant un chargement en arrière-plan : le worker démarre à la fin du chargement.
+        :param active: Si False, le worker démarre en pause (voir resume()).
+        """
+        if self._worker is not None:
+            return
+        self._worker_running = True
+        if active:
+            self._worker_active.set()
+        self._worker = threading.Thread(target=self._run_worker, daemon=True)
+        self._worker.start()
+
+    def pause(self):
+        """
+        Suspend l'inférence (ex : mode MARCHE, ou MIXTE sans obstacle). Le GPU reste au repos :
+        les images s'accumulent seulement dans le tampon circulaire de capture, vidé par grab_latest() à la reprise.
+        """
+        self._worker_active.clear()
+        self._rate_changed.set()
+
+    def resume(self):
+        """Reprend l'inférence. Les résultats calculés avant la pause ne sont plus servis."""
+        if not self._worker_active.is_set():
+            self._valid_after = time.monotonic()
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+            self._worker_active.set()
+
+    def set_profile(self, name):
+        """
+        Change de profil de capture (voir CAPTURE_PROFILES). La source est rouverte par le worker
+        avant sa prochaine capture (environ 1 s pour la caméra CSI) ; les résultats de l'ancien profil ne sont plus servis.
+        Une vidéo ou un dossier d'images n'est pas rouvert : seul le profil (cadence) est noté.
+        :param name: Nom du profil (ex : "360p15").
+        """
+        if name not in CAPTURE_PROFILES:
+            raise ValueError(f"Profil de capture inconnu : {name}")
+        if name != self.profile or self._pending_profile is not None:
+            self._pending_profile = name
+            self._valid_after = time.monotonic()
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+
+    def _apply_pending_profile(self):
+        """Rouvre la source au profil demandé par set_profile() (appelé par le thread qui capture)."""
+        name = self._pending_profile
+        if name is None or not self._ready.is_set():
+            return
+        self._pending_profile = None
+        if name == self.profile:
+            return
+        if isinstance(self.source_uri, FrameSource):
+            print(f"Profil {name} ignoré : la source fournie ne peut pas être rouverte")
+            self.profile = name
+            return
+        if not self.source.live:
+            # Vidéo ou dossier d'images : la rouvrir repartirait de la première image sans changer la résolution
+            self.profile = name
+            return
+        previous = self.profile
+        self.source.close()
+        try:
+            self.source = open_source(self.source_uri, *CAPTURE_PROFILES[name])
+            self.profile = name
+        except Exception as e:
+            print(f"Erreur profil de capture {name} : {e}, retour au profil {previous}")
+            self.source = open_source(self.source_uri, *CAPTURE_PROFILES[previous])
+        self.frame_width, self.frame_height = self.source.width, self.source.height
+        self._valid_after = time.monotonic()
+
+    def set_rate(self, fps):
+        """
+        Fixe la cadence d'inférence du worker.
+        :param fps: Images analysées par seconde. 0 = pause, None = au plus vite.
+        """
+        if fps == 0:
+            self.pause()
+            return
+        period = 1.0 / fps if fps else 0.0
+        if period != self._period:
+            self._period = period
+            self._rate_changed.set() # Le worker recalcule son attente immédiatement
+        self.resume()
+
+    def achieved_fps(self, seconds=5.0):
+        """
+        :param seconds: Fenêtre de mesure (s).
+        :return: Nombre d'inférences par seconde réellement effectuées sur cette fenêtre.
+        """
+        now = time.monotonic()
+        recent = [t for t in tuple(self._inference_times) if now - t <= seconds]
+        return len(recent) / seconds
+
+    def _run_worker(self):
+        """Boucle du worker : image la plus récente -> détection -> publication, à la cadence de set_rate()."""
+        started = 0.0 # Début de la dernière inférence
+        while self._worker_running and not self._ready.wait(timeout=0.5):
+            if self.load_error is not None or self._closing:
+                return # Chargement en échec ou abandonné : la caméra ne sera jamais prête
+        while self._worker_running:
+            if not self._worker_active.wait(timeout=0.5):
+                continue
+            delay = started + self._period - time.monotonic()
+            if delay > 0:
+                # Attente interruptible : un changement de cadence ou une pause est pris en compte tout de suite
+                self._rate_changed.wait(min(delay, 0.5))
+                self._rate_changed.clear()
+                continue
+            started = time.monotonic()
+            timers = self.timers
+            try:
+                self._apply_pending_profile()
+                start = time.monotonic_ns()
+                img, timestamp = self.grab_latest()
+                capture_end = time.monotonic_ns()
+                timers.record("capture", capture_end - start)
+                if img is None:
+                    continue
+                gate = self.motion_gate
+                previous = self._results[self._front]
+                if gate is not None:
+                    infer = gate.should_infer(img, timestamp)
+                    timers.record("gate", time.monotonic_ns() - capture_end)
+                    # (la porte est remise à zéro à chaque reprise ou changement de zone : previous est alors à jour)
+                    if not infer and previous is not None:
+                        # Scène inchangée : les détections précédentes sont resservies pour cette image
+                        self._publish(DetectionResult(timestamp, previous.detections))
+                        continue
+                detections = self._detect(img)
+                self._publish(DetectionResult(timestamp, detections))
+                self._inference_times.append(time.monotonic())
+                timers.record("total", time.monotonic_ns() - start)
+                self.dump_stats_if_due()
+            except Exception as e:
+                print(f"Erreur worker caméra : {e}")
+                time.sleep(0.5)
+
+    def stage_stats(self):
+        """
+        Durée de chaque étape depuis le dernier résumé périodique (ou depuis le démarrage).
+        :return: Dictionnaire étape -> {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}.
+        Etapes : capture (attente de l'image), gate (porte de mouvement), crop (zone d'intérêt),
+        detect (détecteur complet), postprocess (coordonnées, table des classes), total (image analysée),
+        et celles du détecteur (ex : preprocess, inference, decode sur CPU, network_trt sur GPU).
+        """
+        return self.timers.summary()
+
+    def dump_stats_if_due(self):
+        """Affiche stage_stats() sur une ligne JSON si stats_interval est écoulé, puis repart de zéro."""
+        if self.stats_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_dump >= self.stats_interval:
+            self._last_stats_dump = now
+            print("STATS_CAMERA " + json.dumps(self.stage_stats(), ensure_ascii=False), flush=True)
+            self.timers.reset()
+
+    def _publish(self, result):
+        """Ecrit dans le tampon arrière puis l'échange avec le tampon avant (une affectation)."""
+        back = 1 - self._front
+        self._results[back] = result
+        self._front = back
+
+    def get_latest(self, max_age=1.0):
+        """
+        Retourne instantanément le dernier résultat du worker (DetectionResult).
+        :param max_age: Age maximal de l'image (s) ; None pour accepter n'importe quel âge.
+        :return: Le résultat, ou None s'il n'y en a pas encore ou s'il est trop ancien.
+        """
+        result = self._results[self._front]
+        if result is None or result.timestamp < self._valid_after:
+            return None
+        if max_age is not None and time.monotonic() - result.timestamp > max_age:
+            return None
+        return result
+
     def get_class_name(self, class_id):
         """
         Récupère le nom d'une classe d'objet détectée à partir de son ID.
         :param class_id: L'ID de la classe d'objet détectée.
         :return: Le nom de la classe correspondante (traduit en français si possible).
         """
-        english_name = self.net.GetClassDesc(class_id)
-        # On retourne la traduction si elle existe, sinon le nom anglais original
-        return self.translations.get(english_name.lower(), english_name)
+        # Traduction si elle existe, sinon le nom anglais original (voir build_class_table)
+        return self.get_class_info(class_id).label
+
+    def get_class_info(self, class_id):
+        """
+        :param class_id: L'ID de la classe d'objet détectée.
+        :return: ClassInfo de la classe (nom français, nom anglais, priorité de danger, annonce activée).
+        """
+        if 0 <= class_id < len(self.classes):
+            return self.classes[class_id]
+        return ClassInfo(str(class_id), str(class_id), 0, False)
+
+    def estimate_distances(self, detections, front_distance=None, tolerance=0.4, calibrate=False):
+        """
+        Distance de chaque détection, estimée d'après la taille de sa boîte.
+        Au centre ("devant"), l'objet le plus proche dont l'estimation concorde avec l'ultrason prend la distance
+        mesurée, et peut servir à recalibrer l'estimation.
+        :param detections: Détections d'une même image (coordonnées de l'image complète).
+        :param front_distance: Distance mesurée par l'ultrason avant (cm) ou None.
+        :param tolerance: Ecart relatif maximal entre estimation et mesure ultrason pour les associer.
+        :param calibrate: Si True, l'objet associé à l'ultrason recalibre l'estimateur (une fois par image).
+        :return: Liste de distances (cm), None si la taille de la classe est inconnue
+                 (ou si le modèle n'est pas encore chargé).
+        """
+        estimator = self.distance_estimator
+        if estimator is None:
+            return [None] * len(detections)
+        width = self.frame_width
+        distances = estimator.estimate(detections, width, self.frame_height)
+        if front_distance is not None and len(distances):
+            centers = np.array([d.Center[0] for d in detections])
+            front = np.flatnonzero((centers >= width / 3) & (centers <= width * 2 / 3) & ~np.isnan(distances))
+            if calibrate and front.size:
+                # L'ultrason mesure l'objet le plus proche du secteur central
+                scale = estimator.scale
+                if estimator.calibrate(distances[front].min(), front_distance):
+                    distances *= estimator.scale / scale
+            matching = front[np.abs(distances[front] - front_distance) <= tolerance * front_distance]
+            if matching.size:
+                distances[matching[np.argmin(distances[matching])]] = front_distance
+        return [None if np.isnan(d) else float(d) for d in distances]
 
     def get_object_position(self, detection):
         """
-        Détermine la position horizontale de l'objet dans l'image (1280px de large).
+        Détermine la position horizontale de l'objet dans l'image (largeur du profil de capture actif).
         :param detection: Objet detection renvoyé par jetson_inference
         :return: "à gauche", "à droite" ou "devant"
         """
         center_x = detection.Center[0]
-        width = 1280 # Largeur définie dans le constructeur
+        width = self.frame_width # Largeur des images capturées (1280 px en 720p)
         
         # On découpe l'image en 3 tiers
         if center_x < (width / 3):
@@ -82,7 +801,15 @@ class Camera:
         """
         Libère les ressources utilisées par la caméra.
         """
-        self.camera.Close()
+        self._closing = True
+        if self._loader is not None:
+            self._loader.join(timeout=5.0) # Au-delà, le chargeur fermera lui-même la source à son retour
+        if self._worker is not None:
+            self._worker_running = False
+            self._worker_active.set()
+            self._worker.join(timeout=2.0)
+        if self.source is not None:
+            self.source.close()
 
 if __name__ == "__main__":
     """
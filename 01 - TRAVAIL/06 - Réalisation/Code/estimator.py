@@ -0,0 +1,118 @@
+# estimator.py
+# Ce fichier estime la vitesse d'approche d'un obstacle et le temps avant collision
+# à partir du flux de mesures du capteur ultrason.
+# Chaque mesure est traitée en temps constant (médiane glissante + filtre de Kalman),
+# ce qui permet d'appeler update() directement depuis le thread du capteur.
+
+import time
+import threading
+from collections import deque, namedtuple
+
+# Etat publié (immuable) : horodatage, distance filtrée (cm), vitesse (cm/s, négative = approche)
+EstimatorState = namedtuple("EstimatorState", ["timestamp", "distance", "velocity"])
+
+class ApproachEstimator:
+
+    def __init__(self, median_window=3, accel_noise=1000.0, measurement_noise=4.0,
+                 min_closing_speed=10.0, max_gap=1.0, max_age=0.5):
+        """
+        :param median_window: Nombre de mesures de la médiane glissante (élimine les échos parasites).
+        :param accel_noise: Variance de l'accélération du modèle (cm²/s⁴) : réactivité du filtre.
+        :param measurement_noise: Variance du bruit de mesure après médiane (cm²).
+        :param min_closing_speed: Vitesse d'approche (cm/s) en dessous de laquelle on ne calcule pas de TTC.
+        :param max_gap: Au-delà de cet écart entre deux mesures (s), le filtre repart de zéro.
+        :param max_age: Au-delà de cette ancienneté de la dernière mesure (s), aucun TTC n'est publié
+                        (capteur muet : l'état figé n'est plus une approche en cours).
+        """
+        self.accel_noise = accel_noise
+        self.measurement_noise = measurement_noise
+        self.min_closing_speed = min_closing_speed
+        self.max_gap = max_gap
+        self.max_age = max_age
+        self._lock = threading.Lock() # reset() peut être appelé par la boucle principale pendant update()
+        self._window = deque(maxlen=median_window)
+        self._state = None
+        self._p = None # Covariance 2x2 (p00, p01, p11)
+
+    def reset(self):
+        """Oublie l'historique (ex : perte du capteur)."""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._window.clear()
+        self._state = None
+        self._p = None
+
+    def update(self, timestamp, distance):
+        """
+        Intègre une nouvelle mesure.
+        :param timestamp: Horodatage monotone de la mesure (s).
+        :param distance: Distance mesurée (cm).
+        :return: Le nouvel état (EstimatorState).
+        """
+        with self._lock:
+            return self._update(timestamp, distance)
+
+    def _update(self, timestamp, distance):
+        state = self._state
+        if state is not None and timestamp - state.timestamp > self.max_gap:
+            self._reset()
+            state = None
+
+        # 1. Médiane glissante (fenêtre de taille fixe : coût constant)
+        self._window.append(distance)
+        z = sorted(self._window)[len(self._window) // 2]
+
+        if state is None:
+            self._p = (self.measurement_noise, 0.0, 1e4)
+            self._state = EstimatorState(timestamp, z, 0.0)
+            return self._state
+
+        # 2. Prédiction (modèle à vitesse constante)
+        dt = timestamp - state.timestamp
+        d = state.distance + state.velocity * dt
+        v = state.velocity
+        p00, p01, p11 = self._p
+        q = self.accel_noise
+        p00 = p00 + 2 * dt * p01 + dt * dt * p11 + q * dt ** 4 / 4
+        p01 = p01 + dt * p11 + q * dt ** 3 / 2
+        p11 = p11 + q * dt * dt
+
+        # 3. Correction par la mesure
+        s = p00 + self.measurement_noise
+        k0, k1 = p00 / s, p01 / s
+        innovation = z - d
+        d += k0 * innovation
+        v += k1 * innovation
+        self._p = ((1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01)
+
+        # Publication atomique (une seule affectation)
+        self._state = EstimatorState(timestamp, d, v)
+        return self._state
+
+    def get_state(self):
+        """Retourne le dernier état estimé (EstimatorState) ou None."""
+        return self._state
+
+    def closing_speed(self):
+        """
+        Retourne la vitesse à laquelle l'utilisateur se rapproche de l'obstacle (cm/s, positive = approche).
+        """
+        state = self._state
+        if state is None:
+            return 0.0
+        return -state.velocity
+
+    def time_to_collision(self, now=None):
+        """
+        Retourne le temps estimé avant d'atteindre l'obstacle (s),
+        ou None si l'utilisateur ne s'en rapproche pas ou si la dernière mesure date de plus de max_age.
+        :param now: Instant de la demande (time.monotonic() par défaut, horodatage de la trace en rejeu).
+        """
+        state = self._state
+        if state is None or -state.velocity < self.min_closing_speed:
+            return None
+        if (time.monotonic() if now is None else now) - state.timestamp > self.max_age:
+            return None
+        return max(state.distance, 0.0) / -state.velocity
@@ -5,14 +5,45 @@
 # 2. Exploration : Reconnaissance de tous les vus objets par caméra
 # 3. Mixte : Ultrasons + Caméra (< 2m) uniquement en face de l'utilisateur
 
+import os
+import json
 import time
 import signal
 import sys
+import threading
 from bouton import Button
 from vibration import Vibration
-from camera import Camera
-from sound import Sound
-from ultrasonic import UltrasonicSensor
+from camera import Camera, MotionGate, ObjectTracker
+from sound import Sound, PhraseCache
+from ultrasonic import UltrasonicArray, ThresholdBands
+from estimator import ApproachEstimator
+from scheduler import InferenceScheduler
+
+# Capteurs ultrason montés sur la canne : secteur -> port série.
+# Les secteurs reprennent les positions de la caméra ("à gauche", "devant", "à droite"), plus "en bas".
+# Ex : {"devant": "/dev/ttyTHS1", "à gauche": "/dev/ttyUSB0", "à droite": "/dev/ttyUSB1", "en bas": "/dev/ttyUSB2"}
+# CANNE_ULTRASON_PORT permet de brancher le capteur avant sur une trace rejouée (serial_trace.py replay).
+ULTRASONIC_PORTS = {"devant": os.environ.get("CANNE_ULTRASON_PORT", "/dev/ttyTHS1")}
+
+# Source des images : caméra CSI par défaut, ou vidéo / dossier d'images / webcam pour les essais sans caméra
+CAMERA_SOURCE = os.environ.get("CANNE_CAMERA_SOURCE", "csi://0")
+
+# Modèle SSD-MobileNet ONNX utilisé sur CPU si detectNet (GPU) ne se charge pas
+CPU_MODEL = os.environ.get("CANNE_CPU_MODEL", "models/ssd-mobilenet.onnx")
+
+# Profil de capture par mode (voir camera.CAPTURE_PROFILES) : pleine résolution pour reconnaître les objets
+# lointains en EXPLORATION, résolution réduite en MIXTE où l'obstacle est proche et déjà localisé
+MODE_PROFILES = {"EXPLORATION": "720p30", "MIXTE": "360p15"}
+
+# En MIXTE, seules les détections des secteurs couverts par un ultrason sont gardées :
+# avec le seul capteur avant, la détection ne porte que sur le tiers central de l'image.
+MIXTE_ROI = 1 / 3 if set(ULTRASONIC_PORTS) == {"devant"} else None
+
+# Clips vocaux pré-calculés (nombres, objets, modes), construits au premier démarrage
+TTS_CACHE = os.environ.get("CANNE_TTS_CACHE", "cache_tts/phrases")
+
+# Si renseigné, le flux brut des capteurs est enregistré dans ce dossier (parcours terrain)
+TRACE_DIR = os.environ.get("CANNE_TRACE_DIR")
 
 def format_distance_message(distance_cm): 
     """
@@ -22,10 +53,73 @@ def format_distance_message(distance_cm):
     """
     return f"{int(round(distance_cm))}"
 
+def format_obstacle_message(names, sector, distance_cm):
+    """
+    Formate l'annonce d'un obstacle mesuré par un capteur ultrason.
+    :param names: Noms des objets reconnus dans ce secteur (liste éventuellement vide).
+    :param sector: Secteur du capteur. "devant" n'est pas prononcé.
+    :param distance_cm: Distance en centimètres.
+    :return: Chaîne à prononcer (ex: "chaise 150", "personne à gauche 80", "150")
+    """
+    words = [", ".join(names)] if names else []
+    if sector != "devant":
+        words.append(sector)
+    words.append(format_distance_message(distance_cm))
+    return " ".join(words)
+
+def intervalle_annonce(ttc):
+    """
+    Délai entre deux annonces vocales de distance selon l'urgence.
+    :param ttc: Temps avant collision (s) ou None si l'utilisateur ne s'approche pas.
+    :return: Délai en secondes (plus court si la collision est proche).
+    """
+    if collision_imminente(ttc):
+        return 0.5
+    return 1.0
+
+def collision_imminente(ttc):
+    """
+    :param ttc: Temps avant collision (s) ou None si l'utilisateur ne s'approche pas.
+    :return: True si l'annonce doit couper le message en cours (message urgent, voir Sound.speak()).
+    """
+    return ttc is not None and ttc < 2.0
+
+def lire_uptime():
+    """Temps écoulé depuis le démarrage de la carte (s), None si indisponible."""
+    try:
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError):
+        return None
+
+def vocabulaire(labels, modes):
+    """
+    Phrases annoncées régulièrement, pré-calculées dans le cache de la synthèse vocale.
+    :param labels: Noms français des objets reconnus par la caméra.
+    :param modes: Noms des modes.
+    :return: Liste des textes : distances de 15 à 400 cm, noms d'objets, positions, modes et états de la caméra.
+    """
+    phrases = [format_distance_message(d) for d in range(15, 401)]
+    phrases += list(labels)
+    phrases += ["à gauche", "à droite", "devant", "en bas"]
+    phrases += [f"Mode {mode}" for mode in modes]
+    phrases += ["caméra prête", "caméra en chargement", "caméra indisponible"]
+    return phrases
+
+def etat_camera(camera):
+    """
+    Message à prononcer tant que la caméra n'est pas utilisable.
+    :return: "caméra en chargement", "caméra indisponible" (échec du chargement) ou None si elle est prête.
+    """
+    if camera.is_ready():
+        return None
+    return "caméra indisponible" if camera.load_error is not None else "caméra en chargement"
+
 def main():
     """
     Boucle principale du programme.
     """
+    main_start = time.monotonic()
     print("Initialisation du système...")
     
     # 1. Initialisation des composants
@@ -43,14 +137,37 @@ def main():
         print(f"Erreur init vibreur: {e}")
         return
 
-    # Capteur Ultrason sur le port série
-    ultrasonic_sensor = UltrasonicSensor(port="/dev/ttyTHS1", baudrate=9600)
+    # Capteurs Ultrason sur les ports série, lus par un seul thread
+    # (+ estimation de la vitesse d'approche du capteur avant dans ce thread)
+    approach = ApproachEstimator()
+    # Zones de distance (50cm, 2m, 4m) : un changement de zone réveille immédiatement la boucle principale
+    alerte_zone = threading.Event()
+    zones = {sector: ThresholdBands(thresholds=(50, 200, 400)) for sector in ULTRASONIC_PORTS}
+    for bands in zones.values():
+        bands.subscribe(lambda event: alerte_zone.set())
+    # Santé de la liaison série écrite dans les logs toutes les minutes (lignes "STATS_ULTRASON {json}")
+    ultrasonic_sensors = UltrasonicArray(ULTRASONIC_PORTS, baudrate=9600, estimators={"devant": approach},
+                                         record_dir=TRACE_DIR, bands=zones, stats_interval=60)
     
-    # Module Son
-    sound = Sound(script_path="./text_to_speech.sh")
+    # Module Son : les annonces du vocabulaire courant sont assemblées à partir de clips pré-calculés,
+    # la carte son reste ouverte (latence de sortie et sous-débits dans les logs : "STATS_SON {json}")
+    sound = Sound(script_path="./text_to_speech.sh", cache=PhraseCache(TTS_CACHE), stats_interval=60)
 
     # Caméra AI - Modèle Inception V2
-    camera = Camera(model="ssd-inception-v2")
+    # Chargement en arrière-plan (1 à 2 minutes) : le mode MARCHE est utilisable dès le démarrage.
+    # Scène inchangée (utilisateur immobile) : les détections précédentes sont resservies, 2 s au plus.
+    # Durée de chaque étape (capture, réseau...) dans les logs toutes les minutes ("STATS_CAMERA {json}")
+    # La capture + détection tourne dans un worker : la boucle principale ne lit que le dernier résultat
+    camera = Camera(model="ssd-inception-v2", background=True, source=CAMERA_SOURCE,
+                    cpu_fallback=CPU_MODEL if os.path.exists(CPU_MODEL) else None,
+                    motion_gate=MotionGate(max_staleness=2.0), stats_interval=60)
+    camera.start_worker(active=False) # En pause tant qu'on est en mode MARCHE
+    # Cadence de détection choisie selon le mode et les ultrasons (lignes "STATS_INFERENCE {json}" dans les logs)
+    # En EXPLORATION, 2 images par annonce suffisent : le suivi des objets comble les intervalles
+    scheduler = InferenceScheduler(camera, frames_per_announce=2, stats_interval=60)
+    # Suivi des objets en EXPLORATION : seuls les objets nouveaux, déplacés ou rapprochés sont annoncés
+    tracker = ObjectTracker()
+    last_tracked_time = None # Horodatage du dernier résultat caméra traité (suivi, calibration des distances)
 
     # On attend un peu que le système audio soit vraiment prêt (post-boot)
     time.sleep(2)
@@ -58,6 +175,10 @@ def main():
     # 2. Définition des modes
     modes = ["MARCHE", "EXPLORATION", "MIXTE"]
     current_mode_index = 0
+
+    # Cache vocal complété en arrière-plan (quelques dizaines de secondes au premier démarrage seulement)
+    threading.Thread(target=sound.build_cache, args=(vocabulaire(camera.translations.values(), modes),),
+                     daemon=True).start()
     
     sound.speak("Système démarré. Mode Marche.", priority=True)
     sound.speak("Trois modes sont disponibles, marche, exploration et mixte. Veuillez presser le bouton pour passer d'un mode à l'autre. Les distances sont exprimées en centimètres", priority=True)
@@ -77,30 +198,45 @@ def main():
     # On capture SIGINT (Ctrl+C)
     signal.signal(signal.SIGINT, signal_handler)
 
+    # Mesures de démarrage (ligne "STATS_BOOT {json}" dans les logs)
+    boot_stats = {"uptime_at_start_s": lire_uptime()}
+    camera_was_ready = False
+
     # Variables de suivi temporel
     last_vocal_announce_time = 0.0
     last_vibration_time = 0.0
     last_mode_change_time = 0.0 
     vibration_pattern_state = 0 # 0=Long, 1=Court
     
-    def gerer_vibration_radar(dist_cm, current_time):
-        """Gestion progressive de la vibration façon radar de recul"""
+    def vibrer(duration):
+        """
+        Déclenche le moteur et note dans les stats de démarrage l'instant de la première vibration.
+        """
+        vibration_motor.vibrate(duration)
+        if "first_vibration_s" not in boot_stats:
+            boot_stats["first_vibration_s"] = round(time.monotonic() - main_start, 3)
+
+    def gerer_vibration_radar(dist_cm, current_time, ttc=None):
+        """
+        Gestion progressive de la vibration façon radar de recul.
+        :param ttc: Temps avant collision (s) : accélère le rythme si l'utilisateur approche vite.
+        """
         nonlocal last_vibration_time, vibration_pattern_state
         
-        if dist_cm < 50:
-            # DANGER IMMÉDIAT (< 50cm) : Pattern rapide
+        if dist_cm < 50 or (ttc is not None and ttc < 1.0):
+            # DANGER IMMÉDIAT (< 50cm ou collision dans moins d'1s) : Pattern rapide
             
             if vibration_pattern_state == 0:
                 # Etape 0 : Vibration Longue
                 if current_time - last_vibration_time > 0.2:
-                    vibration_motor.vibrate(0.35)
+                    vibrer(0.35)
                     last_vibration_time = current_time
                     vibration_pattern_state = 1
                     
             else:
                 # Etape 1 : Vibration Courte
                 if current_time - last_vibration_time > 0.45:
-                    vibration_motor.vibrate(0.10)
+                    vibrer(0.10)
                     last_vibration_time = current_time
                     vibration_pattern_state = 0
                 
@@ -110,13 +246,30 @@ def main():
             vibration_pattern_state = 0
             ratio = (dist_cm - 50) / 150.0
             interval = 0.3 + (ratio * 1.2)
+
+            # Approche rapide : le rythme suit le temps avant collision
+            if ttc is not None and ttc < 3.0:
+                interval = max(0.3, interval * ttc / 3.0)
             
             if current_time - last_vibration_time > interval:
-                vibration_motor.vibrate(0.1)
+                vibrer(0.1)
                 last_vibration_time = current_time
 
     try:
+        # Sécurité ultrason / haptique opérationnelle à partir d'ici
+        boot_stats["haptic_ready_s"] = round(time.monotonic() - main_start, 3)
+        print("STATS_BOOT " + json.dumps(boot_stats), flush=True)
+
         while running:
+            # Fin du chargement de la caméra : durée dans les logs, annonce si un mode caméra est actif
+            if not camera_was_ready and camera.is_ready():
+                camera_was_ready = True
+                boot_stats["camera_ready_s"] = round(time.monotonic() - main_start, 3)
+                boot_stats["camera_load_s"] = round(camera.load_time, 3)
+                print("STATS_BOOT " + json.dumps(boot_stats), flush=True)
+                if modes[current_mode_index] != "MARCHE":
+                    sound.speak("caméra prête", priority=True)
+
             # ---------------------------------------------------------
             # 1. GESTION DU CHANGEMENT DE MODE (PRIORITAIRE)
             # ---------------------------------------------------------
@@ -132,7 +285,17 @@ def main():
                 
                 # Annonce du nouveau mode (PRIORITAIRE)
                 sound.speak(f"Mode {current_mode}", priority=True)
+                if current_mode != "MARCHE" and etat_camera(camera):
+                    sound.speak(etat_camera(camera), priority=True)
+                    last_vocal_announce_time = time.time()
                 print(f" changement de mode -> {current_mode}")
+
+                # Cadence, zone d'intérêt et profil de capture du nouveau mode appliqués tout de suite
+                camera.set_roi(MIXTE_ROI if current_mode == "MIXTE" else None)
+                if current_mode in MODE_PROFILES:
+                    camera.set_profile(MODE_PROFILES[current_mode])
+                scheduler.update(current_mode)
+                tracker.reset() # En entrant en EXPLORATION, tout ce qui est visible est annoncé
                 
                 last_mode_change_time = time.time()
                 
@@ -149,107 +312,157 @@ def main():
             if current_mode == "MARCHE":
                 # --- MODE MARCHE : Ultrasons Uniquement (< 2m) ---
                 
-                distance = ultrasonic_sensor.get_distance()
+                # Obstacle le plus proche tous secteurs confondus
+                sector, distance = ultrasonic_sensors.nearest()
+                ttc = approach.time_to_collision() if sector == "devant" else None
+                scheduler.update(current_mode) # Pas d'inférence en mode MARCHE
                 
                 if distance is not None:
                     # Logique demandée : "Obstacle 2m" si < 2m.
                     if distance < 200: # Distance inférieure à 2 mètres
                         
-                        # Gestion du délai entre les annonces vocales (toutes les 1s)
-                        if now - last_vocal_announce_time > 1:
-                            msg = format_distance_message(distance)
+                        # Gestion du délai entre les annonces vocales (1s, 0.5s si approche rapide)
+                        if now - last_vocal_announce_time > intervalle_annonce(ttc):
+                            msg = format_obstacle_message([], sector, distance)
                             print(f"[MARCHE] {msg}")
-                            sound.speak(msg)
+                            sound.speak(msg, urgent=collision_imminente(ttc))
                             last_vocal_announce_time = now
                         
                         # Retour Haptique Proportionnel
-                        gerer_vibration_radar(distance, now)
+                        gerer_vibration_radar(distance, now, ttc)
 
                     else:
                         pass
                 
-                time.sleep(0.1) # Petite pause pour ne pas surcharger le CPU
+                # Petite pause pour ne pas surcharger le CPU, écourtée si un obstacle change de zone
+                alerte_zone.wait(0.1)
+                alerte_zone.clear()
 
             elif current_mode == "EXPLORATION":
                 # --- MODE EXPLORATION : Caméra Uniquement ---
                 
-                detections = camera.get_detections()
+                # Quelques images analysées par annonce, dernier résultat du worker (pas d'attente du GPU)
+                scheduler.update(current_mode, announce_interval=2.0)
+                if etat_camera(camera):
+                    # Caméra pas encore chargée : rappel toutes les 10 secondes
+                    if now - last_vocal_announce_time > 10:
+                        sound.speak(etat_camera(camera))
+                        last_vocal_announce_time = now
+                    time.sleep(0.1)
+                    continue
+
+                result = camera.get_latest()
+                front_distance = ultrasonic_sensors.nearest_by_sector().get("devant")
+                if result is not None and result.timestamp != last_tracked_time:
+                    # Nouvelle image analysée : mise à jour du suivi des objets,
+                    # et calibration des distances caméra sur l'ultrason avant
+                    tracker.update(result.detections, result.timestamp)
+                    camera.estimate_distances(result.detections, front_distance, calibrate=True)
+                    last_tracked_time = result.timestamp
                 
                 # On ne parle que toutes les 2 secondes pour ne pas saturer
                 if now - last_vocal_announce_time > 2:
-                    if detections:
-                        # Objet avec la plus grande confiance ou le premier
-                        found_objects = []
-                        for det in detections:
-                            name = camera.get_class_name(det.ClassID)
-                            pos = camera.get_object_position(det)
-                            desc = f"{name} {pos}"
-                            
-                            if desc not in found_objects: 
-                                found_objects.append(desc)
+                    # Uniquement les objets apparus, qui ont changé de position ou qui se sont nettement rapprochés,
+                    # les plus dangereux (véhicules, personnes...) en premier
+                    announced = tracker.to_announce(camera.get_object_position, time.monotonic())
+                    announced.sort(key=lambda item: camera.get_class_info(item[0].class_id).priority, reverse=True)
+                    # Distance estimée d'après la taille de l'objet dans l'image (ex : "chaise à gauche 200")
+                    distances = camera.estimate_distances([track.detection() for track, _ in announced], front_distance)
+                    found_objects = []
+                    for (track, pos), dist in zip(announced, distances):
+                        desc = f"{camera.get_class_name(track.class_id)} {pos}"
+                        if dist is not None:
+                            desc += " " + format_distance_message(round(dist, -1))
                         
-                        if found_objects:
-                            # Construit la phrase :
-                            phrase = ", ".join(found_objects)
-                            print(f"[EXPLORATION] {phrase}")
-                            sound.speak(phrase)
-                            last_vocal_announce_time = now
-                    else:
-                        pass
+                        if desc not in found_objects: 
+                            found_objects.append(desc)
+                    
+                    if found_objects:
+                        # Construit la phrase :
+                        phrase = ", ".join(found_objects)
+                        print(f"[EXPLORATION] {phrase}")
+                        sound.speak(phrase)
+                        last_vocal_announce_time = now
+
+                # La lecture ne bloque plus sur l'inférence : petite pause pour ne pas surcharger le CPU
+                time.sleep(0.1)
 
             elif current_mode == "MIXTE":
                 # --- MODE MIXTE : Ultrasons + Caméra si obstacle proche ---
                 
-                distance = ultrasonic_sensor.get_distance()
+                # Obstacles à moins de 4m, secteur par secteur
+                sectors = ultrasonic_sensors.nearest_by_sector()
+                obstacles = {
+                    sector: dist for sector, dist in sectors.items()
+                    if dist is not None and dist < 400
+                }
+                if sectors.get("devant") is None:
+                    # Capteur avant muet : l'approche mesurée avant la coupure n'est plus valable
+                    approach.reset()
+                ttc = approach.time_to_collision() if "devant" in obstacles else None
+                # Cadence caméra : haute si obstacle proche ou en approche, basse s'il est loin, nulle sans obstacle
+                scheduler.update(current_mode, min(obstacles.values(), default=None), ttc)
                 
-                if distance is not None and distance < 400:
+                if obstacles:
                     # Obstacle à moins de 4m -> On regarde ce que c'est
                     
-                    # On active la détection caméra
-                    detections = camera.get_detections()
+                    # Dernier résultat de la détection caméra (pas d'attente du GPU)
+                    result = camera.get_latest()
+                    detections = result.detections if result else ()
+                    # Distances estimées par la caméra, recalibrées une fois par image sur l'ultrason avant
+                    new_image = result is not None and result.timestamp != last_tracked_time
+                    distances = camera.estimate_distances(detections, obstacles.get("devant"), calibrate=new_image)
+                    if new_image:
+                        last_tracked_time = result.timestamp
+                    # Estimations caméra fiables seulement après au moins une calibration sur l'ultrason
+                    estimator = camera.distance_estimator
+                    calibrated = estimator is not None and estimator.calibrations > 0
                     
-                    found_objects = []
+                    found_objects = {} # secteur -> noms des objets
                     if detections:
-                        for det in detections:
+                        # Les plus dangereux en premier dans chaque secteur
+                        for det, dist in sorted(zip(detections, distances),
+                                                key=lambda item: camera.get_class_info(item[0].ClassID).priority,
+                                                reverse=True):
                             name = camera.get_class_name(det.ClassID)
                             pos = camera.get_object_position(det)
                             
-                            # FILTRE MODE MIXTE : On ne garde que ce qui est devant pour distance avec ultrasons cohérente
-                            if pos != "devant":
+                            # FILTRE MODE MIXTE : On ne garde que les secteurs couverts par un ultrason pour une distance cohérente
+                            if pos not in obstacles:
+                                continue
+                            # ... et les objets à la distance mesurée (pas la personne derrière la chaise)
+                            if calibrated and dist is not None and abs(dist - obstacles[pos]) > 0.4 * obstacles[pos]:
                                 continue
-                                
-                            desc = f"{name}"
                             
-                            if desc not in found_objects:
-                                found_objects.append(desc)
+                            names = found_objects.setdefault(pos, [])
+                            if name not in names:
+                                names.append(name)
                     
                     # Gestion vocale
-                    if now - last_vocal_announce_time > 1:
-                        if found_objects:
-                            # C'est un objet connu
-                            phrase = ", ".join(found_objects)
-                            # On ajoute la distance à la phrase: "Chaise 150"
-                            full_msg = f"{phrase} {format_distance_message(distance)}"
-                            
-                            print(f"[MIXTE] {full_msg}")
-                            sound.speak(full_msg)
-                        else:
-                            # Pas d'objet connu -> "150"
-                            msg = format_distance_message(distance)
-                            print(f"[MIXTE] {msg}")
-                            sound.speak(msg)
+                    if now - last_vocal_announce_time > intervalle_annonce(ttc):
+                        # Du plus proche au plus loin : "Chaise 150" si objet connu, sinon "150"
+                        full_msg = ", ".join(
+                            format_obstacle_message(found_objects.get(sector, []), sector, dist)
+                            for sector, dist in sorted(obstacles.items(), key=lambda item: item[1])
+                        )
+                        print(f"[MIXTE] {full_msg}")
+                        # En approche rapide, l'annonce coupe la description en cours
+                        sound.speak(full_msg, urgent=collision_imminente(ttc))
                         
                         last_vocal_announce_time = now
                     
-                    # Vibration (Sécurité toujours active en mixte)
-                    gerer_vibration_radar(distance, now)
+                    # Vibration (Sécurité toujours active en mixte) sur l'obstacle le plus proche
+                    sector, distance = min(obstacles.items(), key=lambda item: item[1])
+                    gerer_vibration_radar(distance, now, ttc if sector == "devant" else None)
                 
                 else:
-                    # Si > 2m, on vide le buffer caméra pour éviter le lag (image fraîche)
-                    camera.get_detections() 
+                    # Pas d'obstacle à moins de 4m : aucune inférence (coût proche du mode MARCHE).
+                    # Les images ne sont pas traitées, le worker repartira de la plus récente.
                     pass
 
-                time.sleep(0.1)
+                # Pause écourtée si un obstacle change de zone
+                alerte_zone.wait(0.1)
+                alerte_zone.clear()
 
     except KeyboardInterrupt:
         print("Arrêt par l'utilisateur.")
@@ -271,7 +484,7 @@ def main():
         except: pass
             
         try:
-            ultrasonic_sensor.cleanup()
+            ultrasonic_sensors.cleanup()
         except: pass
         
         try:
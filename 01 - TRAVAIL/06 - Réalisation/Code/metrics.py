@@ -0,0 +1,101 @@
+# metrics.py
+# Ce fichier regroupe des outils de mesure légers (histogrammes de latence)
+# utilisables en permanence dans les threads du système sans les ralentir.
+
+import math
+
+class LatencyHistogram:
+    """
+    Histogramme de latences à seaux logarithmiques (10 seaux par décade).
+    record() est en temps constant et ne stocke aucune valeur individuelle.
+    """
+
+    def __init__(self, min_ns=1_000, max_ns=10_000_000_000, buckets_per_decade=10):
+        """
+        :param min_ns: Plus petite latence distinguée (ns), les valeurs inférieures vont dans le 1er seau.
+        :param max_ns: Plus grande latence distinguée (ns), les valeurs supérieures vont dans le dernier seau.
+        :param buckets_per_decade: Résolution de l'histogramme.
+        """
+        self._min_ns = min_ns
+        self._per_decade = buckets_per_decade
+        self._size = int(math.log10(max_ns / min_ns) * buckets_per_decade) + 1
+        self.reset()
+
+    def reset(self):
+        """Remet l'histogramme à zéro."""
+        self._counts = [0] * self._size
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        """Ajoute une latence (en nanosecondes)."""
+        if ns > self._min_ns:
+            i = min(int(math.log10(ns / self._min_ns) * self._per_decade), self._size - 1)
+        else:
+            i = 0
+        self._counts[i] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, p):
+        """
+        :param p: Percentile voulu (0-100).
+        :return: Borne haute (ns) du seau contenant ce percentile, 0 si vide.
+        """
+        if self.count == 0:
+            return 0
+        target = self.count * p / 100.0
+        cumulated = 0
+        for i, n in enumerate(self._counts):
+            cumulated += n
+            if cumulated >= target:
+                return min(self._min_ns * 10 ** ((i + 1) / self._per_decade), self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        """
+        :return: Dictionnaire (nombre, moyenne, p50, p95, p99, max) avec les durées en millisecondes.
+        """
+        mean = self.total_ns / self.count if self.count else 0
+        return {
+            "count": self.count,
+            "mean_ms": round(mean / 1e6, 3),
+            "p50_ms": round(self.percentile(50) / 1e6, 3),
+            "p95_ms": round(self.percentile(95) / 1e6, 3),
+            "p99_ms": round(self.percentile(99) / 1e6, 3),
+            "max_ms": round(self.max_ns / 1e6, 3),
+        }
+
+class StageTimers:
+    """
+    Un histogramme de latence par étape d'un traitement (ex : capture, réseau, post-traitement).
+    Les durées sont mesurées avec time.monotonic_ns() par l'appelant ; reset() après chaque résumé
+    périodique donne des statistiques glissantes sur l'intervalle écoulé.
+    """
+
+    def __init__(self, stages=(), **histogram_kwargs):
+        """
+        :param stages: Noms des étapes, dans l'ordre d'affichage (d'autres peuvent être ajoutées à la volée).
+        :param histogram_kwargs: Paramètres des LatencyHistogram.
+        """
+        self._kwargs = histogram_kwargs
+        self.histograms = {stage: LatencyHistogram(**histogram_kwargs) for stage in stages}
+
+    def record(self, stage, ns):
+        """Ajoute la durée (ns) d'une exécution de l'étape."""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram(**self._kwargs)
+        histogram.record(ns)
+
+    def summary(self):
+        """:return: Dictionnaire étape -> LatencyHistogram.summary() (étapes exécutées uniquement)."""
+        return {stage: h.summary() for stage, h in list(self.histograms.items()) if h.count}
+
+    def reset(self):
+        """Remet toutes les étapes à zéro."""
+        for histogram in list(self.histograms.values()):
+            histogram.reset()
@@ -0,0 +1,103 @@
+# scheduler.py
+# Ce fichier choisit la cadence de détection de la caméra selon le contexte :
+# mode courant, distance mesurée par les ultrasons et temps avant collision.
+# Sur la Jetson Nano (dans une poche, sans ventilation), limiter l'inférence au strict nécessaire
+# évite la réduction de fréquence thermique du GPU.
+
+import json
+import time
+
+class InferenceScheduler:
+    """
+    Pilote Camera.set_rate() à partir du contexte transmis à chaque tour de boucle (update()).
+    - MARCHE      : aucune inférence ;
+    - MIXTE       : cadence haute si l'obstacle est proche ou se rapproche, basse s'il est loin,
+                    aucune inférence sans obstacle mesuré ;
+    - EXPLORATION : quelques images par annonce vocale.
+    """
+
+    def __init__(self, camera, high_fps=10.0, low_fps=2.0, frames_per_announce=3,
+                 near_cm=200, far_cm=400, ttc_s=3.0, stats_interval=None):
+        """
+        :param camera: Objet exposant set_rate(fps) et achieved_fps() (Camera).
+        :param high_fps: Cadence en MIXTE quand l'obstacle est proche ou se rapproche.
+        :param low_fps: Cadence en MIXTE quand l'obstacle est loin.
+        :param frames_per_announce: Images analysées entre deux annonces en EXPLORATION.
+        :param near_cm: Distance en dessous de laquelle l'obstacle est considéré proche.
+        :param far_cm: Distance au-delà de laquelle aucun obstacle n'est pris en compte.
+        :param ttc_s: Temps avant collision (s) en dessous duquel l'obstacle est considéré en approche.
+        :param stats_interval: Si renseigné, stats() est affiché toutes les stats_interval secondes.
+        """
+        self.camera = camera
+        self.high_fps = high_fps
+        self.low_fps = low_fps
+        self.frames_per_announce = frames_per_announce
+        self.near_cm = near_cm
+        self.far_cm = far_cm
+        self.ttc_s = ttc_s
+        self.stats_interval = stats_interval
+        self.fps = None # Cadence demandée à la caméra (None tant qu'aucune décision n'est prise)
+        self.reason = None
+        self.decisions = {} # Raison -> nombre de tours de boucle passés dans cet état
+        self.changes = 0 # Nombre de changements de cadence
+        self._last_stats_dump = time.monotonic()
+
+    def decide(self, mode, distance=None, ttc=None, announce_interval=2.0):
+        """
+        Calcule la cadence voulue sans l'appliquer.
+        :param mode: "MARCHE", "EXPLORATION" ou "MIXTE".
+        :param distance: Distance de l'obstacle le plus proche (cm) ou None.
+        :param ttc: Temps avant collision (s) ou None si l'utilisateur ne s'approche pas.
+        :param announce_interval: Délai entre deux annonces vocales en EXPLORATION (s).
+        :return: (cadence en images/s, raison).
+        """
+        if mode == "EXPLORATION":
+            return self.frames_per_announce / announce_interval, "exploration"
+        if mode == "MIXTE":
+            if ttc is not None and ttc < self.ttc_s:
+                return self.high_fps, "approche"
+            if distance is not None and distance < self.near_cm:
+                return self.high_fps, "proche"
+            if distance is not None and distance < self.far_cm:
+                return self.low_fps, "loin"
+            return 0.0, "rien"
+        return 0.0, "marche"
+
+    def update(self, mode, distance=None, ttc=None, announce_interval=2.0):
+        """
+        Calcule la cadence voulue et l'applique à la caméra si elle a changé.
+        Mêmes paramètres que decide().
+        :return: La cadence appliquée (images/s).
+        """
+        fps, reason = self.decide(mode, distance, ttc, announce_interval)
+        self.decisions[reason] = self.decisions.get(reason, 0) + 1
+        self.reason = reason
+        if fps != self.fps:
+            self.camera.set_rate(fps)
+            self.fps = fps
+            self.changes += 1
+        self.dump_stats_if_due()
+        return fps
+
+    def stats(self):
+        """Retourne les décisions prises, la cadence obtenue et les inférences évitées (dictionnaire)."""
+        stats = {
+            "reason": self.reason,
+            "target_fps": self.fps,
+            "achieved_fps": round(self.camera.achieved_fps(), 2),
+            "changes": self.changes,
+            "decisions": dict(self.decisions),
+        }
+        gate = getattr(self.camera, "motion_gate", None)
+        if gate is not None:
+            stats["motion_gate"] = gate.stats() # Inférences évitées sur scène immobile
+        return stats
+
+    def dump_stats_if_due(self):
+        """Affiche stats() sur une ligne JSON si stats_interval est écoulé."""
+        if self.stats_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_dump >= self.stats_interval:
+            self._last_stats_dump = now
+            print("STATS_INFERENCE " + json.dumps(self.stats(), ensure_ascii=False), flush=True)
@@ -0,0 +1,184 @@
+# serial_trace.py
+# Ce fichier permet d'enregistrer le flux brut d'un capteur ultrason (octets + instant d'arrivée)
+# dans une trace binaire compacte, puis de la rejouer dans un pseudo-terminal (pty).
+# Le pty rejoué s'ouvre comme un vrai port série : UltrasonicSensor et main.py peuvent ainsi
+# être testés et profilés sur n'importe quelle machine Linux avec des parcours enregistrés sur le terrain.
+#
+# Format : en-tête "USTR" + version (1 octet) + débit (uint32),
+#          puis des blocs : délai depuis le bloc précédent en µs (uint32) + taille (uint16) + octets.
+
+import os
+import sys
+import time
+import tty
+import struct
+import threading
+
+MAGIC = b"USTR"
+VERSION = 1
+_HEADER = struct.Struct("<4sBI")
+_RECORD = struct.Struct("<IH")
+
+class TraceRecorder:
+    """Enregistre des blocs d'octets horodatés dans une trace binaire."""
+
+    def __init__(self, path, baudrate=9600):
+        """
+        :param path: Fichier de trace à créer.
+        :param baudrate: Débit du port enregistré (informatif).
+        """
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, baudrate))
+        self._last_ns = None
+        self._last_flush = time.monotonic()
+
+    def write(self, timestamp_ns, data):
+        """
+        Ajoute un bloc reçu.
+        :param timestamp_ns: Instant d'arrivée (time.monotonic_ns()).
+        :param data: Octets reçus.
+        """
+        if self._last_ns is None:
+            self._last_ns = timestamp_ns
+        delay_us = min(max(timestamp_ns - self._last_ns, 0) // 1000, 0xFFFFFFFF)
+        self._last_ns = timestamp_ns
+        for start in range(0, len(data), 0xFFFF):
+            chunk = data[start:start + 0xFFFF]
+            self._file.write(_RECORD.pack(delay_us, len(chunk)))
+            self._file.write(chunk)
+            delay_us = 0
+
+        # Ecriture sur disque au moins une fois par seconde (trace exploitable même après un crash)
+        now = time.monotonic()
+        if now - self._last_flush >= 1.0:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        """Ferme la trace."""
+        if not self._file.closed:
+            self._file.close()
+
+def read_trace(path):
+    """
+    Lit une trace.
+    :return: (débit, liste de (instant relatif en s, octets)).
+    """
+    with open(path, "rb") as f:
+        magic, version, baudrate = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} n'est pas une trace ultrason (version {VERSION})")
+        chunks = []
+        t_us = 0
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                break
+            delay_us, size = _RECORD.unpack(header)
+            data = f.read(size)
+            if len(data) < size:
+                break # Trace tronquée (arrêt brutal pendant l'enregistrement)
+            t_us += delay_us
+            chunks.append((t_us / 1e6, data))
+    return baudrate, chunks
+
+class TraceReplayer:
+    """
+    Rejoue une trace dans un pty. L'attribut `port` est le chemin à donner à UltrasonicSensor.
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        """
+        :param path: Trace à rejouer.
+        :param speed: Facteur de vitesse (1.0 = temps réel, 10.0 = 10x), None = aussi vite que possible.
+        :param loop: Rejoue la trace en boucle.
+        """
+        self.baudrate, self._chunks = read_trace(path)
+        self.speed = speed
+        self.loop = loop
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Démarre le rejeu en arrière-plan."""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            start = time.monotonic()
+            for t, data in self._chunks:
+                if not self._running:
+                    return
+                if self.speed:
+                    delay = start + t / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                os.write(self.master_fd, data)
+            if not self.loop:
+                break
+        self._running = False
+
+    def wait(self, timeout=None):
+        """Attend la fin du rejeu. :return: True si le rejeu est terminé."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self._running
+
+    def close(self):
+        """Arrête le rejeu et ferme le pty."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+def _record(port, path, duration=None):
+    """Enregistre le flux brut d'un port série jusqu'à Ctrl+C (ou pendant `duration` secondes)."""
+    import serial
+    conn = serial.Serial(port=port, baudrate=9600, timeout=0.1)
+    recorder = TraceRecorder(path, baudrate=conn.baudrate)
+    total = 0
+    start = time.monotonic()
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            data = conn.read(max(conn.in_waiting, 1))
+            if data:
+                recorder.write(time.monotonic_ns(), data)
+                total += len(data)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        conn.close()
+    print(f"{total} octets enregistrés dans {path} ({time.monotonic() - start:.1f} s)")
+
+if __name__ == "__main__":
+    """
+    Enregistrement : python3 serial_trace.py record /dev/ttyTHS1 marche.ustr [durée_s]
+    Rejeu          : python3 serial_trace.py replay marche.ustr [vitesse|max] [loop]
+                     (affiche le port pty à utiliser, ex : UltrasonicSensor(port="/dev/pts/5"))
+    """
+    if len(sys.argv) >= 4 and sys.argv[1] == "record":
+        _record(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) > 4 else None)
+    elif len(sys.argv) >= 3 and sys.argv[1] == "replay":
+        speed = sys.argv[3] if len(sys.argv) > 3 else "1"
+        replayer = TraceReplayer(sys.argv[2], speed=None if speed == "max" else float(speed),
+                                 loop="loop" in sys.argv[4:])
+        print(f"Rejeu sur {replayer.port} ({len(replayer._chunks)} blocs). Ctrl+C pour arrêter.")
+        replayer.start()
+        try:
+            while not replayer.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            replayer.close()
+    else:
+        print("Usage : python3 serial_trace.py record <port> <trace.ustr> [durée_s]")
+        print("        python3 serial_trace.py replay <trace.ustr> [vitesse|max] [loop]")
@@ -1,22 +1,672 @@
 # sound.py
-# Ce fichier gère la synthèse vocale à l'aide d'un script shell externe.
-# Il permet de convertir du texte en parole en appelant le script `text_to_speech.sh`.
+# Ce fichier gère la synthèse vocale.
+# Le moteur SVOX Pico est chargé une seule fois dans le processus (libttspico via ctypes) ;
+# les effets de voix (tempo, hauteur) sont appliqués avec NumPy et le son est envoyé à aplay.
+# Sans libttspico, pico2wave est utilisé, et sans pico2wave, le script `text_to_speech.sh`.
 
 import os
+import json
+import wave
+import shutil
+import signal
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import tempfile
 import threading
 import subprocess
-from queue import Queue, Full, Empty
+from collections import OrderedDict, deque
 import time
 
+import numpy as np
+
+from metrics import LatencyHistogram
+
+PICO_LANG_DIR = "/usr/share/pico/lang"
+# Fichiers de ressources Pico par langue (analyse du texte, locuteur)
+PICO_VOICES = {
+    "fr-FR": ("fr-FR_ta.bin", "fr-FR_nk0_sg.bin"),
+    "en-US": ("en-US_ta.bin", "en-US_lh0_sg.bin"),
+}
+PICO_STEP_IDLE = 200
+PICO_STEP_BUSY = 201
+PICO_RESET_SOFT = 0x10
+
+class PicoEngine:
+    """
+    Moteur SVOX Pico résident : la bibliothèque et les ressources de langue sont chargées à la création,
+    chaque synthèse ne coûte ensuite que le calcul de la voix (pas de processus ni de fichier temporaire).
+    """
+    rate = 16000 # Pico produit du PCM 16 bits mono à 16 kHz
+
+    def __init__(self, lang="fr-FR", lang_dir=PICO_LANG_DIR, library=None, memory_size=2500000):
+        """
+        :param lang: Langue de la voix (clé de PICO_VOICES).
+        :param lang_dir: Dossier des fichiers de ressources Pico.
+        :param library: Chemin de libttspico (recherché automatiquement si None).
+        :param memory_size: Mémoire de travail allouée au moteur (octets, valeur de pico2wave).
+        :raises OSError: Bibliothèque ou ressources introuvables.
+        """
+        self.lang = lang
+        self._lib = ctypes.CDLL(library or ctypes.util.find_library("ttspico") or "libttspico.so.0")
+        for name in ("pico_initialize", "pico_terminate", "pico_loadResource", "pico_unloadResource",
+                     "pico_getResourceName", "pico_createVoiceDefinition", "pico_addResourceToVoiceDefinition",
+                     "pico_releaseVoiceDefinition", "pico_newEngine", "pico_disposeEngine",
+                     "pico_resetEngine", "pico_putTextUtf8", "pico_getData"):
+            getattr(self._lib, name).restype = ctypes.c_int16 # pico_Status
+
+        paths = [os.path.join(lang_dir, f) for f in PICO_VOICES[lang]]
+        for path in paths:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Ressource Pico introuvable : {path}")
+
+        self._memory = ctypes.create_string_buffer(memory_size)
+        self._system = ctypes.c_void_p()
+        self._resources = []
+        self._engine = ctypes.c_void_p()
+        self._voice = b"PicoVoice"
+        self._buffer = ctypes.create_string_buffer(128)
+        self._check(self._lib.pico_initialize(self._memory, memory_size, ctypes.byref(self._system)),
+                    "pico_initialize")
+        try:
+            self._check(self._lib.pico_createVoiceDefinition(self._system, self._voice), "pico_createVoiceDefinition")
+            for path in paths:
+                resource = ctypes.c_void_p()
+                self._check(self._lib.pico_loadResource(self._system, path.encode(), ctypes.byref(resource)),
+                            "pico_loadResource")
+                self._resources.append(resource)
+                name = ctypes.create_string_buffer(200)
+                self._check(self._lib.pico_getResourceName(self._system, resource, name), "pico_getResourceName")
+                self._check(self._lib.pico_addResourceToVoiceDefinition(self._system, self._voice, name.value),
+                            "pico_addResourceToVoiceDefinition")
+            self._check(self._lib.pico_newEngine(self._system, self._voice, ctypes.byref(self._engine)),
+                        "pico_newEngine")
+        except OSError:
+            self.close()
+            raise
+
+    @staticmethod
+    def _check(status, function):
+        if status < 0:
+            raise OSError(f"{function} a échoué (code Pico {status})")
+
+    def synthesize(self, text):
+        """
+        :param text: Texte à prononcer.
+        :return: Echantillons PCM (np.int16) à PicoEngine.rate.
+        """
+        data = text.encode("utf-8") + b"\0"
+        chunks = []
+        received = ctypes.c_int16()
+        data_type = ctypes.c_int16()
+        sent = ctypes.c_int16()
+        try:
+            while data:
+                # pico_putTextUtf8 accepte au plus 32767 octets par appel
+                self._check(self._lib.pico_putTextUtf8(self._engine, data, min(len(data), 0x7FFF), ctypes.byref(sent)),
+                            "pico_putTextUtf8")
+                data = data[sent.value:]
+                while True:
+                    status = self._lib.pico_getData(self._engine, self._buffer, len(self._buffer),
+                                                    ctypes.byref(received), ctypes.byref(data_type))
+                    if received.value:
+                        chunks.append(self._buffer.raw[:received.value])
+                    if status != PICO_STEP_BUSY:
+                        break
+                self._check(status, "pico_getData")
+        except OSError:
+            self._lib.pico_resetEngine(self._engine, PICO_RESET_SOFT)
+            raise
+        return np.frombuffer(b"".join(chunks), dtype=np.int16)
+
+    def close(self):
+        """Libère le moteur et les ressources."""
+        if self._engine:
+            self._lib.pico_disposeEngine(self._system, ctypes.byref(self._engine))
+        if self._system:
+            self._lib.pico_releaseVoiceDefinition(self._system, self._voice)
+            for resource in self._resources:
+                self._lib.pico_unloadResource(self._system, ctypes.byref(resource))
+            self._lib.pico_terminate(ctypes.byref(self._system))
+        self._engine = ctypes.c_void_p()
+        self._system = ctypes.c_void_p()
+        self._resources = []
+
+class Pico2WaveEngine:
+    """
+    Repli quand libttspico n'est pas chargeable : un seul appel à pico2wave par phrase
+    (au lieu de bash + pico2wave + sox + aplay), fichier intermédiaire en mémoire (/dev/shm).
+    """
+    rate = 16000
+
+    def __init__(self, lang="fr-FR"):
+        """:param lang: Langue de la voix."""
+        if shutil.which("pico2wave") is None:
+            raise FileNotFoundError("pico2wave introuvable")
+        self.lang = lang
+        self._dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+    def synthesize(self, text):
+        """Même interface que PicoEngine.synthesize()."""
+        path = os.path.join(self._dir, f"tts_{os.getpid()}.wav")
+        try:
+            subprocess.run(["pico2wave", "-w", path, "-l", self.lang, text], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with wave.open(path, "rb") as f:
+                self.rate = f.getframerate()
+                return np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        pass
+
+def open_engine(lang="fr-FR"):
+    """
+    :return: Le meilleur moteur disponible (PicoEngine, sinon Pico2WaveEngine), None si aucun.
+    """
+    for engine in (PicoEngine, Pico2WaveEngine):
+        try:
+            return engine(lang)
+        except OSError as e:
+            print(f"Synthèse : {engine.__name__} indisponible ({e})")
+    return None
+
+def time_stretch(samples, speed, rate=16000, frame_ms=20):
+    """
+    Change la durée d'un signal sans changer sa hauteur (WSOLA, comme l'effet `tempo` de sox) :
+    des trames fenêtrées sont recopiées avec un pas de synthèse fixe, chaque trame étant recalée
+    (intercorrélation) sur la continuation naturelle de la précédente pour éviter les ruptures de phase.
+    :param samples: Signal (np.float32).
+    :param speed: Facteur de vitesse (>1 : plus court).
+    :return: Signal (np.float32) de longueur len(samples) / speed.
+    """
+    frame = max(int(rate * frame_ms / 1000) // 2 * 2, 8)
+    hop = frame // 2
+    tolerance = frame // 4
+    out_len = int(len(samples) / speed)
+    if len(samples) < frame or out_len < frame:
+        return samples[:out_len].copy()
+    window = np.hanning(frame + 1)[:-1].astype(np.float32) # Somme constante (1) avec un recouvrement de 50 %
+    padded = np.concatenate((np.zeros(tolerance, np.float32), samples,
+                             np.zeros(frame + 2 * tolerance + hop + int(speed * hop), np.float32)))
+    out = np.zeros(out_len + frame, np.float32)
+    delta = 0
+    for k in range(out_len // hop + 1):
+        start = int(k * hop * speed) + tolerance + delta
+        out[k * hop:k * hop + frame] += padded[start:start + frame] * window
+        # Recherche, autour de la position nominale suivante, de la trame la plus semblable
+        # à la continuation naturelle de celle qui vient d'être copiée
+        continuation = padded[start + hop:start + hop + frame]
+        nominal = int((k + 1) * hop * speed)
+        region = padded[nominal:nominal + frame + 2 * tolerance]
+        delta = int(np.argmax(np.correlate(region, continuation, mode="valid"))) - tolerance
+    return out[:out_len]
+
+class VoiceEffect:
+    """
+    Effets appliqués à la voix (équivalent de `sox tempo 1.5 pitch -200` dans text_to_speech.sh).
+    La hauteur est obtenue par rééchantillonnage, après un changement de durée qui le compense.
+    """
+
+    def __init__(self, tempo=1.5, pitch_cents=-200):
+        """
+        :param tempo: Facteur de vitesse d'élocution (1.0 = normal).
+        :param pitch_cents: Décalage de hauteur en centièmes de demi-ton (0 = normal).
+        """
+        self.tempo = tempo
+        self.pitch_cents = pitch_cents
+
+    def apply(self, pcm, rate):
+        """
+        :param pcm: Echantillons np.int16.
+        :param rate: Fréquence d'échantillonnage (Hz).
+        :return: Echantillons np.int16 traités.
+        """
+        if len(pcm) == 0 or (self.tempo == 1.0 and self.pitch_cents == 0):
+            return pcm
+        ratio = 2.0 ** (self.pitch_cents / 1200.0) # < 1 : voix plus grave
+        samples = pcm.astype(np.float32)
+        # Le rééchantillonnage allonge le signal de 1 / ratio : la durée est d'abord réduite d'autant
+        samples = time_stretch(samples, self.tempo / ratio, rate)
+        if ratio != 1.0 and len(samples) > 1:
+            samples = np.interp(np.arange(0, len(samples) - 1, ratio), np.arange(len(samples)), samples)
+        return np.clip(samples, -32768, 32767).astype(np.int16)
+
+class PcmStream:
+    """
+    Sortie audio ouverte une seule fois : flux PCM 16 bits mono à fréquence et taille de période fixes.
+    Les messages sont écrits période par période ; entre deux messages, du silence est écrit
+    pendant `keepalive` secondes pour que le périphérique reste en marche (pas de réouverture,
+    pas de première syllabe coupée). Au-delà, le flux se vide et repart au message suivant.
+
+    Une horloge (trames écrites / fréquence - temps écoulé) donne l'avance du tampon : c'est la latence
+    de sortie du premier échantillon de chaque message ; une avance négative est un sous-débit (underrun).
+    Les sous-classes implémentent _write(octets) (bloquant au rythme du périphérique si possible) et close().
+    """
+
+    def __init__(self, rate=16000, period_ms=20, periods=4, keepalive=5.0, realtime=True):
+        """
+        :param rate: Fréquence d'échantillonnage du flux (Hz).
+        :param period_ms: Durée d'une période (granularité des écritures).
+        :param periods: Nombre de périodes dans le tampon du périphérique.
+        :param keepalive: Durée (s) pendant laquelle du silence est écrit après un message.
+        :param realtime: Si True, les écritures sont cadencées pour ne pas dépasser le tampon.
+        """
+        self.rate = rate
+        self.period = int(rate * period_ms / 1000)
+        self.periods = periods
+        self.keepalive = keepalive
+        self.realtime = realtime
+        self.underruns = 0
+        self.latency = LatencyHistogram() # Avance du tampon au premier échantillon de chaque message
+        self._silence = np.zeros(self.period, np.int16)
+        self._clock_start = None
+        self._frames = 0
+        self._active = False # Flux en marche (messages ou silence écrits sans interruption)
+        self._last_message = 0.0
+        self.open_time = None # Durée d'ouverture et de configuration du périphérique (s)
+
+    def _buffered(self, now):
+        """:return: Durée (s) écrite mais pas encore jouée, négative si le tampon s'est vidé."""
+        return self._frames / self.rate - (now - self._clock_start)
+
+    def _push(self, chunk):
+        """Ecrit une période en tenant l'horloge du flux."""
+        now = time.monotonic()
+        if self._clock_start is not None and self._active:
+            ahead = self._buffered(now)
+            if ahead < -self.period / self.rate: # Tampon vide depuis plus d'une période
+                self.underruns += 1
+                self._clock_start = None
+            elif self.realtime and ahead > self.periods * self.period / self.rate:
+                time.sleep(ahead - self.periods * self.period / self.rate)
+        if self._clock_start is None or not self._active:
+            self._clock_start, self._frames = time.monotonic(), 0
+        self._active = True
+        self._write(chunk.tobytes())
+        self._frames += len(chunk)
+
+    def play(self, pcm, rate, interrupt=None):
+        """
+        Ecrit un message (np.int16 mono), rééchantillonné si besoin, et rend la main quand il est dans le tampon.
+        :param interrupt: threading.Event consulté avant chaque période : s'il est levé, l'écriture s'arrête
+                          (seul le son déjà dans le tampon, au plus `periods` périodes, est encore joué).
+        :return: Nombre d'échantillons de `pcm` écrits (len(pcm) si le message n'a pas été interrompu).
+        """
+        size = len(pcm)
+        if rate != self.rate and len(pcm) > 1:
+            pcm = np.interp(np.arange(0, len(pcm) - 1, rate / self.rate), np.arange(len(pcm)), pcm).astype(np.int16)
+        self.latency.record(int(max(self._buffered(time.monotonic()), 0) * 1e9) if self._active else 0)
+        self._last_message = time.monotonic()
+        for start in range(0, len(pcm), self.period):
+            if interrupt is not None and interrupt.is_set():
+                return min(start * size // max(len(pcm), 1), size)
+            chunk = pcm[start:start + self.period]
+            if len(chunk) < self.period:
+                chunk = np.concatenate((chunk, self._silence[len(chunk):]))
+            self._push(chunk)
+        self._last_message = time.monotonic()
+        return size
+
+    def buffered(self):
+        """:return: Durée (s) de son écrite mais pas encore jouée."""
+        return max(self._buffered(time.monotonic()), 0.0) if self._active else 0.0
+
+    def idle(self):
+        """
+        A appeler entre deux messages : écrit une période de silence tant que keepalive n'est pas écoulé.
+        :return: True si du silence a été écrit (l'appel a duré environ une période), False si le flux est au repos.
+        """
+        if not self._active:
+            return False
+        if time.monotonic() - self._last_message >= self.keepalive:
+            self._active = False # Arrêt volontaire : le tampon se vide sans compter de sous-débit
+            return False
+        self._push(self._silence)
+        return True
+
+    def stats(self):
+        """:return: Ouverture du périphérique, latence de sortie (ms) et sous-débits."""
+        return {
+            "open_ms": round(1e3 * self.open_time, 1) if self.open_time is not None else None,
+            "latency": self.latency.summary(),
+            "underruns": self.underruns,
+        }
+
+    def reopen(self):
+        """
+        Ferme puis rouvre le périphérique après une erreur d'écriture (aplay arrêté, carte son perdue).
+        :raises OSError: Réouverture impossible.
+        """
+        try:
+            self.close()
+        except (OSError, ValueError):
+            pass
+        self._active = False
+        self._clock_start = None
+        self._open()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class AlsaOutput(PcmStream):
+    """Flux ALSA direct (module pyalsaaudio) : les écritures bloquent au rythme de la carte son."""
+
+    def __init__(self, device="plughw:2,0", **kwargs):
+        """
+        :param device: Périphérique ALSA (carte 2 comme dans text_to_speech.sh, "null" pour les essais).
+        :param kwargs: Paramètres de PcmStream.
+        :raises ImportError: pyalsaaudio absent.
+        :raises OSError: Périphérique impossible à ouvrir.
+        """
+        import alsaaudio # Optionnel : apt install python3-alsaaudio
+        super().__init__(**kwargs)
+        self._alsa = alsaaudio
+        self.device = device
+        self._open()
+
+    def _open(self):
+        alsaaudio = self._alsa
+        start = time.monotonic()
+        try:
+            self._pcm = alsaaudio.PCM(type=alsaaudio.PCM_PLAYBACK, mode=alsaaudio.PCM_NORMAL, device=self.device,
+                                      channels=1, rate=self.rate, format=alsaaudio.PCM_FORMAT_S16_LE,
+                                      periodsize=self.period, periods=self.periods)
+        except alsaaudio.ALSAAudioError as e:
+            raise OSError(errno.EIO, f"{self.device} : {e}") from e
+        self.open_time = time.monotonic() - start
+
+    def _write(self, data):
+        try:
+            self._pcm.write(data)
+        except self._alsa.ALSAAudioError as e:
+            raise OSError(errno.EIO, f"{self.device} : {e}") from e
+
+    def close(self):
+        self._pcm.close()
+
+class AplayStreamOutput(PcmStream):
+    """Un seul processus aplay gardé ouvert, alimenté par un tube (sans pyalsaaudio)."""
+
+    def __init__(self, device="plughw:2,0", **kwargs):
+        """
+        :param device: Périphérique ALSA.
+        :param kwargs: Paramètres de PcmStream.
+        """
+        super().__init__(**kwargs)
+        self.device = device
+        self._open()
+
+    def _open(self):
+        start = time.monotonic()
+        self._proc = subprocess.Popen(["aplay", "-q", "-D", self.device, "-t", "raw", "-f", "S16_LE",
+                                       "-r", str(self.rate), "-c", "1", f"--period-size={self.period}",
+                                       f"--buffer-size={self.period * self.periods}"],
+                                      stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            fcntl.fcntl(self._proc.stdin.fileno(), 1031, 4096) # F_SETPIPE_SZ : pas de son en attente dans le tube
+        except OSError:
+            pass
+        self.open_time = time.monotonic() - start
+
+    def _write(self, data):
+        # aplay arrêté : BrokenPipeError (EPIPE), voir Sound._reopen_output()
+        self._proc.stdin.write(data)
+        self._proc.stdin.flush()
+
+    def close(self):
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass # aplay déjà arrêté
+        try:
+            self._proc.wait(timeout=2.0)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+
+class FileOutput(PcmStream):
+    """Flux écrit dans un fichier WAV, cadencé comme une carte son : essais sans matériel audio."""
+
+    def __init__(self, path, **kwargs):
+        """
+        :param path: Fichier WAV créé.
+        :param kwargs: Paramètres de PcmStream.
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self._open()
+
+    def _open(self):
+        start = time.monotonic()
+        self._file = wave.open(self.path, "wb")
+        self._file.setnchannels(1)
+        self._file.setsampwidth(2)
+        self._file.setframerate(self.rate)
+        self.open_time = time.monotonic() - start
+
+    def _write(self, data):
+        self._file.writeframes(data)
+
+    def close(self):
+        self._file.close()
+
+def open_output(device="plughw:2,0", **kwargs):
+    """
+    :return: Le flux de sortie disponible : AlsaOutput, sinon AplayStreamOutput,
+             sinon FileOutput vers /dev/null (aucune sortie audio).
+    """
+    try:
+        return AlsaOutput(device, **kwargs)
+    except (ImportError, OSError) as e:
+        print(f"Sortie audio : AlsaOutput indisponible ({e})")
+    if shutil.which("aplay") is not None:
+        return AplayStreamOutput(device, **kwargs)
+    print("Sortie audio : aplay introuvable, aucun son ne sera joué")
+    return FileOutput(os.devnull, **kwargs)
+
+def trim_silence(pcm, threshold=300, margin=80):
+    """
+    Retire le silence en début et fin de clip (Pico en ajoute autour de chaque phrase).
+    :param threshold: Amplitude en dessous de laquelle un échantillon est considéré silencieux.
+    :param margin: Echantillons conservés de part et d'autre de la voix.
+    """
+    loud = np.flatnonzero(np.abs(pcm.astype(np.int32)) > threshold)
+    if len(loud) == 0:
+        return pcm[:0]
+    return pcm[max(loud[0] - margin, 0):loud[-1] + margin + 1]
+
+class PhraseCache:
+    """
+    Clips PCM pré-calculés (effets de voix déjà appliqués) pour le vocabulaire fixe des annonces :
+    nombres, noms d'objets, positions, modes. Les clips sont stockés dans un fichier projeté en mémoire
+    (<path>.pcm, index dans <path>.json) ; une annonce comme "chaise à gauche, 150" est assemblée
+    en concaténant les clips, sans synthèse. Les phrases hors vocabulaire sont gardées dans un cache LRU.
+    """
+
+    def __init__(self, path, lru_size=32, gap_ms=30, pause_ms=150):
+        """
+        :param path: Chemin des fichiers du cache, sans extension.
+        :param lru_size: Nombre de phrases synthétisées gardées en mémoire.
+        :param gap_ms: Silence inséré entre deux clips d'un même groupe de mots.
+        :param pause_ms: Silence inséré à chaque virgule.
+        """
+        self.path = path
+        self.lru_size = lru_size
+        self.gap_ms = gap_ms
+        self.pause_ms = pause_ms
+        self.key = None # Moteur et réglages de voix ayant produit les clips
+        self.rate = None
+        self._clips = ({}, np.zeros(0, np.int16)) # (texte -> (début, longueur), échantillons)
+        self._max_words = 1
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """Charge (projette en mémoire) le cache existant, s'il y en a un."""
+        try:
+            with open(self.path + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            pcm = np.memmap(self.path + ".pcm", dtype=np.int16, mode="r") if meta["clips"] else np.zeros(0, np.int16)
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Cache de phrases illisible ({e}), il sera reconstruit")
+            return
+        self.key, self.rate = meta["key"], meta["rate"]
+        index = {text: tuple(span) for text, span in meta["clips"].items()}
+        self._max_words = max((len(text.split()) for text in index), default=1)
+        self._clips = (index, pcm)
+
+    def __len__(self):
+        return len(self._clips[0])
+
+    def __contains__(self, text):
+        return text in self._clips[0]
+
+    def build(self, phrases, render, rate, key):
+        """
+        Pré-calcule les phrases absentes du cache puis réécrit les fichiers.
+        Les clips existants sont réutilisés s'ils ont été produits avec la même clé.
+        :param phrases: Textes à mettre en cache.
+        :param render: Fonction texte -> échantillons np.int16 (synthèse + effets).
+        :param rate: Fréquence d'échantillonnage des clips.
+        :param key: Identifiant du moteur et des réglages de voix (les clips d'une autre clé sont recalculés).
+        :return: Nombre de clips calculés.
+        """
+        index, pcm = self._clips if key == self.key else ({}, None)
+        missing = [text for text in dict.fromkeys(phrases) if text not in index]
+        if not missing:
+            return 0
+        clips = {text: np.asarray(pcm[start:start + length]) for text, (start, length) in index.items()}
+        for text in missing:
+            clips[text] = trim_silence(render(text))
+
+        # Ecriture dans des fichiers temporaires puis remplacement : un cache interrompu reste cohérent
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        spans, offset = {}, 0
+        with open(self.path + ".pcm.tmp", "wb") as f:
+            for text, clip in clips.items():
+                f.write(clip.astype(np.int16).tobytes())
+                spans[text] = (offset, len(clip))
+                offset += len(clip)
+        with open(self.path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"key": key, "rate": rate, "clips": spans}, f, ensure_ascii=False)
+        os.replace(self.path + ".pcm.tmp", self.path + ".pcm")
+        os.replace(self.path + ".json.tmp", self.path + ".json")
+        self.load()
+        with self._lock:
+            self._lru.clear()
+        return len(missing)
+
+    def _assemble(self, text):
+        """Découpe le texte en clips du cache (plus longs groupes de mots d'abord), None s'il manque un mot."""
+        index, pcm = self._clips
+        if not index:
+            return None
+        gap = np.zeros(int(self.rate * self.gap_ms / 1000), np.int16)
+        pause = np.zeros(int(self.rate * self.pause_ms / 1000), np.int16)
+        parts = []
+        for group in text.split(","):
+            words = group.split()
+            if not words:
+                continue
+            if parts:
+                parts.append(pause)
+            i = 0
+            while i < len(words):
+                for j in range(min(len(words), i + self._max_words), i, -1):
+                    span = index.get(" ".join(words[i:j]))
+                    if span is not None:
+                        break
+                else:
+                    return None
+                if i > 0:
+                    parts.append(gap)
+                parts.append(pcm[span[0]:span[0] + span[1]])
+                i = j
+        return np.concatenate(parts) if parts else None
+
+    def get(self, text):
+        """
+        :param text: Texte à prononcer.
+        :return: Echantillons np.int16 à self.rate, None si le texte doit être synthétisé.
+        """
+        with self._lock:
+            pcm = self._lru.get(text)
+            if pcm is not None:
+                self._lru.move_to_end(text)
+        if pcm is None:
+            pcm = self._assemble(text)
+        if pcm is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return pcm
+
+    def put(self, text, pcm):
+        """Garde une phrase synthétisée hors vocabulaire (la moins récemment utilisée est oubliée)."""
+        with self._lock:
+            self._lru[text] = pcm
+            self._lru.move_to_end(text)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def stats(self):
+        """:return: Clips pré-calculés, phrases en LRU, annonces servies par le cache et synthétisées."""
+        return {"clips": len(self), "lru": len(self._lru), "hits": self.hits, "misses": self.misses}
+
 class Sound:
 
-    def __init__(self, script_path="./text_to_speech.sh", queue_size=10):
+    def __init__(self, script_path="./text_to_speech.sh", queue_size=10, engine="auto", output=None, effect=None,
+                 cache=None, stats_interval=None, resume_interrupted=False):
         """
         Initialise la classe avec un worker asynchrone pour la TTS.
-        :param script_path: Chemin vers le script utilisé pour la synthèse vocale.
-        :param queue_size: Taille max de la file d'attente de messages TTS.
+        :param script_path: Chemin vers le script utilisé si aucun moteur de synthèse n'est disponible.
+        :param queue_size: Taille max de la file des messages prioritaires.
+        :param engine: Moteur de synthèse (objet avec synthesize(text) et rate), "auto" pour open_engine(),
+                       None pour toujours utiliser le script.
+        :param output: Sortie audio (objet avec play(pcm, rate), éventuellement idle() : voir PcmStream),
+                       open_output() par défaut.
+        :param effect: Effet de voix (VoiceEffect() par défaut : tempo 1.5, hauteur -200).
+        :param cache: PhraseCache consulté avant toute synthèse (voir build_cache()), None pour aucun.
+        :param stats_interval: Si renseigné, stats() est affiché toutes les stats_interval secondes.
+        :param resume_interrupted: Un message normal coupé par un message prioritaire ou urgent est repris là où il
+                                   s'est arrêté (True) ou abandonné (False, les distances annoncées sont
+                                   alors périmées). Il est abandonné dans tous les cas si un message normal
+                                   plus récent attend.
         """
         self.script_path = script_path
+        self.engine = open_engine() if engine == "auto" else engine
+        if output is None and self.engine is not None:
+            output = open_output() # Le script, lui, ouvre la carte son à chaque message
+        self.output = output
+        self.effect = effect if effect is not None else VoiceEffect()
+        self.cache = cache
+        self._engine_lock = threading.Lock() # Le moteur sert au worker et à build_cache()
+        self.stats_interval = stats_interval
+        self._last_stats_dump = time.monotonic()
+        # Préemption : un message prioritaire coupe le message normal en cours (voir _play())
+        self.resume_interrupted = resume_interrupted
+        self._preempt = threading.Event()
+        self._preempt_requested = None # Instant du dernier message prioritaire (monotonic)
+        self._interrupted = None # (échantillons restants, fréquence) du message normal coupé, à reprendre
+        self.preemption = LatencyHistogram() # Demande prioritaire -> fin du son coupé (tampon compris)
+        self.interruptions = 0
+        if self.engine is None:
+            print(f"Synthèse vocale par {script_path}")
         
         # Rend le script exécutable (chmod +x) pour éviter l'erreur [Errno 13] Permission denied
         if os.path.exists(self.script_path):
@@ -25,82 +675,298 @@ class Sound:
             except Exception as e:
                 print(f"Attention: Impossible de changer les permissions du script son ({e})")
 
-        self._queue_normal = Queue(maxsize=queue_size)
-        self._queue_priority = Queue(maxsize=queue_size)
+        # Boîte aux lettres protégée par un verrou : file prioritaire bornée et dernier message normal
+        # (un seul emplacement). Le worker dort sur la condition jusqu'au prochain speak().
+        self.queue_size = queue_size
+        self._mailbox = threading.Condition(threading.Lock())
+        self._priority = deque() # (texte, instant de la demande)
+        self._urgent = None # (texte, instant de la demande) : dernière annonce de danger
+        self._latest = None # (texte, instant de la demande)
+        self.queue_delay = LatencyHistogram() # speak() -> prise en charge par le worker
+        self.wakeups = 0 # Réveils du worker (un par message au plus, plus un par affichage des stats)
+        self._stats_start = time.monotonic()
         self._stop = False
         self._worker = threading.Thread(target=self._run_worker, daemon=True)
         self._worker.start()
 
+    def _next_message(self):
+        """
+        Attend le prochain message : prioritaire d'abord, puis dernier message urgent, puis dernier message
+        normal, puis reprise d'un message coupé. Entre deux messages, la sortie écrit du silence tant qu'elle
+        en a besoin (chaque écriture dure une période) ; le worker dort ensuite jusqu'au prochain speak().
+        :return: (texte, instant de la demande, "priority" | "urgent" | "normal"),
+                 (None, None, "normal") pour reprendre le message coupé, None à l'arrêt.
+        """
+        idle = getattr(self.output, "idle", None)
+        feeding = idle is not None
+        while True:
+            with self._mailbox:
+                if not (self._stop or self._priority or self._urgent is not None or self._latest is not None
+                        or self._interrupted is not None or feeding):
+                    timeout = None
+                    if self.stats_interval is not None:
+                        timeout = max(self._last_stats_dump + self.stats_interval - time.monotonic(), 0.01)
+                    self._mailbox.wait(timeout)
+                    self.wakeups += 1
+                if self._stop:
+                    return None
+                if self._priority:
+                    return self._priority.popleft() + ("priority",)
+                if self._urgent is not None:
+                    message, self._urgent = self._urgent, None
+                    return message + ("urgent",)
+                if self._latest is not None:
+                    message, self._latest = self._latest, None
+                    self._interrupted = None # Un message plus récent remplace le message coupé
+                    return message + ("normal",)
+                if self._interrupted is not None:
+                    return None, None, "normal"
+            self.dump_stats_if_due()
+            feeding = idle is not None and idle()
+
     def _run_worker(self):
         """Boucle du worker qui consomme les messages TTS."""
-        while not self._stop:
-            text = None
-            
-            # 1. On vérifie d'abord la file PRIORITAIRE (non-bloquant)
-            if not self._queue_priority.empty():
-                try:
-                    text = self._queue_priority.get_nowait()
-                    self._queue_priority.task_done()
-                except Empty:
-                    pass
-            
-            # 2. Si rien en prioritaire, on regarde la file NORMALE (ou blocage court)
-            if text is None:
-                try:
-                    # Timeout court pour vérifier régulièrement si un message prioritaire arrive
-                    text = self._queue_normal.get(timeout=0.1)
-                    self._queue_normal.task_done()
-                except Empty:
-                    continue
-            
-            # 3. Traitement du message (Identique)
+        while True:
+            message = self._next_message()
+            if message is None:
+                break
+            text, requested, kind = message
             if text is None:
+                # Reprise du message normal coupé par un message prioritaire ou urgent
+                (pcm, rate), self._interrupted = self._interrupted, None
+                self._deliver(lambda: self._resume(pcm, rate))
                 continue
+            self.queue_delay.record(int((time.monotonic() - requested) * 1e9))
+            self._deliver(lambda: self._speak_now(text, kind))
 
-            try:
-                # Exécution synchrone du script
-                import gc
-                gc.collect()
-                subprocess.run([self.script_path, text], check=False)
-            except OSError as e:
-                 if e.errno == 12:
-                     print("Erreur mémoire TTS (récupération...)")
-                     time.sleep(1)
-            except Exception as e:
-                print(f"Erreur TTS : {e}")
-
-    def speak(self, text, priority=False):
+    def _deliver(self, say):
         """
-        Enfile un texte pour synthèse vocale.
-        :param priority: Si True, le message est mis dans une file prioritaire et ne peut pas être écrasé.
-                         Si False, le message écrase les précédents messages normaux en attente.
+        Exécute say() sans jamais arrêter le worker : les erreurs sont affichées et, si la sortie audio
+        est perdue, elle est rouverte puis say() est rejoué une fois (le message n'est pas perdu).
+        :param say: Fonction sans argument qui dit le message.
         """
-        if priority:
-            # Message important (Mode, Alerte système) : On l'ajoute à la file prioritaire
-            # On ne vide PAS la file prioritaire, on empile les messages importants
-            try:
-                self._queue_priority.put_nowait(text)
-            except Full:
-                pass
+        try:
+            say()
+        except OSError as e:
+             if e.errno == errno.ENOMEM:
+                 print("Erreur mémoire TTS (récupération...)")
+                 time.sleep(1)
+             else:
+                 print(f"Erreur TTS : {e}")
+                 if e.errno in (errno.EPIPE, errno.EIO) and self.output is not None:
+                     self._reopen_output()
+                     try:
+                         say() # Sortie rouverte ou script
+                     except Exception as e:
+                         print(f"Erreur TTS : {e}")
+        except Exception as e:
+            print(f"Erreur TTS : {e}")
+
+    def _resume(self, pcm, rate):
+        """Rejoue la fin d'un message coupé ; abandonnée si la sortie est passée au script (pas de clip à jouer)."""
+        if self.output is not None:
+            self._play(pcm, rate, "normal")
+
+    def _speak_now(self, text, kind):
+        """Dit un message (dans le worker) : moteur résident et sortie audio, ou script."""
+        if self.engine is not None and self.output is not None:
+            self._say(text, kind)
         else:
-            # Message 'spam' (Distance, Objet) : On vide la file NORMALE pour ne garder que le frais
-            try:
-                while not self._queue_normal.empty():
-                    try:
-                        self._queue_normal.get_nowait()
-                        self._queue_normal.task_done()
-                    except Empty:
-                        break
-                
-                self._queue_normal.put_nowait(text)
-            except Full:
-                pass
+            # Exécution du script, interrompue si un message prioritaire ou urgent arrive
+            import gc
+            gc.collect()
+            self._run_script(text, kind)
+
+    def _reopen_output(self):
+        """
+        Sortie audio perdue (aplay arrêté, carte son débranchée) : elle est rouverte, sinon la synthèse
+        repasse par le script (qui ouvre la carte son à chaque message).
+        :return: True si la sortie a été rouverte.
+        """
+        reopen = getattr(self.output, "reopen", None)
+        try:
+            if reopen is None:
+                self.output.close()
+                raise OSError("réouverture non prise en charge")
+            reopen()
+            print("Sortie audio rouverte")
+            return True
+        except OSError as e:
+            print(f"Sortie audio indisponible ({e}), synthèse par {self.script_path}")
+            self.output = None
+            return False
+
+    def render(self, text):
+        """
+        :param text: Texte à prononcer.
+        :return: (échantillons np.int16 avec l'effet de voix appliqué, fréquence d'échantillonnage).
+        """
+        cache = self.cache if self.cache is not None and self.cache.key == self.cache_key() else None
+        if cache is not None:
+            pcm = cache.get(text)
+            if pcm is not None:
+                return pcm, cache.rate
+        pcm = self._synthesize(text)
+        if cache is not None:
+            cache.put(text, pcm)
+        return pcm, self.engine.rate
+
+    def _synthesize(self, text):
+        with self._engine_lock:
+            pcm = self.engine.synthesize(text)
+        return self.effect.apply(pcm, self.engine.rate)
+
+    def cache_key(self):
+        """:return: Identifiant du moteur et des réglages de voix (un cache produit autrement n'est pas utilisé)."""
+        return (f"{type(self.engine).__name__}/{getattr(self.engine, 'lang', '')}/"
+                f"{self.effect.tempo}/{self.effect.pitch_cents}")
+
+    def build_cache(self, phrases):
+        """
+        Pré-calcule les phrases du vocabulaire dans le cache (long au premier démarrage, immédiat ensuite).
+        Peut tourner dans un thread pendant que la synthèse est utilisée.
+        :return: Nombre de clips calculés.
+        """
+        if self.cache is None or self.engine is None:
+            return 0
+        start = time.monotonic()
+        count = self.cache.build(phrases, self._synthesize, self.engine.rate, self.cache_key())
+        if count:
+            print(f"Cache de phrases : {count} clips calculés en {time.monotonic() - start:.1f} s")
+        return count
+
+    def _say(self, text, kind="normal"):
+        """Synthèse et lecture synchrones (dans le worker)."""
+        pcm, rate = self.render(text)
+        self._play(pcm, rate, kind)
+
+    def _play(self, pcm, rate, kind):
+        """
+        Joue un message. Un message normal ou urgent est écrit période par période et s'arrête dès qu'un
+        message prioritaire ou un nouveau message urgent est demandé (speak() lève _preempt) ;
+        un message prioritaire n'est jamais coupé. Seul un message normal coupé peut être repris.
+        """
+        if kind == "priority" or not isinstance(self.output, PcmStream):
+            self.output.play(pcm, rate)
+            return
+        self._arm_preemption()
+        written = self.output.play(pcm, rate, interrupt=self._preempt)
+        if written < len(pcm) and not self._stop:
+            self._record_preemption(self.output.buffered())
+            if self.resume_interrupted and kind == "normal":
+                self._interrupted = (pcm[written:], rate)
+
+    def _run_script(self, text, kind):
+        """
+        Ancienne synthèse par text_to_speech.sh : le processus est arrêté si un message prioritaire
+        ou urgent arrive (sauf pour un message prioritaire).
+        """
+        if kind == "priority":
+            subprocess.run([self.script_path, text], check=False)
+            return
+        if self._arm_preemption():
+            if not self._stop:
+                self._record_preemption(0.0) # Coupé avant même d'avoir commencé
+            return
+        proc = subprocess.Popen([self.script_path, text], start_new_session=True)
+        while proc.poll() is None:
+            if self._preempt.wait(0.02):
+                try:
+                    os.killpg(proc.pid, signal.SIGTERM) # bash, pico2wave, sox et aplay
+                except ProcessLookupError:
+                    pass # Groupe déjà terminé entre poll() et l'arrêt
+                proc.wait()
+                if not self._stop:
+                    self._record_preemption(0.0)
+                break
+
+    def _arm_preemption(self):
+        """
+        Réarme _preempt avant la lecture d'un message interruptible. Sous le verrou de la boîte aux lettres,
+        une demande déposée entre la prise du message et ce réarmement n'est pas perdue.
+        :return: True si le message doit être coupé immédiatement.
+        """
+        with self._mailbox:
+            if self._priority or self._urgent is not None or self._stop:
+                self._preempt.set()
+                return True
+            self._preempt.clear()
+            return False
+
+    def _record_preemption(self, buffered):
+        """Mesure la préemption : demande prioritaire -> dernier échantillon du message coupé."""
+        self.interruptions += 1
+        if self._preempt_requested is not None:
+            self.preemption.record(int((time.monotonic() - self._preempt_requested + buffered) * 1e9))
+
+    def stats(self):
+        """:return: Statistiques de la sortie audio et du cache de phrases (dictionnaire)."""
+        elapsed = max(time.monotonic() - self._stats_start, 1e-9)
+        stats = {
+            "messages": self.queue_delay.count,
+            "queue_delay": self.queue_delay.summary(),
+            "wakeups_per_s": round(self.wakeups / elapsed, 2),
+            "interruptions": self.interruptions,
+            "preemption": self.preemption.summary(),
+        }
+        if hasattr(self.output, "stats"):
+            stats["output"] = self.output.stats()
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def dump_stats_if_due(self):
+        """Affiche stats() sur une ligne JSON si stats_interval est écoulé."""
+        if self.stats_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_dump >= self.stats_interval:
+            self._last_stats_dump = now
+            print("STATS_SON " + json.dumps(self.stats(), ensure_ascii=False), flush=True)
+
+    def speak(self, text, priority=False, urgent=False):
+        """
+        Dépose un texte pour synthèse vocale (sans attente, coût constant).
+        :param priority: Si True, le message est mis dans une file prioritaire et ne peut pas être écrasé
+                         (changement de mode, messages système) ; il interrompt le message en cours de lecture.
+                         Si False, le message remplace le précédent message normal en attente.
+        :param urgent: Si True (et priority False), le message remplace le précédent message urgent
+                       en attente ou en cours de lecture et interrompt le message normal en cours :
+                       seule la dernière annonce de danger est dite, jamais une série de distances périmées.
+        """
+        now = time.monotonic()
+        with self._mailbox:
+            if priority:
+                # Message important (Mode, Alerte système) : on empile, sans écraser les autres
+                if len(self._priority) >= self.queue_size:
+                    return
+                self._priority.append((text, now))
+                # Coupe le message normal en cours de lecture (voir _play())
+                self._preempt_requested = now
+                self._preempt.set()
+            elif urgent:
+                # Distance en approche rapide : la plus récente seulement, dite tout de suite
+                self._urgent = (text, now)
+                self._preempt_requested = now
+                self._preempt.set()
+            else:
+                # Message 'spam' (Distance, Objet) : seul le plus frais compte
+                self._latest = (text, now)
+            self._mailbox.notify()
 
     def cleanup(self, drain_timeout=2.0):
         """Arrête proprement le worker TTS."""
-        self._stop = True
+        with self._mailbox:
+            self._stop = True
+            self._mailbox.notify()
+        self._preempt.set()
         if self._worker.is_alive():
             self._worker.join(timeout=2.0)
+        if not self._worker.is_alive(): # Le worker peut encore utiliser le moteur s'il n'a pas rendu la main
+            if self.engine is not None:
+                self.engine.close()
+            if self.output is not None:
+                self.output.close()
 
 # Exemple d'utilisation
 if __name__ == "__main__":
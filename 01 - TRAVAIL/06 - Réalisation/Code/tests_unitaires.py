@@ -2,14 +2,25 @@ import unittest
 import sys
 import time
 import os
+import tty
+import threading
+import tempfile
+import wave
+
+import numpy as np
 
 import Jetson.GPIO as GPIO
 from bouton import Button
 from vibration import Vibration
-from ultrasonic import UltrasonicSensor
-from sound import Sound
-from camera import Camera
-from main import format_distance_message
+from ultrasonic import UltrasonicSensor, UltrasonicArray, FrameParser, DistanceHistory, ThresholdBands
+from sound import Sound, VoiceEffect, PhraseCache, FileOutput
+from camera import Camera, Detection, DistanceEstimator, MotionGate, ObjectTracker, build_class_table, to_full_frame
+from estimator import ApproachEstimator
+from metrics import LatencyHistogram
+from serial_trace import TraceRecorder, TraceReplayer, read_trace
+from scheduler import InferenceScheduler
+from backends import Detector, FrameListSource, decode_ssd
+from main import format_distance_message, format_obstacle_message, vocabulaire
 
 class TestMaterielReel(unittest.TestCase):
 
@@ -127,6 +138,956 @@ class TestMaterielReel(unittest.TestCase):
         print("SUCCÈS : Pipeline caméra fonctionnel.")
         cam.cleanup()
 
+class TestLogiciel(unittest.TestCase):
+    """
+    Tests ne nécessitant pas de matériel (exécutables sur n'importe quelle machine Linux).
+    """
+
+    @staticmethod
+    def trame(distance_mm):
+        hi, lo = distance_mm >> 8, distance_mm & 0xFF
+        return bytes((0xFF, hi, lo, (0xFF + hi + lo) & 0xFF))
+
+    def test_06_parseur_trames(self):
+        """
+        Test US-02 (Logiciel) : Découpage du flux série en trames.
+        Resynchronisation, checksum invalide, trame coupée entre deux lectures.
+        """
+        parser = FrameParser(capacity=16)
+
+        # Octets parasites + faux header avant une trame valide
+        self.assertEqual(parser.feed(b"\x12\x34\xff\x00" + self.trame(1000)), 1000)
+
+        # Checksum invalide : ignorée
+        self.assertIsNone(parser.feed(b"\xff\x03\xe8\x00"))
+
+        # Trame coupée en deux lectures
+        frame = self.trame(1500)
+        self.assertIsNone(parser.feed(frame[:2]))
+        self.assertEqual(parser.feed(frame[2:]), 1500)
+
+        # Bloc plus grand que le tampon : on garde la plus récente
+        self.assertEqual(parser.feed(b"".join(self.trame(d) for d in range(200, 220))), 219)
+
+        # Bruit < 15 cm filtré
+        self.assertIsNone(parser.feed(self.trame(100)))
+
+    def test_07_historique_distances(self):
+        """
+        Test US-03 (Logiciel) : Historique circulaire des mesures.
+        """
+        history = DistanceHistory(capacity=8)
+        self.assertIsNone(history.get_sample())
+
+        # 20 mesures à 10 Hz se terminant maintenant : le tampon reboucle
+        now = time.monotonic()
+        for i in range(20):
+            history.append(now - (19 - i) * 0.1, 100.0 + i)
+
+        self.assertEqual(history.get_sample(), (now, 119.0))
+        window = history.get_history(0.35)
+        self.assertEqual([s.distance for s in window], [116.0, 117.0, 118.0, 119.0])
+        # Jamais plus que la capacité (moins la case en cours d'écriture)
+        self.assertEqual(len(history.get_history(10.0)), 7)
+        self.assertAlmostEqual(history.sample_rate(1.0), 10.0, places=3)
+
+    def test_08_estimation_approche(self):
+        """
+        Test US-04 (Logiciel) : Vitesse d'approche et temps avant collision.
+        """
+        estimator = ApproachEstimator()
+        self.assertIsNone(estimator.time_to_collision())
+
+        # Immobile face à un mur : pas de TTC
+        for i in range(20):
+            estimator.update(i * 0.1, 300.0)
+        self.assertIsNone(estimator.time_to_collision(now=1.9))
+
+        # Approche à 1 m/s avec un écho parasite isolé (filtré par la médiane)
+        for i in range(20):
+            estimator.update(2.0 + i * 0.1, 40.0 if i == 15 else 300.0 - 10.0 * i)
+        self.assertAlmostEqual(estimator.closing_speed(), 100.0, delta=15.0)
+        self.assertAlmostEqual(estimator.time_to_collision(now=3.9), 1.1, delta=0.2)
+
+        # Trou dans les mesures : le filtre repart de zéro
+        estimator.update(10.0, 150.0)
+        self.assertEqual(estimator.closing_speed(), 0.0)
+
+    def test_09_lecture_evenementielle_pty(self):
+        """
+        Test US-05 (Logiciel) : Lecture par select() sur un pseudo-terminal.
+        Le thread ne doit se réveiller qu'à l'arrivée des trames.
+        """
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        us = UltrasonicSensor(port=os.ttyname(slave_fd), mode="select")
+        try:
+            time.sleep(0.5)
+            self.assertLess(us.stats()["wakeups"], 5)
+
+            os.write(master_fd, self.trame(1234))
+            time.sleep(0.1)
+            self.assertEqual(us.get_distance(), 123.4)
+            self.assertEqual(us.stats()["latency"]["count"], 1)
+        finally:
+            us.cleanup()
+            os.close(master_fd)
+            os.close(slave_fd)
+
+    def test_10_histogramme_latence(self):
+        """
+        Test MES-01 (Logiciel) : Percentiles de l'histogramme de latence.
+        """
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.record(ms * 1_000_000)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        # Résolution de 10 seaux par décade : ~26 % d'erreur max
+        self.assertAlmostEqual(summary["p50_ms"], 50, delta=13)
+        self.assertAlmostEqual(summary["p99_ms"], 99, delta=26)
+        self.assertEqual(summary["max_ms"], 100)
+
+    def test_11_capteurs_multiples_pty(self):
+        """
+        Test US-06 (Logiciel) : Plusieurs capteurs servis par un seul thread.
+        """
+        sectors = ["à gauche", "devant", "à droite", "en bas"]
+        ptys = [os.openpty() for _ in sectors]
+        for _, slave_fd in ptys:
+            tty.setraw(slave_fd)
+        threads_before = threading.active_count()
+        array = UltrasonicArray({s: os.ttyname(slave) for s, (_, slave) in zip(sectors, ptys)})
+        try:
+            self.assertEqual(threading.active_count() - threads_before, 1)
+
+            for (master_fd, _), distance_mm in zip(ptys, (1200, 800, 2500, 3000)):
+                os.write(master_fd, self.trame(distance_mm))
+            os.write(ptys[1][0], self.trame(600)) # Mesure plus récente devant
+            time.sleep(0.2)
+
+            self.assertEqual(array.nearest_by_sector(),
+                             {"à gauche": 120.0, "devant": 60.0, "à droite": 250.0, "en bas": 300.0})
+            self.assertEqual(array.nearest(), ("devant", 60.0))
+            self.assertEqual(array.get_distance("à droite"), 250.0)
+            self.assertEqual(format_obstacle_message(["chaise"], "à gauche", 120.0), "chaise à gauche 120")
+            self.assertEqual(format_obstacle_message([], "devant", 60.0), "60")
+        finally:
+            array.cleanup()
+            for master_fd, slave_fd in ptys:
+                os.close(master_fd)
+                os.close(slave_fd)
+
+    def test_12_enregistrement_rejeu(self):
+        """
+        Test US-07 (Logiciel) : Enregistrement du flux brut puis rejeu accéléré dans un pty.
+        """
+        path = os.path.join(tempfile.mkdtemp(), "parcours.ustr")
+
+        # Enregistrement de 3 trames espacées de 100 ms
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        us = UltrasonicSensor(port=os.ttyname(slave_fd), recorder=TraceRecorder(path))
+        for distance_mm in (2000, 1900, 1800):
+            os.write(master_fd, self.trame(distance_mm))
+            time.sleep(0.1)
+        us.cleanup()
+        os.close(master_fd)
+        os.close(slave_fd)
+
+        _, chunks = read_trace(path)
+        self.assertEqual(b"".join(data for _, data in chunks),
+                         b"".join(self.trame(d) for d in (2000, 1900, 1800)))
+        self.assertAlmostEqual(chunks[-1][0] - chunks[0][0], 0.2, delta=0.05)
+
+        # Rejeu à 10x dans un nouveau capteur
+        replayer = TraceReplayer(path, speed=10.0)
+        us = UltrasonicSensor(port=replayer.port)
+        try:
+            start = time.monotonic()
+            replayer.start()
+            self.assertTrue(replayer.wait(timeout=2.0))
+            self.assertLess(time.monotonic() - start, 0.1)
+            time.sleep(0.05)
+            self.assertEqual([s.distance for s in us.get_history(5.0)], [200.0, 190.0, 180.0])
+        finally:
+            us.cleanup()
+            replayer.close()
+
+    def test_13_zones_hysteresis(self):
+        """
+        Test US-08 (Logiciel) : Changements de zone de distance avec hystérésis.
+        """
+        bands = ThresholdBands(thresholds=(50, 200, 400), hysteresis=10)
+        received = []
+        bands.subscribe(received.append)
+
+        for distance in (300, 210, 199, 205, 209, 215, 45, 55, 61):
+            bands.update(distance, 0.0)
+
+        # 300 -> zone 2 ; 199 -> zone 1 immédiatement ; 205/209 : hystérésis ; 215 -> zone 2 ; 45 -> zone 0 ; 61 -> zone 1
+        self.assertEqual([(e.previous, e.band, e.distance) for e in received],
+                         [(None, 2, 300), (2, 1, 199), (1, 2, 215), (2, 0, 45), (0, 1, 61)])
+
+        # Les mêmes événements sont disponibles dans la file
+        self.assertEqual(bands.wait_event(0.0).band, 2)
+        for _ in range(4):
+            bands.wait_event(0.0)
+        self.assertIsNone(bands.wait_event(0.01))
+
+    def test_14_sante_liaison(self):
+        """
+        Test US-09 (Logiciel) : Compteurs de qualité de la liaison série.
+        """
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        us = UltrasonicSensor(port=os.ttyname(slave_fd))
+        try:
+            os.write(master_fd, self.trame(1000))
+            time.sleep(0.3)
+            # Octets parasites, trame corrompue, trame < 15 cm, puis trame valide
+            os.write(master_fd, b"\x01\x02\x03" + b"\xff\x03\xe8\x00" + self.trame(100) + self.trame(1100))
+            time.sleep(0.1)
+
+            stats = us.stats()
+            self.assertEqual(stats["valid_frames"], 2)
+            self.assertEqual(stats["filtered_frames"], 1)
+            self.assertEqual(stats["checksum_failures"], 1)
+            self.assertEqual(stats["resync_bytes"], 7) # 3 parasites + 4 octets de la trame corrompue
+            self.assertEqual(stats["reopen_count"], 0)
+            self.assertAlmostEqual(stats["max_frame_gap_s"], 0.3, delta=0.1)
+        finally:
+            us.cleanup()
+            os.close(master_fd)
+            os.close(slave_fd)
+
+    def test_15_cadence_inference(self):
+        """
+        Test CAM-02 (Logiciel) : Cadence de détection choisie selon le mode et les ultrasons.
+        """
+        class FakeCamera:
+            def __init__(self):
+                self.rates = []
+            def set_rate(self, fps):
+                self.rates.append(fps)
+            def achieved_fps(self):
+                return 0.0
+
+        camera = FakeCamera()
+        scheduler = InferenceScheduler(camera, high_fps=10.0, low_fps=2.0, frames_per_announce=3)
+
+        self.assertEqual(scheduler.update("MARCHE", 100), 0.0)
+        self.assertEqual(scheduler.update("MIXTE", None), 0.0) # Aucun obstacle
+        self.assertEqual(scheduler.update("MIXTE", 350), 2.0) # Obstacle loin
+        self.assertEqual(scheduler.update("MIXTE", 350, ttc=2.0), 10.0) # Obstacle loin mais en approche
+        self.assertEqual(scheduler.update("MIXTE", 150), 10.0) # Obstacle proche
+        self.assertEqual(scheduler.update("EXPLORATION", announce_interval=2.0), 1.5)
+
+        # La caméra n'est sollicitée qu'aux changements de cadence
+        self.assertEqual(camera.rates, [0.0, 2.0, 10.0, 1.5])
+        stats = scheduler.stats()
+        self.assertEqual(stats["changes"], 4)
+        self.assertEqual(stats["decisions"], {"marche": 1, "rien": 1, "loin": 1, "approche": 1,
+                                              "proche": 1, "exploration": 1})
+
+    def test_16_zone_interet(self):
+        """
+        Test CAM-03 (Logiciel) : Boîte détectée dans le tiers central replacée dans l'image complète.
+        """
+        # Bande centrale de 1280 / 3 px : commence à x = 426
+        det = to_full_frame(Detection(62, 0.8, 10, 100, 110, 300, (60, 200)), offset_x=426)
+        self.assertEqual((det.Left, det.Top, det.Right, det.Bottom), (436, 100, 536, 300))
+        self.assertEqual(det.Center, (486.0, 200.0))
+        self.assertEqual((det.ClassID, det.Confidence), (62, 0.8))
+
+    def test_17_suivi_objets(self):
+        """
+        Test CAM-04 (Logiciel) : Identifiants stables et annonces limitées aux changements.
+        """
+        def det(class_id, left, top, right, bottom):
+            return Detection(class_id, 0.9, left, top, right, bottom, ((left + right) / 2, (top + bottom) / 2))
+
+        def position(d):
+            return "à gauche" if d.Center[0] < 1280 / 3 else ("à droite" if d.Center[0] > 1280 * 2 / 3 else "devant")
+
+        tracker = ObjectTracker(min_hits=2, closer_ratio=1.5)
+        chaise, personne = det(62, 100, 300, 200, 500), det(1, 600, 100, 800, 600)
+        tracker.update([chaise, personne], 0.0)
+        self.assertEqual(tracker.to_announce(position, 0.0), []) # Une seule détection : pas encore annoncé
+
+        tracks = tracker.update([personne, det(62, 105, 300, 205, 500)], 0.5)
+        ids = {t.class_id: t.id for t in tracks}
+        self.assertEqual(len(tracks), 2)
+        self.assertEqual(sorted((t.class_id, p) for t, p in tracker.to_announce(position, 0.5)),
+                         [(1, "devant"), (62, "à gauche")])
+
+        # Rien de nouveau : aucune annonce, mêmes identifiants
+        tracks = tracker.update([det(62, 110, 300, 210, 500), personne], 1.0)
+        self.assertEqual({t.class_id: t.id for t in tracks}, ids)
+        self.assertEqual(tracker.to_announce(position, 1.0), [])
+
+        # La chaise grossit nettement (rapprochement), la personne passe à droite par petits pas
+        tracker.update([det(62, 80, 200, 240, 520), det(1, 680, 100, 880, 600)], 1.5)
+        tracker.update([det(62, 60, 100, 260, 540), det(1, 760, 100, 960, 600)], 2.0)
+        self.assertEqual(sorted((t.class_id, t.id, p) for t, p in tracker.to_announce(position, 2.0)),
+                         [(1, ids[1], "à droite"), (62, ids[62], "à gauche")])
+
+        # Objet disparu trop longtemps : oublié
+        self.assertEqual(tracker.update([], 4.0), [])
+
+    def test_18_table_classes(self):
+        """
+        Test CAM-05 (Logiciel) : Table des classes construite au chargement du modèle.
+        """
+        table = build_class_table(["unlabeled", "person", "Chair", "N/A", "zebra"],
+                                  {"person": "personne", "chair": "chaise"})
+        self.assertEqual([c.label for c in table], ["unlabeled", "personne", "chaise", "N/A", "zebra"])
+        self.assertEqual(table[2].english, "chair")
+        self.assertEqual([c.priority for c in table], [0, 2, 1, 0, 0])
+        self.assertEqual([c.announce for c in table], [False, True, True, False, True])
+
+    def test_19_chaine_camera_sans_jetson(self):
+        """
+        Test CAM-06 (Logiciel) : Worker caméra avec une source d'images en mémoire et un détecteur factice.
+        """
+        class FakeDetector(Detector):
+            def __init__(self):
+                self.sizes = []
+            def class_names(self):
+                return ["unlabeled", "person", "chair"]
+            def detect(self, img):
+                self.sizes.append(img.shape[:2])
+                return [Detection(2, 0.9, 10, 20, 110, 220, (60, 120)), Detection(0, 0.9, 0, 0, 5, 5, (2, 2))]
+
+        detector = FakeDetector()
+        frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+        cam = Camera(model=detector, source=FrameListSource([frame]), roi=1 / 3)
+        try:
+            self.assertEqual(cam.get_class_name(2), "chaise")
+            cam.start_worker()
+            deadline = time.monotonic() + 2.0
+            while cam.get_latest() is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            result = cam.get_latest()
+            self.assertIsNotNone(result)
+
+            # Seul le tiers central est analysé, la boîte est replacée dans l'image complète, "unlabeled" est écarté
+            self.assertEqual(detector.sizes[0], (720, 428))
+            self.assertEqual(len(result.detections), 1)
+            self.assertEqual(result.detections[0].Left, 436)
+            self.assertEqual(cam.get_object_position(result.detections[0]), "devant")
+
+            # Durées par étape disponibles pour les logs
+            stages = cam.stage_stats()
+            for stage in ("capture", "crop", "detect", "postprocess", "total"):
+                self.assertGreaterEqual(stages[stage]["count"], 1)
+            self.assertNotIn("gate", stages) # Pas de porte de mouvement
+        finally:
+            cam.cleanup()
+
+    def test_20_decodage_ssd(self):
+        """
+        Test CAM-07 (Logiciel) : Décodage des sorties d'un SSD ONNX (seuil, doublons, pixels).
+        """
+        scores = np.array([[[0.1, 0.9, 0.0], [0.2, 0.8, 0.0], [0.3, 0.0, 0.7], [0.9, 0.05, 0.05]]], dtype=np.float32)
+        boxes = np.array([[[0.1, 0.1, 0.3, 0.5], [0.11, 0.1, 0.31, 0.5], [0.6, 0.2, 0.8, 0.9], [0, 0, 1, 1]]],
+                         dtype=np.float32)
+        detections = decode_ssd(scores, boxes, width=1000, height=500, threshold=0.5)
+
+        # La 2e boîte est un doublon de la 1re, la 4e est du fond
+        self.assertEqual([(d.ClassID, round(d.Confidence, 2)) for d in detections], [(1, 0.9), (2, 0.7)])
+        self.assertEqual([round(v) for v in detections[1][2:6]], [600, 100, 800, 450])
+        self.assertEqual(detections[1].Center, (700.0, 275.0))
+
+    def test_21_distance_monoculaire(self):
+        """
+        Test CAM-08 (Logiciel) : Distance estimée d'après la taille des boîtes, recalibrée par l'ultrason.
+        """
+        classes = build_class_table(["unlabeled", "person", "chair", "zebra"], {})
+        estimator = DistanceEstimator.from_classes(classes, focal_ratio=1.0)
+        personne = Detection(1, 0.9, 100, 100, 200, 440, (150, 270)) # 340 px de haut
+        chaise = Detection(2, 0.9, 600, 300, 700, 719, (650, 509)) # Coupée en bas : largeur de 100 px
+        zebre = Detection(3, 0.9, 900, 100, 1000, 200, (950, 150))
+
+        distances = estimator.estimate([personne, chaise, zebre], image_width=1280, image_height=720)
+        self.assertAlmostEqual(distances[0], 1280 * 1.7 / 340 * 100) # 640 cm
+        self.assertAlmostEqual(distances[1], 1280 * 0.5 / 100 * 100) # 640 cm
+        self.assertTrue(np.isnan(distances[2]))
+
+        # L'ultrason mesure 20 % de moins : l'échelle converge, un écart x3 (autre obstacle) est ignoré
+        for _ in range(30):
+            self.assertTrue(estimator.calibrate(estimator.scale * 640.0, 512.0))
+        self.assertAlmostEqual(estimator.scale, 0.8, places=2)
+        self.assertFalse(estimator.calibrate(600.0, 1800.0))
+        self.assertAlmostEqual(estimator.estimate([personne], 1280, 720)[0], 512.0, delta=2.0)
+
+        # Mur derrière l'objet mesuré à chaque image (x1.9, accepté) : l'échelle reste bornée
+        for _ in range(200):
+            estimator.calibrate(estimator.scale * 640.0, estimator.scale * 640.0 * 1.9)
+        self.assertAlmostEqual(estimator.scale, 2.0)
+
+    def test_22_porte_mouvement(self):
+        """
+        Test CAM-09 (Logiciel) : Inférence évitée sur scène fixe, imposée par un changement local ou l'ancienneté.
+        """
+        rng = np.random.default_rng(0)
+        scene = rng.integers(0, 200, size=(720, 1280, 3), dtype=np.uint8)
+        bruit = np.clip(scene.astype(int) + rng.integers(-3, 4, size=scene.shape), 0, 255).astype(np.uint8)
+        objet = scene.copy()
+        objet[300:420, 600:720] = 255 # Petit objet qui entre dans le champ (~1,6 % de l'image)
+
+        gate = MotionGate(max_staleness=2.0)
+        self.assertTrue(gate.should_infer(scene, 0.0)) # Première image
+        self.assertFalse(gate.should_infer(bruit, 0.5)) # Bruit du capteur seulement
+        self.assertTrue(gate.should_infer(objet, 1.0))
+        self.assertFalse(gate.should_infer(objet, 2.5))
+        self.assertTrue(gate.should_infer(objet, 3.5)) # Plus de 2 s sans inférence
+        self.assertEqual(gate.stats(), {"inferences": 3, "skipped": 2, "saved_percent": 40.0})
+
+    def test_23_profil_capture(self):
+        """
+        Test CAM-10 (Logiciel) : La position des objets suit la largeur des images capturées.
+        """
+        class FakeDetector(Detector):
+            def class_names(self):
+                return ["unlabeled", "person"]
+            def detect(self, img):
+                return []
+
+        cam = Camera(model=FakeDetector(), source=FrameListSource([np.zeros((360, 640, 3), dtype=np.uint8)]),
+                     profile="360p15")
+        try:
+            self.assertEqual((cam.frame_width, cam.frame_height), (640, 360))
+            det = Detection(1, 0.9, 500, 100, 600, 300, (550, 200))
+            self.assertEqual(cam.get_object_position(det), "à droite") # "devant" en 1280 px de large
+            with self.assertRaises(ValueError):
+                cam.set_profile("4k")
+        finally:
+            cam.cleanup()
+
+    def test_24_synthese_residente(self):
+        """
+        Test SND-02 (Logiciel) : Moteur de synthèse résident et effets de voix (tempo 1.5, hauteur -200).
+        """
+        rate = 16000
+        t = np.arange(rate) / rate
+        tone = (8000 * np.sin(2 * np.pi * 200 * t)).astype(np.int16) # 1 s à 200 Hz
+
+        class FakeEngine:
+            def synthesize(self, text):
+                return tone
+            def close(self):
+                pass
+        FakeEngine.rate = rate
+
+        class FakeOutput:
+            def __init__(self):
+                self.played = []
+                self.done = threading.Event()
+            def play(self, pcm, rate):
+                self.played.append(pcm)
+                self.done.set()
+            def close(self):
+                pass
+
+        output = FakeOutput()
+        sound = Sound(engine=FakeEngine(), output=output)
+        try:
+            sound.speak("150", priority=True)
+            self.assertTrue(output.done.wait(2.0))
+        finally:
+            sound.cleanup()
+        pcm = output.played[0]
+        self.assertEqual(pcm.dtype, np.int16)
+        self.assertAlmostEqual(len(pcm) / rate, 1 / 1.5, delta=0.02)
+        crossings = np.count_nonzero(np.diff(np.signbit(pcm[400:-400]))) / 2 / ((len(pcm) - 800) / rate)
+        self.assertAlmostEqual(crossings, 200 * 2 ** (-200 / 1200), delta=5) # Environ 178 Hz
+        # Sans effet, le signal est transmis tel quel
+        self.assertIs(VoiceEffect(tempo=1.0, pitch_cents=0).apply(tone, rate), tone)
+
+    def test_25_cache_phrases(self):
+        """
+        Test SND-03 (Logiciel) : Annonces assemblées à partir de clips pré-calculés, synthèse seulement hors vocabulaire.
+        """
+        class FakeEngine:
+            rate = 16000
+            lang = "fr-FR"
+            def __init__(self):
+                self.calls = []
+            def synthesize(self, text):
+                self.calls.append(text)
+                silence = np.zeros(800, np.int16) # Silence autour de la voix, retiré des clips
+                return np.concatenate((silence, np.full(100 * len(text), 1000, np.int16), silence))
+            def close(self):
+                pass
+
+        class NullOutput:
+            def play(self, pcm, rate):
+                pass
+            def close(self):
+                pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = FakeEngine()
+            sound = Sound(engine=engine, output=NullOutput(), effect=VoiceEffect(tempo=1.0, pitch_cents=0),
+                          cache=PhraseCache(os.path.join(tmp, "phrases"), lru_size=2))
+            try:
+                phrases = vocabulaire(["chaise", "feu tricolore"], ["MARCHE", "MIXTE"])
+                self.assertIn("150", phrases)
+                self.assertEqual(sound.build_cache(phrases), len(phrases))
+                self.assertEqual(sound.build_cache(phrases), 0) # Déjà en cache : rien à recalculer
+                engine.calls.clear()
+
+                pcm, rate = sound.render("chaise à gauche, 150")
+                pcm_multi, _ = sound.render("feu tricolore devant 30")
+                self.assertEqual(engine.calls, []) # Aucune synthèse pour le vocabulaire
+                self.assertEqual(rate, 16000)
+                # 3 clips (voix + marges), 1 silence entre mots et 1 pause à la virgule
+                voice = 100 * len("chaise") + 100 * len("à gauche") + 100 * len("150")
+                self.assertEqual(len(pcm), voice + 3 * 160 + 480 + 2400)
+                self.assertEqual(np.count_nonzero(pcm_multi), 100 * len("feu tricolore" "devant" "30")) # Nom en 2 mots
+
+                # Hors vocabulaire : synthèse une seule fois, puis LRU (2 phrases au plus)
+                sound.render("Arrêt du système")
+                sound.render("Arrêt du système")
+                self.assertEqual(engine.calls, ["Arrêt du système"])
+                sound.render("un")
+                sound.render("deux")
+                sound.render("Arrêt du système")
+                self.assertEqual(engine.calls.count("Arrêt du système"), 2)
+
+                # Cache relu depuis le disque par une nouvelle instance
+                cache = PhraseCache(os.path.join(tmp, "phrases"))
+                self.assertEqual(len(cache), len(phrases))
+                self.assertEqual(len(cache.get("chaise à gauche, 150")), len(pcm))
+                self.assertIsNone(cache.get("chaise inconnue"))
+            finally:
+                sound.cleanup()
+
+    def test_26_sortie_audio_persistante(self):
+        """
+        Test SND-04 (Logiciel) : Flux audio ouvert une fois, silence entre les messages, latence et sous-débits mesurés.
+        """
+        class FakeEngine:
+            rate = 16000
+            def synthesize(self, text):
+                return np.full(1600, 1000, np.int16) # 100 ms de "voix"
+            def close(self):
+                pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sortie.wav")
+            output = FileOutput(path, period_ms=20, periods=4, keepalive=0.3)
+            sound = Sound(engine=FakeEngine(), output=output, effect=VoiceEffect(tempo=1.0, pitch_cents=0))
+            start = time.monotonic()
+            sound.speak("un", priority=True)
+            time.sleep(0.2)
+            sound.speak("deux", priority=True)
+            time.sleep(0.6) # Silence jusqu'à la fin du keepalive, puis flux au repos
+            elapsed = time.monotonic() - start
+            sound.cleanup()
+
+            stats = output.stats()
+            self.assertEqual(stats["underruns"], 0)
+            self.assertEqual(stats["latency"]["count"], 2)
+            self.assertLessEqual(stats["latency"]["max_ms"], 4 * 20 + 20) # Au plus le tampon de 4 périodes
+            with wave.open(path, "rb") as f:
+                pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+            self.assertEqual(np.count_nonzero(pcm), 2 * 1600)
+            # Du silence a été écrit entre les deux messages (flux continu), pas au-delà du keepalive
+            gaps = np.diff(np.flatnonzero(pcm))
+            self.assertEqual(np.count_nonzero(gaps > 1), 1)
+            self.assertGreater(gaps.max() / 16000, 0.05)
+            self.assertGreater(len(pcm) / 16000, 0.4)
+            self.assertLess(len(pcm) / 16000, elapsed)
+
+        # Flux non alimenté pendant qu'il est en marche : un sous-débit
+        output = FileOutput(os.devnull, period_ms=20, keepalive=5.0)
+        output.play(np.ones(320, np.int16), 16000)
+        time.sleep(0.1)
+        output.idle()
+        self.assertEqual(output.underruns, 1)
+        output.close()
+
+    def test_27_preemption(self):
+        """
+        Test SND-05 (Logiciel) : Un message prioritaire coupe le message normal en cours, même sous un flot de speak().
+        """
+        class FakeEngine:
+            rate = 16000
+            def synthesize(self, text):
+                if text == "ALERTE":
+                    return np.full(3200, 2000, np.int16) # 200 ms
+                return np.full(16000, 1000, np.int16) # 1 s
+            def close(self):
+                pass
+
+        class StampedOutput(FileOutput):
+            """Note l'instant où le premier échantillon du message prioritaire est écrit."""
+            priority_written = None
+            def _write(self, data):
+                if self.priority_written is None and 2000 in np.frombuffer(data, np.int16):
+                    self.priority_written = time.monotonic()
+                super()._write(data)
+
+        def run(resume, flood):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "sortie.wav")
+                output = StampedOutput(path, period_ms=20, periods=4, keepalive=0.2)
+                sound = Sound(engine=FakeEngine(), output=output, effect=VoiceEffect(tempo=1.0, pitch_cents=0),
+                              resume_interrupted=resume)
+                stop = threading.Event()
+                def flooder():
+                    i = 0
+                    while not stop.is_set():
+                        sound.speak(f"obstacle {i}")
+                        i += 1
+                        time.sleep(0.002)
+                if flood:
+                    threading.Thread(target=flooder, daemon=True).start()
+                else:
+                    sound.speak("obstacle")
+                time.sleep(0.3) # Message normal en cours de lecture
+                requested = time.monotonic()
+                sound.speak("ALERTE", priority=True)
+                time.sleep(0.2)
+                stop.set()
+                time.sleep(1.2) # Fin des messages
+                sound.cleanup()
+                with wave.open(path, "rb") as f:
+                    pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+                return sound, output.priority_written - requested, pcm
+
+        sound, delay, pcm = run(resume=False, flood=True)
+        self.assertLess(delay, 0.05) # Ecriture du message prioritaire quelques périodes après la demande
+        self.assertEqual(sound.interruptions, 1)
+        self.assertLess(sound.preemption.summary()["max_ms"], 150) # Tampon de 80 ms compris
+        self.assertEqual(np.count_nonzero(pcm == 2000), 3200)
+
+        # Sans message plus récent : le message coupé est abandonné ou repris selon la politique choisie
+        sound, _, pcm = run(resume=False, flood=False)
+        self.assertLess(np.count_nonzero(pcm == 1000), 16000)
+        sound, _, pcm = run(resume=True, flood=False)
+        self.assertEqual(np.count_nonzero(pcm == 1000), 16000)
+        first_alert = np.flatnonzero(pcm == 2000)[0]
+        self.assertGreater(np.count_nonzero(pcm[first_alert:] == 1000), 0) # Reprise après l'alerte
+
+    def test_28_boite_aux_lettres(self):
+        """
+        Test SND-06 (Logiciel) : Worker réveillé uniquement par speak(), seul le dernier message normal est gardé.
+        """
+        class FakeEngine:
+            rate = 16000
+            def synthesize(self, text):
+                return np.zeros(16, np.int16)
+            def close(self):
+                pass
+
+        class SlowOutput:
+            def __init__(self):
+                self.played = []
+            def play(self, pcm, rate):
+                self.played.append(time.monotonic())
+                time.sleep(0.1)
+            def close(self):
+                pass
+
+        output = SlowOutput()
+        sound = Sound(engine=FakeEngine(), output=output, effect=VoiceEffect(tempo=1.0, pitch_cents=0), queue_size=3)
+        try:
+            time.sleep(0.5)
+            self.assertEqual(sound.wakeups, 0) # Aucun réveil sans message
+
+            requested = time.monotonic()
+            sound.speak("premier")
+            time.sleep(0.02)
+            self.assertEqual(len(output.played), 1)
+            self.assertLess(output.played[0] - requested, 0.02) # Pas de délai de scrutation
+            for i in range(100): # Pendant la lecture du premier : seul le dernier sera dit
+                sound.speak(f"obstacle {i}")
+            for i in range(5): # File prioritaire bornée à 3
+                sound.speak(f"alerte {i}", priority=True)
+            time.sleep(0.6)
+            self.assertEqual(len(output.played), 1 + 3 + 1)
+            self.assertEqual(sound.stats()["messages"], 5)
+            self.assertLessEqual(sound.wakeups, 5)
+        finally:
+            sound.cleanup()
+        self.assertFalse(sound._worker.is_alive())
+
+    def test_29_distances_pendant_chargement(self):
+        """
+        Test CAM-11 (Logiciel) : Les distances caméra sont demandées (mode MIXTE) avant ou après un chargement raté.
+        """
+        release = threading.Event()
+
+        class SlowDetector(Detector):
+            def __init__(self, fail=False):
+                self.fail = fail
+            def class_names(self):
+                release.wait(2.0)
+                if self.fail:
+                    raise RuntimeError("modèle introuvable")
+                return ["unlabeled", "person"]
+            def detect(self, img):
+                return []
+
+        det = Detection(1, 0.9, 600, 100, 700, 500, (650, 300))
+        frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+        for fail in (False, True):
+            release.clear()
+            cam = Camera(model=SlowDetector(fail), source=FrameListSource([frame]), background=True)
+            try:
+                self.assertFalse(cam.is_ready())
+                self.assertEqual(cam.estimate_distances((), 150.0, calibrate=True), [])
+                self.assertEqual(cam.estimate_distances([det], 150.0), [None])
+                release.set()
+                deadline = time.monotonic() + 2.0
+                while not cam.is_ready() and cam.load_error is None and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                if fail:
+                    self.assertIsNotNone(cam.load_error)
+                    self.assertEqual(cam.estimate_distances([det], 150.0), [None])
+                else:
+                    self.assertIsNotNone(cam.estimate_distances([det], 150.0)[0])
+            finally:
+                cam.cleanup()
+
+    def test_30_annonces_urgentes(self):
+        """
+        Test SND-07 (Logiciel) : Les annonces urgentes ne s'accumulent pas, seule la plus récente est dite.
+        """
+        class FakeEngine:
+            rate = 16000
+            def synthesize(self, text):
+                if text.startswith("urgent"):
+                    return np.full(3200, 3000 + int(text.split()[1]), np.int16) # 200 ms
+                return np.full(16000, 1000, np.int16) # 1 s
+            def close(self):
+                pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sortie.wav")
+            output = FileOutput(path, period_ms=20, periods=4, keepalive=0.2)
+            sound = Sound(engine=FakeEngine(), output=output, effect=VoiceEffect(tempo=1.0, pitch_cents=0),
+                          queue_size=2)
+            sound.speak("personne à gauche, chaise devant")
+            time.sleep(0.2)
+            for i in range(5): # Approche rapide : une distance toutes les 50 ms
+                sound.speak(f"urgent {i}", urgent=True)
+                time.sleep(0.05)
+            time.sleep(0.6)
+            sound.cleanup()
+            with wave.open(path, "rb") as f:
+                pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+
+        self.assertEqual(np.count_nonzero(pcm == 3004), 3200) # Dernière distance dite en entier
+        last_start = np.flatnonzero(pcm == 3004)[0]
+        self.assertEqual(np.count_nonzero((pcm[last_start:] != 3004) & (pcm[last_start:] != 0)), 0)
+        self.assertLess(np.count_nonzero(pcm == 1000), 16000) # Description coupée, pas reprise
+        self.assertGreaterEqual(sound.interruptions, 1)
+
+    def test_31_preemption_script(self):
+        """
+        Test SND-08 (Logiciel) : Synthèse par script, un message prioritaire déposé juste avant la lecture n'est pas perdu.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            log = os.path.join(tmp, "dits.txt")
+            script = os.path.join(tmp, "tts.sh")
+            with open(script, "w") as f:
+                f.write(f'#!/bin/sh\necho "$1" >> "{log}"\nsleep 0.5\n')
+            sound = Sound(script_path=script, engine=None)
+            try:
+                sound.speak("occupe", priority=True) # Le worker est pris 0,5 s par ce message
+                time.sleep(0.1)
+                sound.speak("Mode MIXTE", priority=True)
+                # Message normal pris en charge juste avant la demande prioritaire : il n'est pas lu
+                start = time.monotonic()
+                sound._run_script("chaise 150", "normal")
+                self.assertLess(time.monotonic() - start, 0.1)
+                self.assertEqual(sound.interruptions, 1)
+
+                # Message normal en cours : arrêté dès qu'un message prioritaire arrive
+                time.sleep(1.0)
+                sound.speak("personne à gauche")
+                time.sleep(0.2)
+                sound.speak("Mode MARCHE", priority=True)
+                time.sleep(0.8)
+            finally:
+                sound.cleanup()
+            with open(log) as f:
+                said = f.read().split("\n")
+        self.assertEqual(said[:4], ["occupe", "Mode MIXTE", "personne à gauche", "Mode MARCHE"])
+        self.assertEqual(sound.interruptions, 2)
+        self.assertLess(sound.preemption.summary()["max_ms"], 100)
+
+    def test_32_sortie_audio_perdue(self):
+        """
+        Test SND-09 (Logiciel) : Sortie audio perdue (aplay arrêté) : réouverture sans perdre le message, sinon script.
+        """
+        import errno
+
+        class FakeEngine:
+            rate = 16000
+            def synthesize(self, text):
+                return np.full(320, 1000, np.int16)
+            def close(self):
+                pass
+
+        class FlakyOutput(FileOutput):
+            """Première écriture en échec, comme un tube vers un aplay arrêté."""
+            failures = 1
+            opened = 0
+            def _open(self):
+                FlakyOutput.opened += 1
+                super()._open()
+            def _write(self, data):
+                if FlakyOutput.failures:
+                    FlakyOutput.failures -= 1
+                    raise BrokenPipeError(errno.EPIPE, "Broken pipe")
+                super()._write(data)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sortie.wav")
+            output = FlakyOutput(path, keepalive=0.1)
+            sound = Sound(engine=FakeEngine(), output=output, effect=VoiceEffect(tempo=1.0, pitch_cents=0))
+            sound.speak("150")
+            time.sleep(0.3)
+            sound.cleanup()
+            self.assertEqual(FlakyOutput.opened, 2) # Rouverte une fois
+            self.assertIs(sound.output, output)
+            with wave.open(path, "rb") as f:
+                pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+            self.assertEqual(np.count_nonzero(pcm == 1000), 320) # Message rejoué après la réouverture
+
+            # Sortie impossible à rouvrir : retour au script
+            log = os.path.join(tmp, "dits.txt")
+            script = os.path.join(tmp, "tts.sh")
+            with open(script, "w") as f:
+                f.write(f'#!/bin/sh\necho "$1" >> "{log}"\n')
+
+            class DeadOutput:
+                def play(self, pcm, rate):
+                    raise BrokenPipeError(errno.EPIPE, "Broken pipe")
+                def close(self):
+                    pass
+
+            sound = Sound(script_path=script, engine=FakeEngine(), output=DeadOutput(),
+                          effect=VoiceEffect(tempo=1.0, pitch_cents=0))
+            sound.speak("150")
+            time.sleep(0.3)
+            sound.speak("120")
+            time.sleep(0.3)
+            sound.cleanup()
+            self.assertIsNone(sound.output)
+            with open(log) as f:
+                self.assertEqual(f.read().split(), ["150", "120"])
+
+            # Sortie perdue pendant la reprise d'un message coupé : le worker survit, la fin du message est abandonnée
+            sound = Sound(script_path=script, engine=FakeEngine(), output=DeadOutput(),
+                          effect=VoiceEffect(tempo=1.0, pitch_cents=0))
+            with sound._mailbox:
+                sound._interrupted = (np.full(320, 1000, np.int16), 16000)
+                sound._mailbox.notify()
+            time.sleep(0.3)
+            self.assertTrue(sound._worker.is_alive())
+            self.assertIsNone(sound.output)
+            sound.speak("100")
+            time.sleep(0.3)
+            sound.cleanup()
+            with open(log) as f:
+                self.assertEqual(f.read().split(), ["150", "120", "100"])
+
+    def test_33_approche_perimee(self):
+        """
+        Test US-04 (Logiciel) : Pas de TTC sur un état figé.
+        Sans nouvelle mesure depuis max_age, l'approche n'est plus publiée ; reset() l'efface.
+        """
+        estimator = ApproachEstimator(max_age=0.5)
+        for i in range(20):
+            estimator.update(i * 0.1, 300.0 - 10.0 * i)
+        self.assertIsNotNone(estimator.time_to_collision(now=2.0))
+        self.assertIsNone(estimator.time_to_collision(now=2.5)) # Capteur muet depuis 0.6 s
+
+        # Horloge réelle par défaut
+        now = time.monotonic()
+        estimator.reset()
+        for i in range(20):
+            estimator.update(now - (19 - i) * 0.1, 300.0 - 10.0 * i)
+        self.assertIsNotNone(estimator.time_to_collision())
+        estimator.reset()
+        self.assertIsNone(estimator.time_to_collision())
+        self.assertEqual(estimator.closing_speed(), 0.0)
+
+    def test_34_regroupement_trames(self):
+        """
+        Test US-05 (Logiciel) : Capteur en émission continue à 9600 bauds.
+        Plusieurs trames par réveil, sans perte de la dernière mesure.
+        """
+        master_fd, slave_fd = os.openpty()
+        tty.setraw(slave_fd)
+        us = UltrasonicSensor(port=os.ttyname(slave_fd), mode="select", batch_frames=8)
+        try:
+            time.sleep(0.1)
+            for i in range(96):
+                os.write(master_fd, self.trame(1000 + i))
+                time.sleep(4 * 10.0 / 9600) # Débit de la ligne
+            time.sleep(0.1)
+            stats = us.stats()
+            self.assertEqual(stats["valid_frames"], 96)
+            self.assertLess(stats["wakeups"], 48)
+            self.assertEqual(us.get_distance(), 109.5)
+        finally:
+            us.cleanup()
+            os.close(master_fd)
+            os.close(slave_fd)
+
+    def test_35_arret_pendant_chargement(self):
+        """
+        Test CAM-12 (Logiciel) : Chargement raté ou interrompu par cleanup().
+        Le worker s'arrête, la source ouverte par un chargement abandonné est fermée et jamais publiée.
+        """
+        release = threading.Event()
+
+        class SlowDetector(Detector):
+            def __init__(self, fail=False):
+                self.fail = fail
+            def class_names(self):
+                release.wait(2.0)
+                if self.fail:
+                    raise RuntimeError("modèle introuvable")
+                return ["unlabeled", "person"]
+            def detect(self, img):
+                return []
+
+        class SlowSource(FrameListSource):
+            closed = 0
+            def close(self):
+                SlowSource.closed += 1
+
+        frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+        # Chargement raté : le worker ne scrute pas indéfiniment
+        cam = Camera(model=SlowDetector(fail=True), source=SlowSource([frame]), background=True)
+        cam.start_worker()
+        release.set()
+        cam._loader.join(2.0)
+        cam._worker.join(2.0)
+        self.assertIsNotNone(cam.load_error)
+        self.assertFalse(cam._worker.is_alive())
+        cam.cleanup()
+        self.assertEqual(SlowSource.closed, 1) # Fermée par le chargement raté
+
+        # cleanup() pendant le chargement : la source est fermée une fois, rien n'est publié
+        release.clear()
+        SlowSource.closed = 0
+        cam = Camera(model=SlowDetector(), source=SlowSource([frame]), background=True)
+        threading.Timer(0.2, release.set).start()
+        cam.cleanup()
+        self.assertFalse(cam._loader.is_alive())
+        self.assertFalse(cam.is_ready())
+        self.assertIsNone(cam.source)
+        self.assertEqual(SlowSource.closed, 1)
+
 if __name__ == '__main__':
     # On force l'affichage verbeux pour voir les directives
     unittest.main(verbosity=2)
@@ -1,29 +1,309 @@
 # ultrasonic.py
 # Ce fichier gère la communication avec un capteur ultrason via le port série
 
+import os
+import json
 import serial 
 import time
 import threading
+import selectors
+from array import array
+from bisect import bisect_right
+from collections import deque, namedtuple
+
+from metrics import LatencyHistogram
+from serial_trace import TraceRecorder
+
+# Format d'une trame du capteur : 0xFF | Data_H | Data_L | Checksum
+FRAME_HEADER = 0xFF
+FRAME_SIZE = 4
+MIN_DISTANCE_MM = 150 # Filtre bruit < 15cm
+
+# Mesure horodatée (horloge monotone) : immuable, peut être conservée par l'appelant
+DistanceSample = namedtuple("DistanceSample", ["timestamp", "distance"])
+
+# Changement de zone : zone précédente (None au démarrage), nouvelle zone (0 = la plus proche), distance (cm), horodatage
+BandEvent = namedtuple("BandEvent", ["previous", "band", "distance", "timestamp"])
+
+class FrameParser:
+    """
+    Découpe le flux série brut en trames capteur.
+    Les octets reçus sont copiés dans un tampon préalloué : après chaque analyse il ne reste
+    qu'une trame incomplète (< 4 octets), recopiée en tête du tampon (rebouclage).
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        :param capacity: Taille du tampon en octets (doit contenir au moins une trame).
+        """
+        self._buf = bytearray(capacity)
+        self._end = 0 # Nombre d'octets en attente d'analyse
+
+        # Compteurs de qualité de liaison
+        self.valid_frames = 0
+        self.filtered_frames = 0 # Trames correctes mais < 15 cm
+        self.checksum_failures = 0 # Header 0xFF suivi d'un checksum faux (trame corrompue ou faux header)
+        self.resync_bytes = 0 # Octets ignorés hors trame
+
+    def feed(self, data):
+        """
+        Ajoute un bloc d'octets reçus et analyse toutes les trames complètes en une passe.
+        :param data: Octets lus sur le port série (taille quelconque).
+        :return: La dernière distance valide (mm) contenue dans le bloc, ou None.
+        """
+        latest = None
+        # Morceaux de taille bornée pour ne jamais déborder du tampon
+        step = len(self._buf) - FRAME_SIZE
+        for start in range(0, len(data), step):
+            chunk = data[start:start + step]
+            self._buf[self._end:self._end + len(chunk)] = chunk
+            self._end += len(chunk)
+            distance_mm = self._parse()
+            if distance_mm is not None:
+                latest = distance_mm
+        return latest
+
+    def _parse(self):
+        """Parcourt le tampon, se resynchronise sur les headers 0xFF et valide les checksums."""
+        buf = self._buf
+        end = self._end
+        pos = 0
+        latest = None
+
+        while True:
+            # Recherche du prochain header (boucle C, pas octet par octet en Python)
+            found = buf.find(FRAME_HEADER, pos, end)
+            if found < 0:
+                self.resync_bytes += end - pos
+                pos = end
+                break
+            self.resync_bytes += found - pos
+            pos = found
+            if end - pos < FRAME_SIZE:
+                break # Trame incomplète : on attend la suite
+
+            hi, lo, chksum = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+            if (FRAME_HEADER + hi + lo) & 0xFF == chksum:
+                distance_mm = (hi << 8) + lo
+                if distance_mm > MIN_DISTANCE_MM:
+                    latest = distance_mm
+                    self.valid_frames += 1
+                else:
+                    self.filtered_frames += 1
+                pos += FRAME_SIZE
+            else:
+                # Faux header (octet de données valant 0xFF) : on avance d'un octet
+                self.checksum_failures += 1
+                self.resync_bytes += 1
+                pos += 1
+
+        # Rebouclage : la trame incomplète restante repart en tête du tampon
+        remaining = end - pos
+        if remaining:
+            buf[0:remaining] = buf[pos:end]
+        self._end = remaining
+        return latest
+
+class DistanceHistory:
+    """
+    Historique circulaire de taille fixe des mesures (horodatage monotone, distance en cm).
+    Un seul écrivain (le thread capteur) : il remplit la case puis publie en incrémentant
+    le compteur, les lecteurs ne voient donc jamais une mesure à moitié écrite.
+    """
+
+    def __init__(self, capacity=256):
+        """
+        :param capacity: Nombre de mesures conservées (256 ≈ 25 s à 10 Hz).
+        """
+        self._capacity = capacity
+        self._times = array("d", bytes(8 * capacity))
+        self._distances = array("d", bytes(8 * capacity))
+        self._count = 0 # Nombre total de mesures publiées
+
+    def append(self, timestamp, distance):
+        """Ajoute une mesure (appelé uniquement par le thread capteur)."""
+        i = self._count % self._capacity
+        self._times[i] = timestamp
+        self._distances[i] = distance
+        self._count += 1 # Publication (affectation atomique)
+
+    def get_sample(self):
+        """
+        :return: La mesure la plus récente (DistanceSample) ou None si aucune mesure.
+        """
+        while True:
+            n = self._count
+            if n == 0:
+                return None
+            i = (n - 1) % self._capacity
+            sample = DistanceSample(self._times[i], self._distances[i])
+            # La case n'a pas été réécrite pendant la lecture
+            if self._count < n - 1 + self._capacity:
+                return sample
+
+    def get_history(self, seconds):
+        """
+        Retourne les mesures des dernières `seconds` secondes, de la plus ancienne à la plus récente.
+        Seules les cases de la fenêtre demandée sont lues (pas de copie du tampon entier).
+        """
+        cutoff = time.monotonic() - seconds
+        while True:
+            n = self._count
+            samples = []
+            j = n
+            # La case la plus ancienne peut être en cours de réécriture : on ne la lit pas
+            while j > max(0, n - self._capacity + 1):
+                i = (j - 1) % self._capacity
+                t = self._times[i]
+                if t < cutoff:
+                    break
+                samples.append(DistanceSample(t, self._distances[i]))
+                j -= 1
+            # La plus ancienne case lue n'a pas été réécrite pendant la lecture
+            if self._count < j + self._capacity:
+                samples.reverse()
+                return tuple(samples)
+
+    def sample_rate(self, seconds=1.0):
+        """
+        :return: Fréquence de mesure (Hz) observée sur les dernières `seconds` secondes.
+        """
+        samples = self.get_history(seconds)
+        if len(samples) < 2:
+            return 0.0
+        elapsed = samples[-1].timestamp - samples[0].timestamp
+        return (len(samples) - 1) / elapsed if elapsed > 0 else 0.0
+
+class ThresholdBands:
+    """
+    Découpe la distance en zones (ex : < 50, 50-200, 200-400, >= 400 cm) et signale les changements de zone.
+    Entrer dans une zone plus proche est immédiat ; en ressortir demande de dépasser le seuil de
+    `hysteresis` cm (pas de clignotement autour d'un seuil, jamais de retard sur un danger).
+    Le coût par mesure ne dépend que du nombre de seuils : les abonnés ne sont appelés qu'au changement de zone.
+    """
+
+    def __init__(self, thresholds=(50, 200, 400), hysteresis=10.0, max_events=32):
+        """
+        :param thresholds: Seuils en cm.
+        :param hysteresis: Marge (cm) à dépasser pour passer dans une zone plus éloignée.
+        :param max_events: Nombre d'événements conservés pour wait_event() (les plus anciens sont perdus).
+        """
+        self.thresholds = tuple(sorted(thresholds))
+        self.hysteresis = hysteresis
+        self.band = None
+        self._callbacks = ()
+        self._events = deque(maxlen=max_events)
+        self._cond = threading.Condition()
+
+    def subscribe(self, callback):
+        """
+        Enregistre une fonction callback(BandEvent) appelée dans le thread capteur à chaque changement de zone.
+        Elle doit rester très courte (pas de time.sleep, pas de synthèse vocale).
+        """
+        self._callbacks = self._callbacks + (callback,)
+
+    def unsubscribe(self, callback):
+        """Retire une fonction enregistrée avec subscribe()."""
+        self._callbacks = tuple(c for c in self._callbacks if c is not callback)
+
+    def update(self, distance, timestamp):
+        """
+        Classe une nouvelle mesure (appelé par le thread capteur).
+        :return: Le BandEvent émis, ou None si la zone n'a pas changé.
+        """
+        previous = self.band
+        if previous is None:
+            band = bisect_right(self.thresholds, distance)
+        else:
+            band = previous
+            while band > 0 and distance < self.thresholds[band - 1]:
+                band -= 1
+            while band < len(self.thresholds) and distance >= self.thresholds[band] + self.hysteresis:
+                band += 1
+            if band == previous:
+                return None
+
+        self.band = band
+        event = BandEvent(previous, band, distance, timestamp)
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+        for callback in self._callbacks:
+            callback(event)
+        return event
+
+    def wait_event(self, timeout=None):
+        """
+        Attend le prochain changement de zone.
+        :return: Le plus ancien BandEvent non lu, ou None au bout de `timeout` secondes.
+        """
+        with self._cond:
+            if not self._events:
+                self._cond.wait(timeout)
+            return self._events.popleft() if self._events else None
 
 class UltrasonicSensor:
 
-    def __init__(self, port="/dev/ttyTHS1", baudrate=9600, timeout=1):
+    def __init__(self, port="/dev/ttyTHS1", baudrate=9600, timeout=1, history_size=256, estimator=None,
+                 mode="select", start=True, recorder=None, bands=None, stats_interval=None, batch_frames=1):
+        """
+        :param port: Port série du capteur.
+        :param history_size: Nombre de mesures conservées dans l'historique.
+        :param estimator: Estimateur optionnel (ex : ApproachEstimator) mis à jour à chaque mesure.
+        :param mode: "select" : le thread dort jusqu'à l'arrivée d'octets (epoll).
+                     "poll" : scrutation du port toutes les 10 ms (ancien fonctionnement).
+        :param start: Si False, pas de thread propre : la lecture est pilotée par un UltrasonicArray.
+        :param recorder: TraceRecorder optionnel qui enregistre le flux brut reçu (rejouable avec serial_trace.py).
+        :param bands: ThresholdBands optionnel : signale les changements de zone dès la trame reçue.
+        :param stats_interval: Si renseigné, stats() est affiché en JSON toutes les `stats_interval` secondes.
+        :param batch_frames: En mode "select", après un réveil, on laisse arriver jusqu'à ce nombre de trames
+                             (durée calculée au débit du port) avant de lire : un réveil par lot au lieu
+                             d'un par trame quand le capteur émet en continu. 1 = pas de regroupement
+                             (défaut : chaque trame est traitée dès son arrivée).
+        """
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
         self.serial_conn = None
+        self.estimator = estimator
+        self.mode = mode
+        self.recorder = recorder
+        self.bands = bands
+        self.batch_frames = batch_frames
         
         # Variables partagées avec le thread
-        self._latest_distance = None
-        self._last_read_time = 0.0
+        self._history = DistanceHistory(capacity=history_size)
         self._running = True
+        self._parser = FrameParser()
+
+        # Instrumentation : réveils du thread et latence arrivée des octets -> publication
+        self.wakeups = 0
+        self.latency = LatencyHistogram()
+        self._stats_start = time.monotonic()
+        self._idle_since_ns = time.monotonic_ns() # Dernier instant où le port était vide
+
+        # Santé de la liaison (les compteurs de trames sont dans le parseur)
+        self.open_count = 0
+        self.max_frame_gap = 0.0 # Plus long intervalle entre deux trames valides (s)
+        self._last_frame_time = None
+        self.stats_interval = stats_interval
+        self._last_stats_dump = time.monotonic()
+
+        # Attente événementielle : descripteur du port + tube pour réveiller le thread à l'arrêt
+        self._selector = None
+        if start and self.mode == "select":
+            self._selector = selectors.DefaultSelector()
+            self._wake_r, self._wake_w = os.pipe()
+            self._selector.register(self._wake_r, selectors.EVENT_READ)
+            self._selected_conn = None
+            self._selected_fd = None
         
         # Anti-spam logs
         self._last_log = 0.0
         self._log_interval = 5.0
 
         # Connexion et Lancement du thread
-        if self._open_serial():
+        if self._open_serial() and start:
             self._thread = threading.Thread(target=self._read_loop, daemon=True)
             self._thread.start()
 
@@ -42,6 +322,7 @@ class UltrasonicSensor:
                 baudrate=self.baudrate,
                 timeout=self.timeout
             )
+            self.open_count += 1
             return True
         except serial.SerialException as e:
             self._log_throttled(f"Erreur ouverture série ({self.port}) : {e}")
@@ -58,47 +339,303 @@ class UltrasonicSensor:
                 continue
 
             try:
-                # Lecture bloquante de 1 octet pour trouver le Header (synchronisation)
-                if self.serial_conn.in_waiting > 0:
-                    byte = self.serial_conn.read(1)
-                    if len(byte) == 1 and byte[0] == 0xFF:
-                        data = self.serial_conn.read(3)
-                        if len(data) == 3:
-                            hi, lo, chksum = data[0], data[1], data[2]
-                            checksum = (0xFF + hi + lo) & 0xFF
-                            
-                            if checksum == chksum:
-                                distance_mm = (hi << 8) + lo
-                                if distance_mm > 150: # Filtre bruit < 15cm
-                                     self._latest_distance = distance_mm / 10.0 # cm
-                                     self._last_read_time = time.time()
-                else:
+                if self.mode == "select":
+                    self._wait_readable()
+                self.wakeups += 1
+
+                # Lecture en bloc de tout ce qui est disponible (un seul appel système)
+                waiting = self.serial_conn.in_waiting
+                if self.mode == "select" and waiting > 0:
+                    waiting = self._wait_batch(waiting)
+                if waiting > 0:
+                    self._read_available(waiting)
+                elif self.mode == "poll":
+                    self._idle_since_ns = time.monotonic_ns()
                     time.sleep(0.01)
 
             except Exception as e:
                 self._log_throttled(f"Erreur thread ultrason : {e}")
+                # Port en erreur (câble débranché...) : on le ferme, il sera rouvert au tour suivant
+                try:
+                    self.serial_conn.close()
+                except Exception:
+                    pass
                 time.sleep(0.5)
 
+            self.dump_stats_if_due()
+
+    def _wait_readable(self):
+        """Bloque jusqu'à l'arrivée d'octets sur le port série (ou un réveil d'arrêt)."""
+        if self._selected_conn is not self.serial_conn:
+            # Nouveau port ouvert : on remplace le descripteur surveillé
+            if self._selected_fd is not None:
+                self._selector.unregister(self._selected_fd)
+            self._selected_fd = self.serial_conn.fileno()
+            self._selector.register(self._selected_fd, selectors.EVENT_READ)
+            self._selected_conn = self.serial_conn
+
+        self._selector.select(timeout=1.0)
+        # Réveil immédiat par le noyau : l'instant de réveil est celui de l'arrivée des octets
+        self._idle_since_ns = time.monotonic_ns()
+
+    def _wait_batch(self, waiting):
+        """
+        Laisse arriver la suite du lot avant de lire (au plus batch_frames trames au débit du port).
+        Seulement si les trames arrivent bout à bout (ligne saturée) : une trame isolée est lue sans délai
+        et aucune mesure n'est perdue à la cadence normale du capteur.
+        :param waiting: Octets déjà en attente au réveil.
+        :return: Octets en attente après la pause.
+        """
+        if self.batch_frames <= 1:
+            return waiting
+        byte_time = 10.0 / self.baudrate # 1 octet = 10 bits sur la ligne
+        missing = self.batch_frames * FRAME_SIZE - waiting
+        if (missing <= 0 or self._last_frame_time is None
+                or time.monotonic() - self._last_frame_time > 2 * FRAME_SIZE * byte_time):
+            return waiting
+        time.sleep(missing * byte_time)
+        return self.serial_conn.in_waiting
+
+    def _read_available(self, waiting):
+        """Lit les octets en attente, publie la dernière distance valide et mesure la latence."""
+        data = self.serial_conn.read(waiting)
+        arrival_ns = self._idle_since_ns
+        # Le port vient d'être vidé : les prochains octets arriveront après cet instant
+        self._idle_since_ns = time.monotonic_ns()
+        if self.recorder is not None:
+            self.recorder.write(arrival_ns, data)
+
+        distance_mm = self._parser.feed(data)
+        if distance_mm is not None:
+            now = time.monotonic()
+            if self._last_frame_time is not None and now - self._last_frame_time > self.max_frame_gap:
+                self.max_frame_gap = now - self._last_frame_time
+            self._last_frame_time = now
+            self._history.append(now, distance_mm / 10.0) # cm
+            if self.estimator is not None:
+                self.estimator.update(now, distance_mm / 10.0)
+            if self.bands is not None:
+                self.bands.update(distance_mm / 10.0, now)
+            # En mode poll, l'arrivée n'est connue qu'à 10 ms près : la latence est une borne haute
+            self.latency.record(time.monotonic_ns() - arrival_ns)
+
     def get_distance(self):
         """
         Retourne instantanément la dernière distance valide connue.
         Retourne None si l'info est trop vieille (> 1 seconde).
         """
-        if time.time() - self._last_read_time < 1.0:
-            return self._latest_distance
+        sample = self._history.get_sample()
+        if sample is not None and time.monotonic() - sample.timestamp < 1.0:
+            return sample.distance
         return None
 
+    def get_sample(self):
+        """
+        Retourne la dernière mesure sous forme immuable (timestamp monotone, distance en cm), ou None.
+        """
+        return self._history.get_sample()
+
+    def get_history(self, seconds):
+        """
+        Retourne les mesures des dernières `seconds` secondes (tuple de DistanceSample).
+        """
+        return self._history.get_history(seconds)
+
+    def sample_rate(self, seconds=1.0):
+        """
+        Retourne la fréquence de mesure observée (Hz).
+        """
+        return self._history.sample_rate(seconds)
+
+    def stats(self):
+        """
+        Retourne les compteurs d'instrumentation et de santé de la liaison (dictionnaire).
+        Un câble dégradé se traduit par des checksums faux et des octets de resynchronisation,
+        un thread privé de CPU par de grands écarts entre trames et une latence élevée sans erreurs.
+        """
+        elapsed = max(time.monotonic() - self._stats_start, 1e-9)
+        parser = self._parser
+        return {
+            "port": self.port,
+            "mode": self.mode,
+            "frames_per_s": round(self.sample_rate(2.0), 1),
+            "valid_frames": parser.valid_frames,
+            "filtered_frames": parser.filtered_frames,
+            "checksum_failures": parser.checksum_failures,
+            "resync_bytes": parser.resync_bytes,
+            "reopen_count": max(self.open_count - 1, 0),
+            "max_frame_gap_s": round(self.max_frame_gap, 3),
+            "wakeups": self.wakeups,
+            "wakeups_per_s": round(self.wakeups / elapsed, 1),
+            "latency": self.latency.summary(),
+        }
+
+    def dump_stats_if_due(self):
+        """Affiche stats() sur une ligne JSON si stats_interval est écoulé (logs exploitables par script)."""
+        if self.stats_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_dump >= self.stats_interval:
+            self._last_stats_dump = now
+            print("STATS_ULTRASON " + json.dumps(self.stats(), ensure_ascii=False), flush=True)
+
     def cleanup(self):
         """Arrête le thread et ferme le port."""
         self._running = False
+        if self._selector is not None:
+            os.write(self._wake_w, b"\0") # Débloque l'attente du thread
         
         if hasattr(self, '_thread') and self._thread.is_alive():
             self._thread.join(timeout=1.0)
+
+        if self._selector is not None:
+            self._selector.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            
+        if self.recorder is not None:
+            self.recorder.close()
             
         if self.serial_conn and self.serial_conn.is_open:
             self.serial_conn.close()
             print("Capteur Ultrason arrêté.")
 
+class UltrasonicArray:
+    """
+    Ensemble de capteurs ultrason (un par secteur) servis par un seul thread de lecture.
+    Le thread attend sur tous les ports à la fois (epoll) et ne traite que ceux qui ont reçu des octets :
+    le coût suit le nombre de trames reçues, pas le nombre de capteurs.
+    """
+
+    def __init__(self, ports, baudrate=9600, history_size=256, estimators=None, record_dir=None, bands=None,
+                 stats_interval=None):
+        """
+        :param ports: Dictionnaire secteur -> port série, ex : {"devant": "/dev/ttyTHS1", "à gauche": "/dev/ttyUSB0"}.
+        :param estimators: Dictionnaire optionnel secteur -> estimateur mis à jour à chaque mesure du secteur.
+        :param bands: Dictionnaire optionnel secteur -> ThresholdBands.
+        :param record_dir: Si renseigné, le flux brut de chaque capteur y est enregistré (une trace par secteur).
+        :param stats_interval: Si renseigné, les stats de tous les capteurs sont affichées en JSON toutes les
+                               `stats_interval` secondes.
+        """
+        estimators = estimators or {}
+        bands = bands or {}
+        session = time.strftime("%Y%m%d_%H%M%S")
+        # Table d'état par capteur (parseur, historique, compteurs), sans thread propre
+        self.sensors = {}
+        for sector, port in ports.items():
+            recorder = None
+            if record_dir:
+                path = os.path.join(record_dir, f"{session}_{sector.replace(' ', '_')}.ustr")
+                recorder = TraceRecorder(path, baudrate=baudrate)
+            self.sensors[sector] = UltrasonicSensor(port=port, baudrate=baudrate, history_size=history_size,
+                                                    estimator=estimators.get(sector), start=False,
+                                                    recorder=recorder, bands=bands.get(sector))
+        self._running = True
+        self._registered = {} # secteur -> connexion série surveillée
+        self._last_reopen = 0.0
+        self.stats_interval = stats_interval
+        self._last_stats_dump = time.monotonic()
+
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def _sync_registrations(self):
+        """Surveille les ports ouverts et tente de rouvrir les ports fermés (au plus une fois par seconde)."""
+        now = time.monotonic()
+        for sector, sensor in self.sensors.items():
+            conn = sensor.serial_conn
+            if conn is None or not conn.is_open:
+                if now - self._last_reopen >= 1.0:
+                    sensor._open_serial()
+                    conn = sensor.serial_conn
+                if conn is None or not conn.is_open:
+                    continue
+            if self._registered.get(sector) is not conn:
+                self._selector.register(conn.fileno(), selectors.EVENT_READ, sector)
+                self._registered[sector] = conn
+        if now - self._last_reopen >= 1.0:
+            self._last_reopen = now
+
+    def _drop(self, sector):
+        """Arrête de surveiller un port en erreur et le ferme (il sera rouvert plus tard)."""
+        conn = self._registered.pop(sector, None)
+        if conn is not None:
+            try:
+                self._selector.unregister(conn.fileno())
+            except (KeyError, ValueError, serial.SerialException):
+                pass
+            conn.close()
+
+    def _read_loop(self):
+        """Thread unique : attend des octets sur n'importe quel port et les distribue au bon capteur."""
+        while self._running:
+            if len(self._registered) < len(self.sensors):
+                self._sync_registrations()
+
+            for key, _ in self._selector.select(timeout=1.0):
+                sector = key.data
+                if sector is None:
+                    continue # Réveil d'arrêt
+                sensor = self.sensors[sector]
+                sensor.wakeups += 1
+                sensor._idle_since_ns = time.monotonic_ns()
+                try:
+                    waiting = sensor.serial_conn.in_waiting
+                    if waiting > 0:
+                        # Pas de regroupement : une pause ici retarderait les autres capteurs et les zones
+                        sensor._read_available(waiting)
+                except Exception as e:
+                    sensor._log_throttled(f"Erreur ultrason ({sector}) : {e}")
+                    self._drop(sector)
+
+            if self.stats_interval is not None and time.monotonic() - self._last_stats_dump >= self.stats_interval:
+                self._last_stats_dump = time.monotonic()
+                print("STATS_ULTRASON " + json.dumps(self.stats(), ensure_ascii=False), flush=True)
+
+    def nearest_by_sector(self):
+        """
+        Retourne la distance la plus récente de chaque secteur (cm), None si le capteur est muet depuis > 1s.
+        """
+        return {sector: sensor.get_distance() for sector, sensor in self.sensors.items()}
+
+    def nearest(self):
+        """
+        Retourne (secteur, distance) de l'obstacle le plus proche tous secteurs confondus, ou (None, None).
+        """
+        best = (None, None)
+        for sector, distance in self.nearest_by_sector().items():
+            if distance is not None and (best[1] is None or distance < best[1]):
+                best = (sector, distance)
+        return best
+
+    def get_distance(self, sector=None):
+        """
+        Retourne la distance d'un secteur, ou la plus courte tous secteurs confondus si sector est None.
+        """
+        if sector is not None:
+            return self.sensors[sector].get_distance()
+        return self.nearest()[1]
+
+    def stats(self):
+        """Retourne les compteurs d'instrumentation par secteur."""
+        return {sector: sensor.stats() for sector, sensor in self.sensors.items()}
+
+    def cleanup(self):
+        """Arrête le thread et ferme tous les ports."""
+        self._running = False
+        os.write(self._wake_w, b"\0")
+        if self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self._selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+        for sensor in self.sensors.values():
+            sensor.cleanup()
+
 if __name__ == "__main__":
     """
     Test du capteur ultrason.